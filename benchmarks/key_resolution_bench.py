@@ -0,0 +1,92 @@
+"""
+Benchmark fact key resolution: the previous 1,000-row merge loop vs resolve_fact_keys
+(with date_key derived arithmetically).
+
+Usage:
+    python -m benchmarks.key_resolution_bench --rows 1000000
+"""
+import argparse
+import gc
+import time
+import numpy as np
+import pandas as pd
+from src.key_resolution import resolve_fact_keys, date_keys
+
+
+def make_data(rows, stores=2000, items=10000, vendors=300, days=365, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=days)
+    sales = pd.DataFrame({
+        'invoice_line_no': np.char.add('INV-', np.arange(rows).astype(str)),
+        'date': dates[rng.integers(0, days, rows)],
+        'store': rng.integers(1, stores + 1, rows),
+        'itemno': rng.integers(1, items + 1, rows).astype(str),
+        'vendor_no': rng.integers(1, vendors + 1, rows).astype(str),
+    })
+    key_frames = {
+        'Date_Dim': pd.DataFrame({'date': dates, 'date_key': date_keys(dates)}),
+        'Store_Dim': pd.DataFrame({'store_id': np.arange(1, stores + 1), 'store_key': np.arange(stores)}),
+        'Item_Dim': pd.DataFrame({'itemno': np.arange(1, items + 1).astype(str), 'item_key': np.arange(items)}),
+        'Vendor_Dim': pd.DataFrame({'vendor_no': np.arange(1, vendors + 1).astype(str),
+                                    'vendor_key': np.arange(vendors)}),
+    }
+    return sales, key_frames
+
+
+def merge_loop(sales_data, key_frames, chunk_size=1000):
+    """The per-chunk isin + merge + row-count guard + gc.collect() loop load() used before."""
+    date_keys = key_frames['Date_Dim'].set_index('date')
+    store_keys, item_keys, vendor_keys = (key_frames[t] for t in ('Store_Dim', 'Item_Dim', 'Vendor_Dim'))
+    chunks = []
+    for start in range(0, len(sales_data), chunk_size):
+        chunk = sales_data.iloc[start:start + chunk_size].copy()
+        filtered_date_keys = date_keys.loc[chunk['date'].unique(), ['date_key']].reset_index()
+        filtered_store_keys = store_keys[store_keys['store_id'].isin(chunk['store'].unique())]
+        filtered_item_keys = item_keys[item_keys['itemno'].isin(chunk['itemno'].unique())]
+        filtered_vendor_keys = vendor_keys[vendor_keys['vendor_no'].isin(chunk['vendor_no'].unique())]
+        merged = chunk.merge(filtered_date_keys, on='date', how='left')
+        if len(merged) > len(chunk):
+            raise ValueError("Unexpected row increase after date merge.")
+        merged = merged.merge(filtered_store_keys, left_on='store', right_on='store_id', how='left')
+        if len(merged) > len(chunk):
+            raise ValueError("Unexpected row increase after store merge.")
+        merged = merged.merge(filtered_item_keys, on='itemno', how='left')
+        if len(merged) > len(chunk):
+            raise ValueError("Unexpected row increase after item merge.")
+        merged = merged.merge(filtered_vendor_keys, on='vendor_no', how='left')
+        if len(merged) > len(chunk):
+            raise ValueError("Unexpected row increase after vendor merge.")
+        for col in ['date_key', 'store_key', 'item_key', 'vendor_key']:
+            merged[col] = merged[col].fillna(-1).astype(int)
+        chunks.append(merged)
+        gc.collect()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def timed(label, func, rows):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {elapsed:8.2f} s  {rows / elapsed:>12,.0f} rows/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    sales, key_frames = make_data(args.rows)
+    print(f"Resolving keys for {args.rows:,} rows")
+    loop, loop_time = timed('merge loop', lambda: merge_loop(sales, key_frames), args.rows)
+    (resolved, _), vector_time = timed(
+        'resolve_fact_keys',
+        lambda: resolve_fact_keys(sales.assign(date_key=date_keys(sales['date'])), key_frames), args.rows)
+
+    for col in ['date_key', 'store_key', 'item_key', 'vendor_key']:
+        assert (loop[col].to_numpy() == resolved[col].to_numpy()).all(), col
+    print(f"Speed-up: {loop_time / vector_time:.1f}x (results identical)")
+
+
+if __name__ == '__main__':
+    main()
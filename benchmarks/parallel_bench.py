@@ -0,0 +1,96 @@
+"""
+Scaling of the partitioned transform/load mode: clean_rows and prepare_facts on one core
+vs hash partitions in a process pool, by worker count.
+
+Staging rows come from src/synthetic.py and the key tables are built from their natural
+keys, so no warehouse is needed. Every worker count must reproduce the serial result.
+
+Usage:
+    python -m benchmarks.parallel_bench --rows 2000000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from src.synthetic import SalesGenerator, SOURCE_COLUMNS
+from src.key_resolution import FACT_KEYS, normalize_keys
+import src.parallel as parallel
+from src.transform import clean_rows
+from src.load import prepare_facts
+
+
+def make_staging(rows, seed=0):
+    """Synthetic Staging_Sales rows (all text, as read back from the warehouse)."""
+    staging = pa.schema([pa.field(col, pa.string()) for col in SOURCE_COLUMNS])
+    frames = [table.cast(staging).to_pandas() for table in SalesGenerator(seed=seed).tables(rows)]
+    staging_data = pd.concat(frames, ignore_index=True)
+    staging_data['file_name'] = 'chunk_' + (staging_data.index // 100_000).astype(str).str.zfill(4) + '.csv'
+    staging_data['processed_timestamp'] = pd.Timestamp.now()
+    return staging_data
+
+
+def make_key_frames(sales):
+    """Surrogate keys 0..n-1 for every natural key in the batch."""
+    key_frames = {}
+    for column, dim_table, natural_key, surrogate_key in FACT_KEYS:
+        values = normalize_keys(dim_table, sales[column]).dropna().unique()
+        key_frames[dim_table] = pd.DataFrame({natural_key: values, surrogate_key: np.arange(len(values))})
+    return key_frames
+
+
+def run(staging_data, workers, key_frames, processed_timestamp):
+    start = time.perf_counter()
+    if workers > 1:
+        cleaned = parallel.clean_partitioned(staging_data, workers)
+    else:
+        cleaned = clean_rows(staging_data.copy())
+    cleaned_at = time.perf_counter()
+    if workers > 1:
+        facts, rejected = parallel.prepare_facts_partitioned(cleaned, key_frames, processed_timestamp, workers)
+    else:
+        facts, rejected = prepare_facts(cleaned.copy(), key_frames, processed_timestamp)
+    end = time.perf_counter()
+    return facts, rejected, {'transform_s': cleaned_at - start, 'load_s': end - cleaned_at, 'total_s': end - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 4])
+    parser.add_argument('--start-method', default=parallel.PARALLEL_START_METHOD)
+    parser.add_argument('--output', default=None, help='Optional JSON results file')
+    args = parser.parse_args()
+    parallel.PARALLEL_START_METHOD = args.start_method
+
+    staging_data = make_staging(args.rows)
+    processed_timestamp = pd.Timestamp.now()
+    key_frames = make_key_frames(clean_rows(staging_data.copy()))
+    print(f"{args.rows:,} rows, {os.cpu_count()} CPUs")
+
+    baseline, results = None, []
+    for workers in sorted(set([1] + args.workers)):
+        if workers > 1:
+            # Start the pool outside the timed run
+            parallel.get_pool(workers).submit(int).result()
+        facts, rejected, timings = run(staging_data, workers, key_frames, processed_timestamp)
+        if baseline is None:
+            baseline = (facts, timings['total_s'])
+        else:
+            pd.testing.assert_frame_equal(facts, baseline[0], check_dtype=False)
+        speedup = baseline[1] / timings['total_s']
+        results.append({'workers': workers, **{k: round(v, 3) for k, v in timings.items()},
+                        'speedup': round(speedup, 2), 'efficiency': round(speedup / workers, 2)})
+        print(f"{workers:>3} workers  transform {timings['transform_s']:7.2f} s  load {timings['load_s']:7.2f} s  "
+              f"total {timings['total_s']:7.2f} s  speed-up {speedup:5.2f}x  efficiency {speedup / workers:5.0%}")
+    parallel.shutdown_pool()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Offline benchmark of extract, transform, load and process_scd_type2 at several data scales.
+
+The real pipeline functions run against a local directory standing in for the GCS bucket
+and an embedded SQLite warehouse standing in for BigQuery (see benchmarks/standins.py), or,
+with --warehouse embedded, against the pipeline's own embedded warehouse (src/warehouse.py).
+Every scale runs in a fresh subprocess so peak memory is per scale. For each stage the
+results record wall time, CPU time, rows/s, peak RSS and warehouse round-trips, and are
+written as JSON tagged with the current commit so runs can be compared.
+
+Usage:
+    python -m benchmarks.pipeline_bench --scales 100000 1000000 10000000 --output results.json
+    python -m benchmarks.pipeline_bench --scales 10000000 --warehouse embedded
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ['extract', 'transform', 'load', 'process_scd_type2']
+
+
+def install_standins(warehouse):
+    """Route the pipeline's BigQuery calls to the embedded warehouse (before importing src)."""
+    import google.auth
+    from google.auth.credentials import AnonymousCredentials
+    import pandas_gbq
+    from google.cloud import bigquery
+    google.auth.default = lambda *args, **kwargs: (AnonymousCredentials(), 'offline')
+    pandas_gbq.read_gbq = warehouse.read_gbq
+    bigquery.Client = warehouse.client
+
+
+def measure(stage, rows, warehouse, func):
+    """Run func once and return its result with the stage's measurements."""
+    # The embedded warehouse has no round-trips to count
+    round_trips = getattr(warehouse, 'round_trips', None)
+    cpu = time.process_time()
+    start = time.perf_counter()
+    result = func()
+    wall = time.perf_counter() - start
+    record = {
+        'stage': stage,
+        'rows': rows,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(time.process_time() - cpu, 3),
+        'rows_per_s': round(rows / wall, 1) if wall else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'round_trips': None if round_trips is None else warehouse.round_trips - round_trips,
+    }
+    print(f"{stage:<18} {rows:>10,} rows {wall:8.2f} s {record['rows_per_s'] or 0:>12,.0f} rows/s "
+          f"{record['peak_rss_mb']:>8.0f} MB {str(record['round_trips']):>5} round-trips")
+    return result, record
+
+
+def run_scale(rows, work_dir, seed=0, warehouse_kind='standin'):
+    """Run every stage once on `rows` generated rows inside work_dir."""
+    from benchmarks.standins import LocalBucket, SqliteWarehouse
+    from src.config import PROJECT_ID, DATASET_ID
+    if warehouse_kind == 'embedded':
+        import src.warehouse as warehouses
+        warehouse = warehouses.EmbeddedWarehouse(os.path.join(work_dir, 'warehouse.duckdb'))
+        # Served in place of the configured warehouse of the default project and dataset
+        warehouses._warehouses[(PROJECT_ID, DATASET_ID)] = warehouse
+    else:
+        warehouse = SqliteWarehouse(os.path.join(work_dir, 'warehouse.db'))
+        install_standins(warehouse)
+        warehouse.dataset = DATASET_ID
+    import src.writer as writer
+    from src.extract import extract
+    from src.transform import transform
+    from src.load import load
+    from src.utils import process_scd_type2
+    from src.watermark import commit_watermark
+    import src.dedup as dedup
+    from src.dedup import get_dedup_index
+    from src.synthetic import generate
+    writer._writer = writer.BulkWriter(warehouse)
+    # Local caches (manifest, key cache, dedup index) go to the work directory
+    os.chdir(work_dir)
+    dedup._index = dedup.DedupIndex(index_dir='cache/dedup/')
+
+    bucket_dir = os.path.join(work_dir, 'bucket')
+    os.makedirs(bucket_dir)
+    generate(bucket_dir, rows, seed=seed)
+    blobs = list(LocalBucket(bucket_dir).list_blobs())
+
+    records = []
+    _, record = measure('extract', rows, warehouse, lambda: extract(bucket_files=blobs))
+    records.append(record)
+    transformed, record = measure('transform', rows, warehouse, transform)
+    records.append(record)
+    _, record = measure('load', len(transformed['sales']), warehouse, lambda: load(transformed_data=transformed))
+    records.append(record)
+    commit_watermark(transformed['watermark'])
+    get_dedup_index().commit()
+
+    # A second batch where a tenth of the stores moved
+    stores = transformed['stores'].rename(columns={'store': 'store_id'}).astype(str)
+    stores['store_id'] = stores['store_id'].astype(int)
+    moved = np.random.default_rng(seed + 1).random(len(stores)) < 0.1
+    stores.loc[moved, 'address'] = stores.loc[moved, 'address'] + ' Suite 2'
+    _, record = measure('process_scd_type2', len(stores), warehouse, lambda: process_scd_type2(
+        stores, 'Store_Dim', 'store_id', ['address', 'city', 'zipcode', 'county_number', 'county']))
+    records.append(record)
+    return records
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--output', default=None, help='JSON results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--warehouse', choices=['standin', 'embedded'], default='standin',
+                        help='BigQuery stand-in (default) or the embedded DuckDB/SQLite warehouse')
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        with tempfile.TemporaryDirectory(prefix='pipeline_bench_') as work_dir:
+            records = run_scale(args.worker, work_dir, seed=args.seed, warehouse_kind=args.warehouse)
+        json.dump(records, sys.stdout)
+        return
+
+    commit = git_commit()
+    results = []
+    for rows in args.scales:
+        print(f"Scale {rows:,} rows")
+        worker = subprocess.run([sys.executable, '-m', 'benchmarks.pipeline_bench', '--worker', str(rows),
+                                 '--seed', str(args.seed), '--warehouse', args.warehouse], cwd=REPO_ROOT, capture_output=True, text=True)
+        if worker.returncode:
+            print(worker.stdout[-2000:], worker.stderr[-2000:], sep='\n')
+            raise SystemExit(f"Benchmark at {rows} rows failed")
+        records = json.loads(worker.stdout.strip().splitlines()[-1])
+        for record in records:
+            print(f"  {record['stage']:<18} {record['wall_s']:8.2f} s {record['rows_per_s'] or 0:>12,.0f} rows/s "
+                  f"{record['peak_rss_mb']:>8.0f} MB {str(record['round_trips']):>5} round-trips")
+            results.append({'scale': rows, **record})
+
+    output = args.output or os.path.join(REPO_ROOT, 'benchmarks', 'results', f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'warehouse': args.warehouse,
+            'results': results,
+        }, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Parse throughput of one large CSV: a single sequential pd.read_csv vs record-aligned byte
+ranges parsed concurrently (src/splitter.py), by worker count.
+
+The file comes from src/synthetic.py; every worker count must reproduce the sequential rows.
+
+Usage:
+    python -m benchmarks.split_bench --rows 5000000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import pandas as pd
+from src.config import BATCH_SIZE, SPLIT_RANGE_BYTES
+from src.splitter import iter_csv_chunks
+from src.synthetic import generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 4])
+    parser.add_argument('--range-bytes', type=int, default=SPLIT_RANGE_BYTES)
+    parser.add_argument('--output', default=None, help='Optional JSON results file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        generate(work, args.rows, rows_per_file=args.rows)
+        path = os.path.join(work, 'chunk_0000.csv')
+        size = os.path.getsize(path)
+        print(f"{args.rows:,} rows, {size / 1e6:.0f} MB, {os.cpu_count()} CPUs")
+
+        start = time.perf_counter()
+        baseline = pd.concat(pd.read_csv(path, chunksize=BATCH_SIZE, dtype=str), ignore_index=True)
+        sequential_s = time.perf_counter() - start
+        print(f"sequential read_csv  {sequential_s:7.2f} s  {size / sequential_s / 1e6:7.1f} MB/s")
+
+        results = [{'workers': 0, 'seconds': round(sequential_s, 3)}]
+        for workers in sorted(set(args.workers)):
+            start = time.perf_counter()
+            parsed = pd.concat(iter_csv_chunks(path, range_bytes=args.range_bytes, workers=workers),
+                               ignore_index=True)
+            seconds = time.perf_counter() - start
+            pd.testing.assert_frame_equal(parsed, baseline)
+            results.append({'workers': workers, 'seconds': round(seconds, 3),
+                            'speedup': round(sequential_s / seconds, 2)})
+            print(f"{workers:>3} workers          {seconds:7.2f} s  {size / seconds / 1e6:7.1f} MB/s  "
+                  f"speed-up {sequential_s / seconds:5.2f}x")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'rows': args.rows, 'bytes': size, 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Local stand-ins for Google Cloud Storage and BigQuery used by the offline benchmarks.
+
+LocalBucket serves a directory through the subset of the storage Bucket/Blob API the
+pipeline uses, and LocalStorageClient a directory of them. SqliteWarehouse is an embedded SQLite database that answers the
+pipeline's BigQuery SQL (read_gbq, client.query, load jobs) after a small dialect
+translation, and counts every round-trip a real warehouse would have served.
+"""
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import threading
+from functools import wraps
+from types import SimpleNamespace
+import pandas as pd
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from src.schema import table_columns
+from src.warehouse import _SQLITE_TYPES, _TABLE_REF, _TYPED_LITERAL, _sqlite_frame, _sqlite_literal
+
+_ADD_COLUMN = re.compile(r"ALTER TABLE\s+(\w+)\s+ADD COLUMN IF NOT EXISTS\s+(\w+)\s+(\w+)", re.IGNORECASE)
+_MERGE = re.compile(
+    r"MERGE\s+(?P<target>\w+)\s+T\s+USING\s*\((?P<source>.*)\)\s*S\s+ON\s+(?P<on>.*?)\s+"
+    r"WHEN MATCHED AND\s+(?P<matched>.*?)\s+THEN\s+UPDATE SET\s+(?P<set>.*?)\s+"
+    r"WHEN NOT MATCHED(?: BY TARGET)? THEN\s+INSERT\s*\((?P<columns>[^)]*)\)\s*VALUES\s*\((?P<values>.*)\)\s*$",
+    re.DOTALL | re.IGNORECASE)
+
+
+def _farm_fingerprint(value):
+    """Deterministic signed 64-bit fingerprint (FARM_FINGERPRINT stand-in)."""
+    if value is None:
+        return None
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'little', signed=True)
+
+
+class LocalBlob:
+    """A file under a LocalBucket root, exposing the Blob attributes the pipeline reads."""
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns
+        self.md5_hash = None
+
+    def open(self, mode='rb', chunk_size=None):
+        return open(self.path, mode)
+
+    def download_to_filename(self, file_path):
+        with open(self.path, 'rb') as src, open(file_path, 'wb') as dst:
+            dst.write(src.read())
+
+
+class LocalBucket:
+    """A directory standing in for a GCS bucket."""
+
+    def __init__(self, root):
+        self.root = root
+        self.name = os.path.basename(os.path.normpath(root))
+
+    def list_blobs(self, prefix=None, start_offset=None):
+        names = []
+        for dir_path, _, files in os.walk(self.root):
+            for file_name in files:
+                names.append(os.path.relpath(os.path.join(dir_path, file_name), self.root).replace(os.sep, '/'))
+        for name in sorted(names):
+            if prefix and not name.startswith(prefix):
+                continue
+            if start_offset and name < start_offset:
+                continue
+            yield LocalBlob(self.root, name)
+
+    def get_blob(self, name):
+        if not os.path.isfile(os.path.join(self.root, name)):
+            return None
+        return LocalBlob(self.root, name)
+
+
+class LocalStorageClient:
+    """A directory of bucket directories standing in for a storage.Client."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def bucket(self, name):
+        return LocalBucket(os.path.join(self.root, name))
+
+    get_bucket = bucket
+
+
+class _Job:
+    def __init__(self, frame=None, inserted=0, updated=0):
+        self.frame = frame
+        self.dml_stats = SimpleNamespace(inserted_row_count=inserted, updated_row_count=updated)
+        self.num_dml_affected_rows = inserted + updated
+
+    def result(self, page_size=None):
+        self.page_size = page_size
+        return self
+
+    def to_dataframe(self):
+        return self.frame
+
+    def to_dataframe_iterable(self):
+        step = self.page_size or max(len(self.frame), 1)
+        for start in range(0, len(self.frame), step):
+            yield self.frame.iloc[start:start + step].reset_index(drop=True)
+
+
+def _serialized(method):
+    """Run a warehouse method under its lock: the pipeline calls it from several threads."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class SqliteWarehouse:
+    """
+    Embedded SQLite database answering the pipeline's BigQuery calls.
+
+    Tables declared in sql/ are created up front. `round_trips` counts queries and load
+    jobs, i.e. the calls that would each be a network round-trip to BigQuery.
+    """
+
+    def __init__(self, path=':memory:', dataset=None):
+        self.dataset = dataset
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.create_function('FARM_FINGERPRINT', 1, _farm_fingerprint, deterministic=True)
+        self.conn.create_function('TO_JSON_STRING', 1, lambda value: value, deterministic=True)
+        self.round_trips = 0
+        for table, columns in table_columns().items():
+            self.create(table, [(name, sql_type) for name, sql_type, _ in columns])
+
+    # Dialect translation
+    def translate(self, sql):
+        sql = _TABLE_REF.sub(lambda m: m.group(1), sql)
+        if self.dataset:
+            sql = re.sub(rf"\b{re.escape(self.dataset)}\.", "", sql)
+        sql = _TYPED_LITERAL.sub(_sqlite_literal, sql)
+        sql = re.sub(r"STRUCT\(", "json_array(", sql)
+        sql = re.sub(r"CURRENT_DATE\(\)", "DATE('now')", sql)
+        return sql
+
+    def create(self, table, columns):
+        """Create table from (name, SQL type) pairs unless it exists."""
+        definition = ', '.join(f"{name} {_SQLITE_TYPES.get(sql_type.split('(')[0].upper(), 'TEXT')}"
+                               for name, sql_type in columns)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+
+    def _execute(self, sql):
+        try:
+            return self.conn.execute(sql)
+        except sqlite3.OperationalError as e:
+            if 'no such table' in str(e):
+                raise NotFound(str(e)) from e
+            raise
+
+    # BigQuery entry points
+    @_serialized
+    def read_gbq(self, query, project_id=None, **kwargs):
+        self.round_trips += 1
+        try:
+            return pd.read_sql_query(self.translate(query), self.conn)
+        except pd.errors.DatabaseError as e:
+            if 'no such table' in str(e):
+                raise NotFound(str(e)) from e
+            raise
+
+    @_serialized
+    def query(self, sql, job_config=None):
+        self.round_trips += 1
+        sql = self.translate(sql).strip()
+        add_column = _ADD_COLUMN.match(sql)
+        if add_column:
+            table, column, sql_type = add_column.groups()
+            existing = [row[1] for row in self._execute(f"PRAGMA table_info({table})")]
+            if column not in existing:
+                self._execute(f"ALTER TABLE {table} ADD COLUMN {column} {_SQLITE_TYPES.get(sql_type.upper(), 'TEXT')}")
+            return _Job()
+        merge = _MERGE.match(sql)
+        if merge:
+            return self._merge(**merge.groupdict())
+        if sql.upper().startswith(('SELECT', 'WITH')):
+            return _Job(frame=pd.read_sql_query(sql, self.conn))
+        cursor = self._execute(sql)
+        self.conn.commit()
+        return _Job(updated=max(cursor.rowcount, 0))
+
+    def _merge(self, target, source, on, matched, set, columns, values):
+        """MERGE with one WHEN MATCHED ... UPDATE and one WHEN NOT MATCHED ... INSERT clause."""
+        self._execute("DROP TABLE IF EXISTS temp._merge_source")
+        self._execute(f"CREATE TEMP TABLE _merge_source AS {source}")
+        # Rows to insert are decided against the target before the update, as in MERGE
+        self._execute("DROP TABLE IF EXISTS temp._merge_insert")
+        self._execute(f"CREATE TEMP TABLE _merge_insert AS SELECT S.* FROM _merge_source S "
+                      f"WHERE NOT EXISTS (SELECT 1 FROM {target} T WHERE {on})")
+        assignments = re.sub(r"\bT\.", "", set)
+        updated = self._execute(
+            f"UPDATE {target} AS T SET {assignments} FROM _merge_source S WHERE {on} AND {matched}").rowcount
+        inserted = self._execute(
+            f"INSERT INTO {target} ({columns}) SELECT {values} FROM _merge_insert S").rowcount
+        self.conn.commit()
+        return _Job(inserted=inserted, updated=updated)
+
+    @_serialized
+    def load(self, table, parquet_bytes, replace=False):
+        """BulkWriter backend entry point: append (or replace) a table from Parquet bytes."""
+        self.round_trips += 1
+        frame = _sqlite_frame(pq.read_table(io.BytesIO(parquet_bytes)).to_pandas())
+        frame.to_sql(table, self.conn, if_exists='replace' if replace else 'append', index=False)
+
+    # google.cloud.bigquery.Client surface
+    def client(self, *args, **kwargs):
+        return _Client(self)
+
+    @_serialized
+    def table_counts(self):
+        tables = [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+
+class _Client:
+    """The bigquery.Client methods the pipeline calls, served by a SqliteWarehouse."""
+
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+
+    def query(self, sql, job_config=None):
+        return self.warehouse.query(sql, job_config)
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None, rewind=False):
+        if rewind:
+            file_obj.seek(0)
+        disposition = getattr(job_config, 'write_disposition', None)
+        self.warehouse.load(table_id.split('.')[-1], file_obj.read(), replace=disposition == 'WRITE_TRUNCATE')
+        return _Job()
+
+    def get_table(self, table_id):
+        return SimpleNamespace(table_id=table_id, expires=None)
+
+    def update_table(self, table, fields):
+        return table
+
+    def delete_table(self, table_id, not_found_ok=False):
+        with self.warehouse.lock:
+            self.warehouse.conn.execute(f"DROP TABLE IF EXISTS {table_id.split('.')[-1]}")
+
+    def create_table(self, table):
+        with self.warehouse.lock:
+            self.warehouse.round_trips += 1
+            self.warehouse.create(table.table_id, [(field.name, field.field_type) for field in table.schema])
+
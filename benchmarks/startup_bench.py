@@ -0,0 +1,139 @@
+"""
+Cold-start cost of a job run: import time of src.main and time to first byte of `python -m src.main`.
+
+Every measurement runs in a fresh interpreter. Import time is the wall time of
+`import src.main`, with the slowest libraries it imports taken from `python -X importtime`.
+Time to first byte is measured on an event run (INPUT_FILE) over one small generated file:
+from process start until the job prints its first line, and until it exits. The run goes
+to the offline stand-ins of benchmarks/standins.py, registered as the process's clients,
+so no Google Cloud library is imported that the pipeline itself does not import.
+
+Usage:
+    python -m benchmarks.startup_bench --repeat 5 --rows 10000
+"""
+import argparse
+import json
+import os
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(work_dir):
+    """Run src.main as `python -m src.main` would, against stand-in clients under work_dir."""
+    from benchmarks.standins import LocalStorageClient, SqliteWarehouse
+    from src import clients, warehouse as warehouses
+    from src.config import PROJECT_ID, DATASET_ID
+    warehouse = SqliteWarehouse(os.path.join(work_dir, 'warehouse.db'))
+    warehouse.dataset = DATASET_ID
+    clients._clients[('storage', PROJECT_ID)] = LocalStorageClient(os.path.join(work_dir, 'buckets'))
+    clients._clients[('bigquery', PROJECT_ID)] = warehouse.client()
+    # src.warehouse binds read_gbq when it is imported (the stand-ins import it), so it is replaced there too
+    clients.read_gbq = warehouses.read_gbq = warehouse.read_gbq
+    import src.writer as writer
+    writer._writer = writer.BulkWriter(warehouse)
+    os.chdir(work_dir)
+    runpy.run_module('src.main', run_name='__main__', alter_sys=True)
+
+
+def import_times(top):
+    """
+    Wall time of `import src.main`, and the `top` slowest imports the src modules make.
+
+    `python -X importtime` lists every module after the modules it imported, indented one
+    level deeper. The tree is walked down through src modules only, so each library is
+    reported once, with its cumulative time.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import src.main'], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    children = {0: []}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        node = (name.strip(), int(cumulative) / 1e6, children.pop(depth + 1, []))
+        children.setdefault(depth, []).append(node)
+    is_src = lambda name: name == 'src' or name.startswith('src.')
+    modules = []
+    # Interpreter start-up imports (site, encodings) are roots of their own and skipped
+    pending = [node for node in children[0] if is_src(node[0])]
+    while pending:
+        name, seconds, below = pending.pop()
+        if is_src(name):
+            pending.extend(below)
+        else:
+            modules.append((name, seconds))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return wall, modules[:top]
+
+
+def first_byte(work_dir, env):
+    """Seconds from starting an event run until its first byte of output and until it exits."""
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-u', '-m', 'benchmarks.startup_bench', '--child', work_dir],
+                             cwd=REPO_ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    child.stdout.read(1)
+    ttfb = time.perf_counter() - start
+    _, stderr = child.communicate()
+    total = time.perf_counter() - start
+    if child.returncode:
+        print(stderr.decode()[-2000:])
+        raise SystemExit("Event run failed")
+    return ttfb, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=10_000, help='Rows of the file the event run processes')
+    parser.add_argument('--top', type=int, default=10, help='Slowest imported libraries to list')
+    parser.add_argument('--output', default=None, help='Optional JSON results file')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    from src.config import BUCKET_NAME
+    from src.synthetic import generate
+
+    imports = [import_times(args.top) for _ in range(args.repeat)]
+    import_s = statistics.median(wall for wall, _ in imports)
+    print(f"import src.main      {import_s:7.3f} s (median of {args.repeat})")
+    for name, seconds in imports[-1][1]:
+        print(f"  {name:<30} {seconds:7.3f} s")
+
+    runs = []
+    for _ in range(args.repeat):
+        # A fresh bucket, warehouse and cache directory each time, so every run is cold
+        with tempfile.TemporaryDirectory(prefix='startup_bench_') as work_dir:
+            bucket_dir = os.path.join(work_dir, 'buckets', BUCKET_NAME)
+            os.makedirs(bucket_dir)
+            generate(bucket_dir, args.rows, rows_per_file=args.rows)
+            env = dict(os.environ, INPUT_BUCKET=BUCKET_NAME, INPUT_FILE='chunk_0000.csv')
+            runs.append(first_byte(work_dir, env))
+    ttfb_s = statistics.median(ttfb for ttfb, _ in runs)
+    total_s = statistics.median(total for _, total in runs)
+    print(f"time to first byte   {ttfb_s:7.3f} s")
+    print(f"event run ({args.rows:,} rows) {total_s:7.3f} s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'import_s': round(import_s, 3), 'ttfb_s': round(ttfb_s, 3), 'total_s': round(total_s, 3),
+                       'rows': args.rows, 'repeat': args.repeat,
+                       'slowest_imports': [{'module': name, 'cumulative_s': round(seconds, 3)}
+                                           for name, seconds in imports[-1][1]]}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark the bulk writer against the local stand-in backend: one load job per chunk
+(the previous to_gbq-per-chunk pattern) vs buffered flushes.
+
+Usage:
+    python -m benchmarks.writer_bench --rows 1000000 --chunk 10000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.encoding import encode_numeric_columns, NUMERIC_10_2, NUMERIC_5_2
+from src.writer import BulkWriter, LocalBackend
+
+
+def make_sales_fact(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'invoice_line_no': np.char.add('INV-', np.arange(rows).astype(str)),
+        'store': rng.integers(1, 2000, rows),
+        'date_key': rng.integers(20200101, 20241231, rows),
+        'store_key': rng.integers(0, 2000, rows),
+        'item_key': rng.integers(0, 10000, rows),
+        'vendor_key': rng.integers(0, 300, rows),
+        'revenue': rng.uniform(1, 500, rows),
+        'profit': rng.uniform(0, 150, rows),
+        'cost': rng.uniform(1, 350, rows),
+        'total_bottles_sold': rng.integers(1, 48, rows),
+        'total_volume_sold_in_liters': rng.uniform(0, 30, rows),
+        'profit_margin': rng.uniform(0, 60, rows),
+        'average_bottle_price': rng.uniform(1, 80, rows),
+        'volume_per_bottle_sold': rng.uniform(0, 2, rows),
+        'processed_timestamp': pd.Timestamp.now(),
+    })
+    encode_numeric_columns(df, ['revenue', 'profit', 'cost', 'total_volume_sold_in_liters',
+                                'average_bottle_price', 'volume_per_bottle_sold'], *NUMERIC_10_2)
+    encode_numeric_columns(df, ['profit_margin'], *NUMERIC_5_2, clip=True)
+    return df
+
+
+def run(df, chunk, max_rows):
+    root = tempfile.mkdtemp(prefix='writer_bench_')
+    try:
+        backend = LocalBackend(root)
+        writer = BulkWriter(backend, max_rows=max_rows, max_latency=float('inf'))
+        start = time.perf_counter()
+        for offset in range(0, len(df), chunk):
+            writer.write('Sales_Fact', df.iloc[offset:offset + chunk])
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        assert len(backend.read('Sales_Fact')) == len(df)
+        return elapsed, writer.stats['jobs']
+    finally:
+        shutil.rmtree(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--chunk', type=int, default=10_000)
+    args = parser.parse_args()
+
+    df = make_sales_fact(args.rows)
+    for label, max_rows in [('job per chunk', args.chunk), ('buffered', 500_000)]:
+        elapsed, jobs = run(df, args.chunk, max_rows)
+        print(f"{label:<15} {elapsed:7.2f} s  {args.rows / elapsed:>12,.0f} rows/s  {jobs:>5} load jobs")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,33 @@
 DROP TABLE IF EXISTS Processed_Files;
 CREATE TABLE Processed_Files (
     file_name TEXT PRIMARY KEY,
-    processed_timestamp DATETIME
-);
\ No newline at end of file
+    processed_timestamp TIMESTAMP
+);
+
+DROP TABLE IF EXISTS Transform_Watermark;
+CREATE TABLE Transform_Watermark (
+    run_id TEXT,
+    file_name TEXT,
+    high_water_mark DATETIME,
+    committed_at TIMESTAMP
+);
+
+DROP TABLE IF EXISTS Shard_Progress;
+CREATE TABLE Shard_Progress (
+    file_name TEXT,
+    generation INTEGER,
+    shard_index INTEGER,
+    shard_count INTEGER,
+    row_count INTEGER,
+    completed_at TIMESTAMP
+);
+
+DROP TABLE IF EXISTS Extract_Checkpoint;
+CREATE TABLE Extract_Checkpoint (
+    file_name TEXT,
+    generation INTEGER,
+    byte_offset INTEGER,
+    chunk_index INTEGER,
+    chunk_id TEXT,
+    committed_at TIMESTAMP
+);
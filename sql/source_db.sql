@@ -25,5 +25,6 @@ CREATE TABLE smooth-hub-460704-v8.liquor_sale_.Staging_Sales (
     sale_liters STRING,
     sale_gallons STRING,
     file_name STRING NOT NULL,
-    processed_timestamp DATETIME NOT NULL
+    processed_timestamp DATETIME NOT NULL,
+    chunk_id STRING
 );
\ No newline at end of file
@@ -27,7 +27,8 @@ CREATE TABLE `smooth-hub-460704-v8.liquor_sale_.Store_Dim` (
   county STRING,
   start_date DATE NOT NULL,
   end_date DATE,
-  is_active BOOL DEFAULT TRUE
+  is_active BOOL DEFAULT TRUE,
+  row_hash INT64 -- FARM_FINGERPRINT of the version's attributes
 );
 
 -- Item Dimension (SCD Type 2)
@@ -43,7 +44,8 @@ CREATE TABLE `smooth-hub-460704-v8.liquor_sale_.Item_Dim` (
   state_bottle_retail NUMERIC(10, 2),
   start_date DATE NOT NULL,
   end_date DATE,
-  is_active BOOL DEFAULT TRUE
+  is_active BOOL DEFAULT TRUE,
+  row_hash INT64 -- FARM_FINGERPRINT of the version's attributes
 );
 
 -- Vendor Dimension (SCD Type 2)
@@ -53,7 +55,8 @@ CREATE TABLE `smooth-hub-460704-v8.liquor_sale_.Vendor_Dim` (
   vendor_name STRING,
   start_date DATE NOT NULL,
   end_date DATE,
-  is_active BOOL DEFAULT TRUE
+  is_active BOOL DEFAULT TRUE,
+  row_hash INT64 -- FARM_FINGERPRINT of the version's attributes
 );
 
 -- Sales Fact Table
@@ -0,0 +1,126 @@
+import asyncio
+import random
+import threading
+from google.api_core import exceptions as api_exceptions
+from google.auth import exceptions as auth_exceptions
+from requests import exceptions as requests_exceptions
+from src.config import IO_CONCURRENCY, IO_TIMEOUT, IO_RETRIES, IO_BACKOFF
+from src.metrics import get_metrics
+
+# Errors after which the attempt has stopped and a call can be repeated
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.ServiceUnavailable,
+    # Connection resets and failed credential refreshes surface from the HTTP transport
+    # underneath the client libraries, not as API errors
+    ConnectionError,
+    requests_exceptions.ConnectionError,
+    auth_exceptions.TransportError,
+)
+# Errors after which the request may still complete server-side; only idempotent calls are repeated
+AMBIGUOUS_ERRORS = (api_exceptions.GatewayTimeout, api_exceptions.DeadlineExceeded,
+                    requests_exceptions.ReadTimeout)
+
+_loop = None
+_loop_thread = None
+_semaphores = {}
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Process-wide event loop, run by a daemon thread, that every awaitable I/O call runs on."""
+    global _loop, _loop_thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name='aio', daemon=True)
+            _loop_thread.start()
+    return _loop
+
+
+def _semaphore(kind):
+    # Only touched from the loop thread
+    if kind not in _semaphores:
+        _semaphores[kind] = asyncio.Semaphore(IO_CONCURRENCY.get(kind, 1))
+    return _semaphores[kind]
+
+
+def _retryable(error, idempotent):
+    # A timed-out attempt is still running in its thread, so it is never repeated
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return idempotent and isinstance(error, AMBIGUOUS_ERRORS)
+
+
+async def call(func, *args, kind='warehouse', timeout=IO_TIMEOUT, retries=IO_RETRIES, idempotent=False,
+               span=None, **kwargs):
+    """
+    Run a blocking call in a worker thread, under the concurrency limit of its kind.
+
+    Each attempt is bounded by `timeout` seconds; errors after which the attempt has
+    stopped are retried with jittered exponential backoff. A timed-out attempt cannot be
+    interrupted and finishes in its thread, so a timeout is raised, never retried: a
+    second MERGE or load job would run alongside the first. Gateway timeouts, after
+    which the request may still complete, are retried for idempotent calls (reads) only.
+
+    Args:
+        func (callable): Blocking function, e.g. a warehouse query or load job.
+        kind (str): IO_CONCURRENCY key: 'warehouse' (queries, MERGEs) or 'load' (load jobs).
+        idempotent (bool): Whether running func twice is harmless, e.g. a SELECT.
+        span: Metrics span the call's counters belong to (default: the caller's current span).
+
+    Returns:
+        The return value of func.
+    """
+    metrics = get_metrics()
+
+    def attached():
+        with metrics.attach(span):
+            return func(*args, **kwargs)
+
+    name = getattr(func, '__qualname__', repr(func))
+    async with _semaphore(kind):
+        for attempt in range(retries + 1):
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(attached), timeout)
+            except Exception as e:
+                if attempt == retries or not _retryable(e, idempotent):
+                    raise
+                delay = IO_BACKOFF * 2 ** attempt * (0.5 + random.random())
+                print(f"Retrying {name} in {delay:.1f} s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+
+
+def submit(func, *args, **kwargs):
+    """
+    Start call(func, ...) on the I/O loop without waiting for it.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the return value of func.
+    """
+    kwargs.setdefault('span', get_metrics().current())
+    return asyncio.run_coroutine_threadsafe(call(func, *args, **kwargs), get_loop())
+
+
+def gather(*calls):
+    """
+    Run several blocking calls concurrently and wait for all of them.
+
+    Args:
+        calls: (func, args) or (func, args, kwargs) tuples; kwargs may include call()'s
+            kind, timeout, retries and idempotent.
+
+    Returns:
+        list: The return values, in the order of calls. The first error is raised once
+        every call has finished.
+    """
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("aio.gather() blocks and cannot run on the I/O loop; await call() instead")
+    futures = [submit(func, *args, **(options[0] if options else {})) for func, args, *options in calls]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [future.result() for future in futures]
@@ -0,0 +1,99 @@
+import pandas as pd
+from src.config import PROJECT_ID, DATASET_ID, CALENDAR_START_YEAR, CALENDAR_END_YEAR
+from src.warehouse import get_warehouse
+from src.key_resolution import date_keys
+from src.writer import get_writer
+
+# (warehouse, project, dataset) -> (first date, last date) of the keyed calendar in its
+# Date_Dim, once read in this process
+_spans = {}
+
+
+def build_calendar(start, end):
+    """
+    Build Date_Dim rows for every day from start to end inclusive.
+
+    Returns:
+        pd.DataFrame: date_key, date, year, month, day, quarter, weekday.
+    """
+    dates = pd.Series(pd.date_range(start, end, freq='D'))
+    return pd.DataFrame({
+        'date_key': date_keys(dates),
+        'date': dates.dt.date,
+        'year': dates.dt.year,
+        'month': dates.dt.month,
+        'day': dates.dt.day,
+        'quarter': dates.dt.quarter,
+        'weekday': dates.dt.day_name(),
+    })
+
+
+def _span_key(project_id, dataset_name):
+    return get_warehouse(project_id, dataset_name), project_id, dataset_name
+
+
+def calendar_span(project_id=PROJECT_ID, dataset_name=DATASET_ID):
+    """First and last date of the keyed calendar in Date_Dim, or None if it is empty."""
+    key = _span_key(project_id, dataset_name)
+    if _spans.get(key) is None:
+        query = f"SELECT MIN(date) AS first_date, MAX(date) AS last_date " \
+                f"FROM `{project_id}.{dataset_name}.Date_Dim` WHERE date_key IS NOT NULL"
+        row = key[0].read(query).iloc[0]
+        if not pd.isna(row['first_date']):
+            _spans[key] = (pd.Timestamp(row['first_date']), pd.Timestamp(row['last_date']))
+    return _spans.get(key)
+
+
+def ensure_calendar(dates, start_year=CALENDAR_START_YEAR, end_year=CALENDAR_END_YEAR,
+                    project_id=PROJECT_ID, dataset_name=DATASET_ID):
+    """
+    Make sure Date_Dim covers every date in `dates`.
+
+    An empty Date_Dim is pre-built for start_year..end_year (widened to the batch). After
+    that only whole years missing before or after the current span are appended, so a
+    batch inside the span costs no writes.
+
+    Args:
+        dates (pd.Series): Dates of the batch.
+
+    Returns:
+        int: Number of Date_Dim rows added.
+    """
+    dates = pd.to_datetime(pd.Series(dates), errors='coerce').dropna()
+    span = calendar_span(project_id, dataset_name)
+    ranges = []
+    if span is None:
+        first = pd.Timestamp(year=start_year, month=1, day=1)
+        last = pd.Timestamp(year=end_year, month=12, day=31)
+        if not dates.empty:
+            first = min(first, pd.Timestamp(year=dates.min().year, month=1, day=1))
+            last = max(last, pd.Timestamp(year=dates.max().year, month=12, day=31))
+        ranges.append((first, last))
+        span = (first, last)
+    elif not dates.empty:
+        first, last = span
+        if dates.min() < first:
+            ranges.append((pd.Timestamp(year=dates.min().year, month=1, day=1), first - pd.Timedelta(days=1)))
+            first = ranges[-1][0]
+        if dates.max() > last:
+            ranges.append((last + pd.Timedelta(days=1), pd.Timestamp(year=dates.max().year, month=12, day=31)))
+            last = ranges[-1][1]
+        span = (first, last)
+    if not ranges:
+        return 0
+
+    writer = get_writer()
+    added = 0
+    for first, last in ranges:
+        calendar = build_calendar(first, last)
+        writer.write('Date_Dim', calendar)
+        added += len(calendar)
+        print(f"Added Date_Dim rows for {first.date()} to {last.date()}")
+    writer.flush('Date_Dim')
+    _spans[_span_key(project_id, dataset_name)] = span
+    return added
+
+
+if __name__ == '__main__':
+    # Pre-build the calendar for the configured year range
+    print(f"Date_Dim rows added: {ensure_calendar(pd.Series([], dtype='datetime64[ns]'))}")
@@ -0,0 +1,160 @@
+import os
+from datetime import datetime, timezone
+import pandas as pd
+from google.api_core.exceptions import GoogleAPIError
+from src.config import PROJECT_ID, DATASET_ID, EXTRACT_CHECKPOINT_ROWS
+from src.warehouse import get_warehouse
+from src.writer import get_writer
+
+# Position of a file none of whose chunks are committed
+START = (0, -1)
+
+
+class ExtractCheckpoints:
+    """
+    Progress of the files extract() stages, so a restarted run resumes each file where the last one stopped.
+
+    A chunk is identified by its file, the file's generation and its position: the start
+    of the record-aligned byte range it was parsed from and its index in that range (see
+    iter_csv_chunks). A file is recorded in Extract_Checkpoint when it is started, before
+    any of its rows are staged, and again every `every_rows` staged rows with its last
+    staged chunk, once the rows up to that chunk are loaded.
+
+    Staged rows carry their chunk ID. A resumed file skips the ranges before its
+    checkpoint and every chunk already in Staging_Sales, including chunks loaded after
+    the checkpoint was written, so no chunk is staged twice. A shard of a file (see
+    extract_shard) only uses the checkpoints inside its own byte range.
+    """
+
+    def __init__(self, project_id=PROJECT_ID, dataset_name=DATASET_ID, every_rows=EXTRACT_CHECKPOINT_ROWS):
+        self.project_id = project_id
+        self.dataset_name = dataset_name
+        self.every_rows = every_rows
+        self.generations = {}
+        self.positions = {}
+        self.staged = {}
+        self.progress = {}
+        self.rows = 0
+        self._migrated = False
+
+    def _table(self, table):
+        return f"`{self.project_id}.{self.dataset_name}.{table}`"
+
+    def _write(self, positions):
+        writer = get_writer()
+        writer.write('Extract_Checkpoint', pd.DataFrame({
+            'file_name': list(positions),
+            'generation': [self.generations[name] for name in positions],
+            'byte_offset': [range_start for range_start, _ in positions.values()],
+            'chunk_index': [index for _, index in positions.values()],
+            'chunk_id': [self.chunk_id(name, *position) if position[1] != START[1] else None
+                         for name, position in positions.items()],
+            'committed_at': datetime.now(timezone.utc),
+        }))
+        writer.flush('Extract_Checkpoint')
+
+    def begin(self, blobs, byte_range=None):
+        """
+        Look up the checkpoints of the files about to be staged and record the others as started.
+
+        Args:
+            blobs (list): Blobs of the new files.
+            byte_range (tuple): (start, end) of the shard being staged; only checkpoints
+                in [start, end) are used (default: the whole file).
+
+        Returns:
+            dict: Blob name -> byte offset to resume from, for files with a checkpoint.
+        """
+        warehouse = get_warehouse(self.project_id, self.dataset_name)
+        if not self._migrated:
+            # Staging tables created before chunk IDs existed gain the column on first use
+            warehouse.add_column('Staging_Sales', 'chunk_id')
+            self._migrated = True
+        blobs = {os.path.basename(blob.name): blob for blob in blobs}
+        if not blobs:
+            return {}
+        self.generations.update({name: getattr(blob, 'generation', None) or 0 for name, blob in blobs.items()})
+        names = ', '.join(f"'{name}'" for name in blobs)
+        query = f"""
+            SELECT file_name, generation, byte_offset, chunk_index FROM {self._table('Extract_Checkpoint')}
+            WHERE file_name IN ({names})
+        """
+        try:
+            rows = warehouse.read(query)
+        except GoogleAPIError as e:
+            if "404" not in str(e):
+                raise
+            print("Extract_Checkpoint table not found. Creating it...")
+            warehouse.create_table('Extract_Checkpoint')
+            rows = pd.DataFrame(columns=['file_name', 'generation', 'byte_offset', 'chunk_index'])
+        # An overwritten object starts over
+        rows = rows[pd.to_numeric(rows['generation']) == rows['file_name'].map(self.generations)]
+        first = START
+        if byte_range is not None:
+            rows = rows[pd.to_numeric(rows['byte_offset']).between(byte_range[0], byte_range[1] - 1)]
+            first = (byte_range[0], START[1])
+        # The table is authoritative; another shard of a file may have run in this process
+        for name in blobs:
+            self.positions.pop(name, None)
+            self.staged.pop(name, None)
+        for name, group in rows.groupby('file_name'):
+            self.positions[name] = max(zip(group['byte_offset'].astype(int), group['chunk_index'].astype(int)))
+
+        resumed = [name for name in blobs if name in self.positions]
+        if resumed:
+            query = f"""
+                SELECT DISTINCT file_name, chunk_id FROM {self._table('Staging_Sales')}
+                WHERE file_name IN ({', '.join(f"'{name}'" for name in resumed)}) AND chunk_id IS NOT NULL
+            """
+            staged = warehouse.read(query)
+            for name in resumed:
+                self.staged[name] = set(staged.loc[staged['file_name'] == name, 'chunk_id'])
+                print(f"Resuming {name} from byte {self.positions[name][0]}: "
+                      f"{len(self.staged[name])} chunks already staged")
+        started = {name: first for name in blobs if name not in self.positions}
+        if started:
+            self._write(started)
+            self.positions.update(started)
+        return {blob.name: self.positions[name][0] for name, blob in blobs.items() if name in resumed}
+
+    def chunk_id(self, file_name, range_start, index):
+        """Stable ID of the index-th chunk of the byte range starting at range_start."""
+        return f"{file_name}:{self.generations.get(file_name, 0)}:{range_start}:{index}"
+
+    def is_staged(self, file_name, range_start, index):
+        """Whether an earlier run already staged this chunk."""
+        return (range_start, index) <= self.positions.get(file_name, START) \
+            or self.chunk_id(file_name, range_start, index) in self.staged.get(file_name, ())
+
+    def staged_chunk(self, file_name, range_start, index, rows):
+        """Note a chunk handed to the bulk writer, committing a checkpoint every every_rows rows."""
+        self.progress[file_name] = (range_start, index)
+        self.rows += rows
+        if self.rows >= self.every_rows:
+            self.commit()
+
+    def commit(self):
+        """Load the staged chunks and record each file's last staged chunk as committed."""
+        if not self.progress:
+            return
+        # The checkpoint must never land before the rows it covers
+        get_writer().flush('Staging_Sales')
+        self._write(self.progress)
+        self.positions.update(self.progress)
+        self.progress, self.rows = {}, 0
+
+    def finish(self, file_name):
+        """Forget a file marked processed; its Processed_Files marker supersedes its checkpoints."""
+        for progress in (self.positions, self.staged, self.progress):
+            progress.pop(file_name, None)
+
+
+_checkpoints = None
+
+
+def get_checkpoints():
+    """Process-wide ExtractCheckpoints."""
+    global _checkpoints
+    if _checkpoints is None:
+        _checkpoints = ExtractCheckpoints()
+    return _checkpoints
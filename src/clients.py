@@ -0,0 +1,70 @@
+import threading
+from src.config import PROJECT_ID, DB_URL, HTTP_POOL_SIZE
+
+# Scope covering BigQuery and Cloud Storage
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
+
+_clients = {}
+# Reentrant: building a client looks up the credentials and session it shares
+_lock = threading.RLock()
+
+
+def _get(key, factory):
+    with _lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def get_credentials():
+    """Application default credentials, discovered once per process."""
+    def discover():
+        import google.auth
+        credentials, _ = google.auth.default(scopes=SCOPES)
+        return credentials
+    return _get('credentials', discover)
+
+
+def get_session():
+    """
+    Authorized HTTP session shared by every client, so they reuse one token and one
+    connection pool of HTTP_POOL_SIZE connections per host (enough for the concurrent
+    extract workers, split workers and I/O-layer calls).
+    """
+    def connect():
+        from requests.adapters import HTTPAdapter
+        from google.auth.transport.requests import AuthorizedSession
+        session = AuthorizedSession(get_credentials())
+        session.mount('https://', HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+        return session
+    return _get('session', connect)
+
+
+def get_bigquery_client(project_id=PROJECT_ID):
+    """BigQuery client for project_id, created on first use and shared by all callers."""
+    def connect():
+        from google.cloud import bigquery
+        return bigquery.Client(project=project_id, credentials=get_credentials(), _http=get_session())
+    return _get(('bigquery', project_id), connect)
+
+
+def get_storage_client(project_id=PROJECT_ID):
+    """Cloud Storage client for project_id, created on first use and shared by all callers."""
+    def connect():
+        from google.cloud import storage
+        return storage.Client(project=project_id, credentials=get_credentials(), _http=get_session())
+    return _get(('storage', project_id), connect)
+
+
+def get_engine(url=DB_URL):
+    """SQLAlchemy engine (and its connection pool) for the local database, created on first use."""
+    def connect():
+        from sqlalchemy import create_engine
+        return create_engine(url)
+    return _get(('engine', url), connect)
+
+
+def read_gbq(query, project_id=PROJECT_ID):
+    """pandas_gbq.read_gbq with the shared credentials, so no query repeats credential discovery."""
+    import pandas_gbq
+    return pandas_gbq.read_gbq(query, project_id=project_id, credentials=get_credentials())
@@ -1,18 +1,93 @@
-from sqlalchemy import create_engine
-from google.cloud import bigquery
 # Configuration
 INPUT_DIR = 'input/'
 PROCESSED_DIR = 'processed/'
+KEY_CACHE_DIR = 'cache/keys/'
+# Processed-file manifest: local index of processed objects plus the bucket listing marker
+MANIFEST_DIR = 'cache/manifest/'
+MANIFEST_FULL_LISTING = False  # set when new object names do not sort after older ones
+# Hashes of (invoice_line_no, store) already in Sales_Fact; a local directory or a gs:// URI.
+# Kept in the bucket (BUCKET_NAME) so every job execution reuses it; workflow.yaml ignores _state/
+DEDUP_INDEX_DIR = 'gs://chisphung_etl_process/_state/dedup/'
+# Rows load() rejects, as Parquet partitioned by reject reason and run; a local directory or
+# a gs:// URI (Cloud Run's disk does not outlive the job). Replay: python -m src.dead_letter replay
+DEAD_LETTER_DIR = 'dead_letter/'
 BATCH_SIZE = 10000
+# Date_Dim is pre-built for these years and extended a whole year at a time when needed
+CALENDAR_START_YEAR = 2012
+CALENDAR_END_YEAR = 2030
+# Streaming extract: blobs read concurrently straight into a bounded queue of parsed chunks
+STREAMING_EXTRACT = True
+EXTRACT_WORKERS = 4
+EXTRACT_QUEUE_DEPTH = 8
+# Pipeline mode: 'staged' round-trips through Staging_Sales, 'direct' transforms extract's
+# chunk stream in memory in groups of DIRECT_BATCH_ROWS rows
+PIPELINE_MODE = 'staged'
+DIRECT_BATCH_ROWS = 100000
+STAGING_AUDIT = True  # direct mode: also write raw chunks to Staging_Sales in the background
+# Staged mode: with a budget (bytes), Staging_Sales is read in pages of TRANSFORM_PAGE_ROWS and
+# cleaned sales rows beyond the budget are spilled to Parquet under SPILL_DIR
+TRANSFORM_MEMORY_BUDGET = None
+TRANSFORM_PAGE_ROWS = 100000
+SPILL_DIR = 'cache/spill/'
+# Parallel mode: with PARALLEL_WORKERS > 1, cleaning and fact preparation run on hash
+# partitions of PARALLEL_PARTITION_BY ('store' or 'file_name') in a process pool. Partitions
+# and shared key tables are exchanged as Arrow files under PARALLEL_DIR (RAM-backed on Cloud Run)
+PARALLEL_WORKERS = 1
+PARALLEL_PARTITION_BY = 'store'
+PARALLEL_DIR = 'cache/parallel/'
+PARALLEL_START_METHOD = 'spawn'
+# Extract checkpoints: every EXTRACT_CHECKPOINT_ROWS staged rows the staged chunks are flushed and
+# each file's last committed chunk is recorded in Extract_Checkpoint; a restart resumes from it
+EXTRACT_CHECKPOINT_ROWS = 500000
+# Event mode (INPUT_FILE set by workflow.yaml): a Cloud Run job with several tasks stages
+# one byte range of the file per task; no shard is smaller than SHARD_MIN_BYTES
+SHARD_MIN_BYTES = 64 * 1024 * 1024
+# Large files are parsed as record-aligned byte ranges of about SPLIT_RANGE_BYTES,
+# SPLIT_WORKERS ranges at a time; boundaries are found by scanning SPLIT_SCAN_BYTES windows
+SPLIT_RANGE_BYTES = 64 * 1024 * 1024
+SPLIT_WORKERS = 4
+SPLIT_SCAN_BYTES = 64 * 1024
+# Async I/O layer (src/aio.py): concurrent calls per kind, per-attempt timeout in seconds,
+# and retries of transient errors with exponential backoff starting at IO_BACKOFF seconds
+IO_CONCURRENCY = {'warehouse': 4, 'load': 2}
+IO_TIMEOUT = 600
+IO_RETRIES = 3
+IO_BACKOFF = 1.0
+# Clients (src/clients.py) are created on first use and share one authorized session with
+# HTTP_POOL_SIZE pooled connections per host
+HTTP_POOL_SIZE = 32
+# Warehouse (src/warehouse.py): 'bigquery', or 'embedded' for a local database file at
+# EMBEDDED_WAREHOUSE_PATH (DuckDB when installed, otherwise SQLite at DB_URL) for backfills
+WAREHOUSE_BACKEND = 'bigquery'
+EMBEDDED_WAREHOUSE_PATH = 'liquor_sales.duckdb'
+# Bulk writer: 'warehouse' bulk inserts (load jobs for BigQuery), or 'local' Parquet files
+# under LOCAL_WAREHOUSE_DIR
+WRITER_BACKEND = 'warehouse'
+LOCAL_WAREHOUSE_DIR = 'warehouse/'
+WRITER_MAX_ROWS = 500000
+WRITER_MAX_BYTES = 256 * 1024 * 1024
+WRITER_MAX_LATENCY = 30  # seconds
+WRITER_MAX_IN_FLIGHT = 2  # load jobs per table running while the next rows are buffered
+# Metrics: spans per stage/file/chunk go to METRICS_SINKS ('jsonl' -> METRICS_DIR/spans.jsonl,
+# 'prometheus' -> METRICS_DIR/etl.prom); empty means the no-op sink. Only one in
+# METRICS_CHUNK_SAMPLE chunk spans is written as a line, all are aggregated
+METRICS_SINKS = []
+METRICS_DIR = 'metrics/'
+METRICS_CHUNK_SAMPLE = 100
 DB_URL = 'sqlite:///liquor_sales.db'
 
-engine = create_engine(DB_URL)
-client = bigquery.Client()
-
 POLL_INTERVAL = 5  # seconds between folder checks
+# Daemon mode (python -m src.etl_process): arriving files form a micro-batch once the oldest
+# has waited DAEMON_BATCH_WINDOW seconds or DAEMON_BATCH_BYTES are queued; intake pauses while
+# more than DAEMON_MAX_PENDING_ROWS rows (estimated at DAEMON_ROW_BYTES bytes each) are queued
+DAEMON_BATCH_WINDOW = 30
+DAEMON_BATCH_BYTES = 512 * 1024 * 1024
+DAEMON_MAX_PENDING_ROWS = 5_000_000
+DAEMON_ROW_BYTES = 270
 
 # BUCKET_NAME = 'chris_etl_process'
 BUCKET_NAME = 'chisphung_etl_process'
+BUCKET_PREFIX = None
 # INPUT_PATH = 'chris_etl_process/chunk_13.csv'
 INPUT_PATH = 'chisphung_etl_process/chunk_13.csv'
 OUTPUT_PATH = 'processed/transformed_data.csv'
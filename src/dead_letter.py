@@ -0,0 +1,182 @@
+import argparse
+import os
+import uuid
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+from src.config import DATASET_ID, DEAD_LETTER_DIR
+from src.key_cache import get_key_cache
+from src.key_resolution import FACT_KEYS
+from src.dedup import get_dedup_index
+from src.writer import get_writer
+from src.metrics import get_metrics, traced
+
+# One directory per reject reason ("<column>:<reason>", URI-escaped) and per run
+PARTITIONING = ds.partitioning(pa.schema([('reject_reason', pa.string()), ('run_id', pa.string())]),
+                               flavor='hive')
+METADATA_COLUMNS = ['reject_reason', 'run_id', 'rejected_at']
+
+
+class DeadLetterStore:
+    """
+    Sales rows rejected by load(), kept as Parquet partitioned by reject reason and run ID.
+
+    Rows are stored as they were handed to load_sales(), with their values as text, so
+    they can be loaded again once their data or the dimension rows they point at are
+    fixed. The run ID is the metrics run ID of the process that rejected them. root is a
+    local directory or a URI of a filesystem pyarrow supports (e.g. gs://bucket/dead_letter).
+    """
+
+    def __init__(self, root=DEAD_LETTER_DIR):
+        if '://' in root:
+            self.fs, self.root = pafs.FileSystem.from_uri(root)
+        else:
+            self.fs, self.root = pafs.LocalFileSystem(), os.path.abspath(root)
+
+    def write(self, rejected_rows, run_id=None):
+        """
+        Add rejected rows (with a 'reject_reason' column) to the store, one file per reason.
+
+        Returns:
+            int: Rows written.
+        """
+        if rejected_rows.empty:
+            return 0
+        rows = len(rejected_rows)
+        table = pa.Table.from_pandas(rejected_rows.drop(columns='reject_reason').astype('string'),
+                                     preserve_index=False)
+        table = table.append_column('reject_reason', pa.array(rejected_rows['reject_reason'].astype(str),
+                                                              pa.string()))
+        table = table.append_column('run_id', pa.array([run_id or get_metrics().run_id] * rows, pa.string()))
+        table = table.append_column('rejected_at', pa.array([datetime.now(timezone.utc)] * rows,
+                                                            pa.timestamp('us', tz='UTC')))
+        ds.write_dataset(table, self.root, filesystem=self.fs, format='parquet', partitioning=PARTITIONING,
+                         basename_template=f'part-{uuid.uuid4().hex[:12]}-{{i}}.parquet',
+                         existing_data_behavior='overwrite_or_ignore')
+        return rows
+
+    def _dataset(self, files=None):
+        try:
+            return ds.dataset(files or self.root, filesystem=self.fs, format='parquet',
+                              partitioning=PARTITIONING, partition_base_dir=self.root)
+        except FileNotFoundError:
+            return None
+
+    def files(self, reasons=None, run_ids=None):
+        """Files holding the rows of the given reject reasons and runs (default: all)."""
+        dataset = self._dataset()
+        if dataset is None:
+            return []
+        condition = None
+        for column, values in (('reject_reason', reasons), ('run_id', run_ids)):
+            if values:
+                match = ds.field(column).isin(list(values))
+                condition = match if condition is None else condition & match
+        return sorted(fragment.path for fragment in dataset.get_fragments(filter=condition))
+
+    def read(self, files):
+        """Read the rows of `files` as a DataFrame of text columns plus METADATA_COLUMNS."""
+        if not files:
+            return pd.DataFrame(columns=METADATA_COLUMNS)
+        df = self._dataset(files).to_table().to_pandas()
+        return df.astype({'reject_reason': str, 'run_id': str})
+
+    def summary(self):
+        """Rows per reject reason and run, with the time of the last rejection."""
+        files = self.files()
+        if not files:
+            return pd.DataFrame(columns=['reject_reason', 'run_id', 'rows', 'last_rejected_at'])
+        df = self._dataset(files).to_table(columns=METADATA_COLUMNS).to_pandas()
+        return (df.astype({'reject_reason': str, 'run_id': str})
+                .groupby(['reject_reason', 'run_id'])
+                .agg(rows=('rejected_at', 'size'), last_rejected_at=('rejected_at', 'max'))
+                .reset_index())
+
+    def remove(self, files):
+        for path in files:
+            self.fs.delete_file(path)
+
+
+_store = None
+
+
+def get_dead_letters():
+    """Process-wide DeadLetterStore."""
+    global _store
+    if _store is None:
+        _store = DeadLetterStore()
+    return _store
+
+
+@traced('dead_letter_replay')
+def replay(reasons=None, run_ids=None, dataset_name=DATASET_ID):
+    """
+    Load dead-lettered rows again, e.g. once the dimension rows they point at are fixed.
+
+    The rows go through load_sales() like any other batch: they are validated again, and
+    their dimension keys are re-resolved after the key cache entries of their natural keys
+    are dropped, so "<surrogate key>:missing_key" rows load once their dimension row
+    exists. Rows already in Sales_Fact (from a replay interrupted after its load) are
+    skipped by the dedup index. Rows rejected again are stored under this run's ID; the
+    replayed files are removed once the rest is loaded.
+
+    Args:
+        reasons (list): Reject reasons to replay, e.g. ['store:fan_out'] (default: all).
+        run_ids (list): Runs whose rejects are replayed (default: all).
+
+    Returns:
+        dict: Number of 'replayed', 'loaded' and 'rejected' rows.
+    """
+    from src.load import load_sales
+    store = get_dead_letters()
+    files = store.files(reasons, run_ids)
+    rows = store.read(files)
+    if rows.empty:
+        print("No dead-lettered rows to replay.")
+        return {'replayed': 0, 'loaded': 0, 'rejected': 0}
+    print(f"Replaying {len(rows)} dead-lettered rows from {len(files)} files: "
+          f"{rows['reject_reason'].value_counts().to_dict()}")
+
+    key_cache = get_key_cache(dataset_name)
+    key_cache.refresh_all()
+    for column, dim_table, _, _ in FACT_KEYS:
+        key_cache.invalidate(dim_table, rows[column].dropna())
+    dedup = get_dedup_index()
+    dedup.begin()
+    sales_data = rows[dedup.check(rows)].drop(columns=METADATA_COLUMNS)
+    writer = get_writer()
+    rejected_rows = load_sales(sales_data, key_cache, writer)
+    writer.flush('Sales_Fact')
+    dedup.commit()
+    key_cache.save()
+    # Rows rejected again are stored before the replayed files are removed, so none is lost
+    store.write(rejected_rows)
+    store.remove(files)
+    result = {'replayed': len(rows), 'loaded': len(sales_data) - len(rejected_rows),
+              'rejected': len(rejected_rows)}
+    print(f"Replayed {result['replayed']} rows: {result['loaded']} loaded into Sales_Fact, "
+          f"{result['rejected']} rejected again")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or replay the rows load() rejected.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='Rows per reject reason and run')
+    replay_parser = commands.add_parser('replay', help='Load dead-lettered rows again')
+    replay_parser.add_argument('--reason', action='append', help="Reject reason, e.g. 'store_key:missing_key' (repeatable)")
+    replay_parser.add_argument('--run-id', action='append', help='Run whose rejects to replay (repeatable)')
+    replay_parser.add_argument('--dataset', default=DATASET_ID)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        summary = get_dead_letters().summary()
+        print(summary.to_string(index=False) if not summary.empty else "The dead-letter store is empty.")
+    else:
+        replay(reasons=args.reason, run_ids=args.run_id, dataset_name=args.dataset)
+
+
+if __name__ == '__main__':
+    main()
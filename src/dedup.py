@@ -0,0 +1,213 @@
+import io
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.fs as pafs
+from google.api_core.exceptions import GoogleAPIError
+from src.config import PROJECT_ID, DATASET_ID, DEDUP_INDEX_DIR
+from src.warehouse import get_warehouse
+
+DEDUP_KEY = ['invoice_line_no', 'store']
+
+
+def key_hashes(df):
+    """64-bit hashes of (invoice_line_no, store), independent of how the columns were parsed."""
+    keys = pd.DataFrame({
+        'invoice_line_no': df['invoice_line_no'].astype(str).to_numpy(dtype=object),
+        'store': pd.to_numeric(df['store'], errors='coerce').fillna(-1).astype('int64').to_numpy(),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy().view(np.int64)
+
+
+class DedupIndex:
+    """
+    Persistent set of (invoice_line_no, store) keys already loaded into Sales_Fact.
+
+    Keys are stored as a sorted int64 array of hashes (8 bytes per row) in index_dir and
+    probed with a binary search, so checking a chunk costs O(batch log n) and never queries
+    the warehouse. Keys of loaded rows are staged with add() and only persisted by
+    commit(), after the load succeeded, so a failed run does not suppress its own retry.
+    index_dir is a local directory or a URI of a filesystem pyarrow supports (e.g.
+    gs://bucket/dedup); begin() and commit() merge in keys another job committed since
+    the index was read. Sales_Fact is only read when no index has been stored yet.
+
+    Rows of keys loaded before the current slice (begin()) are suppressed. Within the
+    slice the "keep first update" rule applies: a key's first occurrence is dropped when
+    the key occurs again, and every later occurrence is kept. A first occurrence checked
+    before its update arrived (in an earlier page or direct-mode group) is superseded
+    once the update is checked: drop_superseded() removes it from rows not loaded yet,
+    delete_replaced() from Sales_Fact.
+    """
+
+    def __init__(self, index_dir=DEDUP_INDEX_DIR, project_id=PROJECT_ID, dataset_name=DATASET_ID):
+        self.project_id = project_id
+        self.dataset_name = dataset_name
+        if '://' in index_dir:
+            self.fs, root = pafs.FileSystem.from_uri(index_dir)
+        else:
+            self.fs, root = pafs.LocalFileSystem(), os.path.abspath(index_dir)
+        root = root.rstrip('/')
+        self.fs.create_dir(root, recursive=True)
+        self.path = f'{root}/keys.npy'
+        self.meta_path = f'{root}/meta.json'
+        self.meta = {'totals': {}}
+        self.keys = None
+        self._stored_mtime = None
+        self.pending = np.empty(0, dtype=np.int64)
+        self.stats = {'checked': 0, 'suppressed': 0, 'in_batch': 0, 'superseded': 0}
+        self.begin()
+
+    def _bootstrap(self):
+        """Hash the keys already in Sales_Fact once, when no index has been stored yet."""
+        try:
+            query = f"SELECT invoice_line_no, store FROM `{self.project_id}.{self.dataset_name}.Sales_Fact`"
+            loaded = get_warehouse(self.project_id, self.dataset_name).read(query)
+        except GoogleAPIError as e:
+            print(f"Could not read Sales_Fact keys, starting an empty dedup index: {e}")
+            return np.empty(0, dtype=np.int64)
+        print(f"Built dedup index from {len(loaded)} Sales_Fact rows")
+        return np.unique(key_hashes(loaded)) if len(loaded) else np.empty(0, dtype=np.int64)
+
+    def _sync(self):
+        """Merge in the stored index if it changed since it was last read or written."""
+        info = self.fs.get_file_info(self.path)
+        if info.type == pafs.FileType.NotFound:
+            if self.keys is None:
+                self.keys = self._bootstrap()
+            return
+        if self.keys is not None and info.mtime == self._stored_mtime:
+            return
+        with self.fs.open_input_file(self.path) as f:
+            stored = np.load(io.BytesIO(f.read()))
+        self.keys = stored if self.keys is None else np.union1d(self.keys, stored)
+        self._stored_mtime = info.mtime
+        if self.fs.get_file_info(self.meta_path).type != pafs.FileType.NotFound:
+            with self.fs.open_input_file(self.meta_path) as f:
+                self.meta = json.loads(f.read())
+
+    @staticmethod
+    def _contains(sorted_keys, hashes):
+        if not len(sorted_keys):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(sorted_keys, hashes).clip(max=len(sorted_keys) - 1)
+        return sorted_keys[positions] == hashes
+
+    def begin(self):
+        """Start a slice: the rows of one transform, or of every group of one direct-mode run."""
+        self._sync()
+        empty = np.empty(0, dtype=np.int64)
+        # Keys checked in the slice, and loaded (add()) in it
+        self.seen, self.loaded = empty, empty
+        # Keys kept at their only occurrence so far, which a later occurrence supersedes
+        self.provisional = empty
+        # Superseded first occurrences not loaded yet, and loaded ones (as key values)
+        self.superseded = empty
+        self.replaced = []
+
+    def check(self, df):
+        """
+        Choose the rows of a chunk of the current slice to keep.
+
+        Returns:
+            np.ndarray: Boolean mask of rows to keep.
+        """
+        hashes = key_hashes(df)
+        in_slice = self._contains(self.seen, hashes)
+        loaded = ~in_slice & self._contains(self.keys, hashes)
+        keys = pd.Series(hashes)
+        first = ~in_slice & ~loaded & ~keys.duplicated().to_numpy()
+        repeated = keys.duplicated(keep=False).to_numpy()
+        keep = ~loaded & ~(first & repeated)
+
+        later = in_slice & self._contains(self.provisional, hashes)
+        if later.any():
+            superseded = np.unique(hashes[later])
+            self.provisional = np.setdiff1d(self.provisional, superseded)
+            was_loaded = self._contains(self.loaded, hashes) & later
+            self.superseded = np.union1d(self.superseded, np.unique(hashes[later & ~was_loaded]))
+            if was_loaded.any():
+                self.replaced.append(df.loc[was_loaded, DEDUP_KEY])
+            self.stats['superseded'] += len(superseded)
+        self.provisional = np.union1d(self.provisional, hashes[first & ~repeated])
+        self.seen = np.union1d(self.seen, hashes[~loaded])
+        self.stats['checked'] += len(df)
+        self.stats['suppressed'] += int(loaded.sum())
+        self.stats['in_batch'] += int((~loaded & ~keep).sum())
+        return keep
+
+    def drop_superseded(self, df):
+        """Remove first occurrences superseded by a later chunk from rows about to be loaded."""
+        if not len(self.superseded) or df.empty:
+            return df
+        hashes = key_hashes(df)
+        first = self._contains(self.superseded, hashes) & ~pd.Series(hashes).duplicated().to_numpy()
+        if not first.any():
+            return df
+        self.superseded = np.setdiff1d(self.superseded, hashes[first])
+        return df[~first]
+
+    def delete_replaced(self, before):
+        """
+        Delete loaded first occurrences superseded in this slice from Sales_Fact.
+
+        Args:
+            before (datetime): Start of the current load; only rows loaded earlier are deleted.
+
+        Returns:
+            int: Rows deleted.
+        """
+        if not self.replaced:
+            return 0
+        replaced = pd.concat(self.replaced)
+        stores = pd.to_numeric(replaced['store'], errors='coerce').fillna(-1).astype('int64')
+        keys = sorted({f"{invoice}|{store}" for invoice, store in zip(replaced['invoice_line_no'].astype(str), stores)})
+        keys = ', '.join("'" + key.replace('\\', '\\\\').replace("'", "\\'") + "'" for key in keys)
+        deleted = get_warehouse(self.project_id, self.dataset_name).execute(f"""
+            DELETE FROM `{self.project_id}.{self.dataset_name}.Sales_Fact`
+            WHERE processed_timestamp < DATETIME '{before.isoformat(sep=' ')}'
+            AND invoice_line_no || '|' || CAST(store AS STRING) IN ({keys})
+        """)
+        print(f"Deleted {deleted} Sales_Fact rows superseded by a later update")
+        self.replaced = []
+        return deleted
+
+    def add(self, df):
+        """Stage the keys of rows written to Sales_Fact; persisted by commit()."""
+        hashes = key_hashes(df)
+        self.pending = np.union1d(self.pending, hashes)
+        self.loaded = np.union1d(self.loaded, hashes)
+
+    def commit(self):
+        """Merge staged keys into the index and write it (with cumulative counters) to index_dir."""
+        self._sync()
+        if len(self.pending):
+            self.keys = np.union1d(self.keys, self.pending)
+            self.pending = np.empty(0, dtype=np.int64)
+        # A first occurrence rejected by load() is not in Sales_Fact, so nothing supersedes it
+        self.provisional = np.intersect1d(self.provisional, self.loaded)
+        totals = self.meta.setdefault('totals', {})
+        for name, value in self.stats.items():
+            totals[name] = totals.get(name, 0) + value
+        with self.fs.open_output_stream(self.meta_path) as f:
+            f.write(json.dumps(self.meta, indent=2).encode())
+        sink = io.BytesIO()
+        np.save(sink, self.keys)
+        with self.fs.open_output_stream(self.path) as f:
+            f.write(sink.getvalue())
+        self._stored_mtime = self.fs.get_file_info(self.path).mtime
+        print(f"Dedup index: {len(self.keys)} keys, suppressed {self.stats['suppressed']} rows already "
+              f"loaded and {self.stats['in_batch']} repeated within a batch, "
+              f"superseded {self.stats['superseded']} rows loaded or checked earlier")
+        self.stats = {name: 0 for name in self.stats}
+
+
+_index = None
+
+
+def get_dedup_index():
+    """Process-wide DedupIndex."""
+    global _index
+    if _index is None:
+        _index = DedupIndex()
+    return _index
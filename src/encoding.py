@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from decimal import Decimal
+
+# BigQuery NUMERIC(P, S) column types used by the warehouse (sql/warehouse.sql)
+NUMERIC_10_2 = (10, 2)
+NUMERIC_5_2 = (5, 2)
+
+
+def numeric_limit(precision, scale):
+    """Largest absolute value that fits NUMERIC(precision, scale), e.g. 99999999.99 for (10, 2)."""
+    return (10 ** precision - 1) / 10 ** scale
+
+
+def round_to_scaled_int(values, scale=2):
+    """
+    Round floats to `scale` decimal places and return them as integer-scaled int64 (e.g. cents).
+
+    The bulk of the work is a single vectorized multiply + rint. Values whose scaled
+    fraction lies within float error of .5 are re-rounded with Python's round(), so the
+    result is identical to the previous per-row `Decimal(str(round(x, 2)))` conversion.
+
+    Args:
+        values (np.ndarray): float64 values without NaN.
+        scale (int): Number of decimal places.
+
+    Returns:
+        np.ndarray: int64 array of values multiplied by 10**scale.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 10 ** scale
+    rounded = np.rint(scaled)
+
+    # Near-ties are where the float multiply or the tie rule could disagree with round()
+    frac = np.abs(scaled - np.trunc(scaled))
+    tolerance = np.abs(scaled) * 4 * np.finfo(np.float64).eps + 1e-9
+    ambiguous = np.flatnonzero(np.abs(frac - 0.5) <= tolerance)
+    for i in ambiguous:
+        rounded[i] = float(Decimal(str(round(float(values[i]), scale))).scaleb(scale))
+
+    return rounded.astype(np.int64)
+
+
+def scaled_int_to_arrow(scaled, precision, scale, mask=None):
+    """
+    Build an Arrow decimal128 array directly from integer-scaled int64 values.
+
+    decimal128 stores a 16-byte two's complement integer, so the buffer is the int64
+    value as the low word and its sign extension as the high word.
+    """
+    scaled = np.asarray(scaled, dtype=np.int64)
+    words = np.empty((len(scaled), 2), dtype=np.int64)
+    words[:, 0] = scaled
+    words[:, 1] = scaled >> 63
+    validity = None
+    null_count = 0
+    if mask is not None and mask.any():
+        validity = pa.array(~mask).buffers()[1]
+        null_count = int(mask.sum())
+    return pa.Array.from_buffers(pa.decimal128(precision, scale), len(scaled),
+                                 [validity, pa.py_buffer(words)], null_count=null_count)
+
+
+def encode_numeric(series, precision=10, scale=2, fill_value=-1, clip=False, column=None):
+    """
+    Encode a numeric column as a BigQuery NUMERIC(precision, scale) column in bulk.
+
+    Args:
+        series (pd.Series): Values to encode (numbers or numeric strings).
+        precision (int): NUMERIC precision.
+        scale (int): NUMERIC scale.
+        fill_value (float): Replacement for missing/unparseable values. None keeps them null.
+        clip (bool): Clamp out-of-range values to the NUMERIC limits instead of raising.
+        column (str): Column name used in error messages.
+
+    Returns:
+        pd.Series: Arrow-backed decimal128(precision, scale) series with the original index.
+    """
+    column = column or series.name
+    limit = numeric_limit(precision, scale)
+
+    numeric = pd.to_numeric(series, errors='coerce')
+    if fill_value is not None:
+        numeric = numeric.fillna(fill_value)
+    values = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+    mask = np.isnan(values)
+    values = np.where(mask, 0.0, values)
+
+    if clip:
+        values = np.clip(values, -limit, limit)
+
+    scaled = round_to_scaled_int(values, scale) if len(values) else np.empty(0, dtype=np.int64)
+
+    max_scaled = 10 ** precision - 1
+    overflow = np.abs(scaled) > max_scaled
+    if overflow.any():
+        print(f"Warning: Values in {column} exceed NUMERIC({precision}, {scale}) limits:")
+        print(series[overflow])
+        raise ValueError(f"Data in {column} contains values exceeding NUMERIC({precision}, {scale}) limits")
+
+    array = scaled_int_to_arrow(scaled, precision, scale, mask=mask)
+    return pd.Series(array, index=series.index, name=series.name,
+                     dtype=pd.ArrowDtype(pa.decimal128(precision, scale)))
+
+
+def encode_numeric_columns(df, columns, precision=10, scale=2, fill_value=-1, clip=False):
+    """Encode each of `columns` present in df in place with encode_numeric and return df."""
+    for col in columns:
+        if col in df.columns:
+            df[col] = encode_numeric(df[col], precision=precision, scale=scale,
+                                     fill_value=fill_value, clip=clip, column=col)
+    return df
@@ -1,42 +1,281 @@
-import pandas as pd
-from sqlalchemy import create_engine, text
 import os
-from datetime import datetime
-import glob
-import shutil
 import time
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from src.utils import process_scd_type2, get_processed_files
-from src.extract import extract
-from src.transform import transform
-from src.load import load
-import gc
-from google.cloud import storage, bigquery
-from src.config import INPUT_DIR, PROCESSED_DIR, BATCH_SIZE, engine, POLL_INTERVAL
+import argparse
+import threading
+from src.clients import get_storage_client
+from src.main import ELTPipeline
+from src.manifest import get_manifest
+from src.metrics import get_metrics
+from src.config import PROCESSED_DIR, POLL_INTERVAL
+from src.config import (BUCKET_NAME, BUCKET_PREFIX, MANIFEST_FULL_LISTING, PIPELINE_MODE, DAEMON_BATCH_WINDOW,
+                        DAEMON_BATCH_BYTES, DAEMON_MAX_PENDING_ROWS, DAEMON_ROW_BYTES)
 
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 
-# class FileHandler(FileSystemEventHandler):
-#     def on_created(self, event):
-#         if not event.is_directory and event.src_path.endswith('.csv'):
-#             print(f"Detected new file: {event.src_path}")
-#             process_new_files()
 
-def process_new_files():
-    # Step 1: Extract (raw data only)
-    has_new_files = extract()
-    # exit()
-    
-    # Steps 2-3: Transform and Load (separated)
-    if has_new_files:
-        transformed_data = transform()
-        load(transformed_data)
+class LocalFile:
+    """A CSV file in a watched directory, exposing the Blob attributes the pipeline reads."""
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns
+        self.md5_hash = None
+
+    def open(self, mode='rb', chunk_size=None):
+        return open(self.path, mode)
+
+    def download_to_filename(self, file_path):
+        import shutil
+        shutil.copyfile(self.path, file_path)
+
+
+class FileHandler:
+    """
+    Track CSV files created, written or moved into the watched directory.
+
+    A file is only handed over once no event has touched it for `quiet` seconds, so
+    files still being written are not picked up half-way. The watchdog observer only
+    calls dispatch(), so watchdog is imported when a directory is actually watched.
+    """
+
+    def __init__(self, quiet):
+        self.quiet = quiet
+        self.touched = {}
+        self._lock = threading.Lock()
+
+    def dispatch(self, event):
+        if not event.is_directory:
+            self.touch(getattr(event, 'dest_path', '') or event.src_path)
+
+    def touch(self, path):
+        if path.endswith('.csv'):
+            with self._lock:
+                self.touched[path] = time.monotonic()
+
+    def settled(self):
+        """Paths untouched for `quiet` seconds, oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            return [path for path, at in sorted(self.touched.items(), key=lambda item: item[1])
+                    if now - at >= self.quiet]
+
+    def release(self, path):
+        with self._lock:
+            self.touched.pop(path, None)
+
+
+class MicroBatchDaemon:
+    """
+    Long-running extract → transform → load over micro-batches of arriving files.
+
+    New files come from polling the bucket (from the manifest's marker) or, with
+    input_dir, from watchdog events on a local directory. A batch is cut once its oldest
+    file has waited `window` seconds or `batch_bytes` are queued. Every batch runs in
+    this process, so the storage client, bulk writer, manifest, key cache and dedup
+    index stay warm between batches.
+
+    Backpressure: while the queued and in-flight files hold more than max_pending_rows
+    rows (estimated from their size), intake pauses: the bucket is not listed and new
+    local files wait in the directory until a batch completes. Queue depth and batch
+    latency are printed, kept in stats and published as metrics gauges; every batch is
+    a 'micro_batch' span.
+    """
+
+    def __init__(self, bucket=None, storage_client=None, input_dir=None, window=DAEMON_BATCH_WINDOW,
+                 batch_bytes=DAEMON_BATCH_BYTES, max_pending_rows=DAEMON_MAX_PENDING_ROWS,
+                 row_bytes=DAEMON_ROW_BYTES, poll_interval=POLL_INTERVAL, mode=PIPELINE_MODE):
+        self.bucket = bucket
+        self.storage_client = storage_client
+        self.input_dir = input_dir
+        self.window = window
+        self.batch_bytes = batch_bytes
+        self.max_pending_rows = max_pending_rows
+        self.row_bytes = row_bytes
+        self.poll_interval = poll_interval
+        self.mode = mode
+        self.queue = []  # (arrival time, blob)
+        self.in_flight = []
+        self.names = set()  # queued or in flight
+        self.queued_bytes = 0
+        self.pending_rows = 0  # queued and in flight
+        self.rescan = True
+        self.paused = False
+        self.handler = FileHandler(quiet=poll_interval) if input_dir is not None else None
+        self.stats = {'batches': 0, 'failed_batches': 0, 'files': 0, 'rows': 0, 'last_latency_s': None,
+                      'max_latency_s': 0.0, 'pauses': 0}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+
+    def estimate_rows(self, blob):
+        return max(1, (blob.size or 0) // self.row_bytes)
+
+    def offer(self, blob):
+        """
+        Queue a new file for the next batch.
+
+        Returns:
+            bool: False if intake is paused because too many rows are pending.
+        """
+        with self._cond:
+            if blob.name in self.names:
+                return True
+            if self.pending_rows >= self.max_pending_rows:
+                if not self.paused:
+                    print(f"Backpressure: {self.pending_rows} rows pending, pausing intake")
+                    self.paused = True
+                    self.stats['pauses'] += 1
+                return False
+            self.paused = False
+            self.queue.append((time.monotonic(), blob))
+            self.names.add(blob.name)
+            self.queued_bytes += blob.size or 0
+            self.pending_rows += self.estimate_rows(blob)
+            self._cond.notify_all()
+        self.publish()
+        return True
+
+    def poll(self):
+        """Offer new bucket objects, or settled files in input_dir (all of them after a start or failure)."""
+        if self.bucket is not None:
+            if self.pending_rows >= self.max_pending_rows:
+                return
+            blobs = get_manifest().list_new(self.bucket, prefix=BUCKET_PREFIX, full_listing=MANIFEST_FULL_LISTING)
+        else:
+            if self.rescan:
+                self.rescan = False
+                for name in sorted(os.listdir(self.input_dir)):
+                    self.handler.touch(os.path.join(self.input_dir, name))
+            paths = [path for path in self.handler.settled() if os.path.exists(path)]
+            blobs = get_manifest().filter_new([LocalFile(self.input_dir, os.path.relpath(path, self.input_dir))
+                                               for path in paths])
+            accepted = {os.path.join(self.input_dir, blob.name) for blob in blobs}
+            for path in paths:
+                if path not in accepted:
+                    # Already processed or gone
+                    self.handler.release(path)
+        for blob in blobs:
+            if not self.offer(blob):
+                break
+            if self.input_dir is not None:
+                self.handler.release(os.path.join(self.input_dir, blob.name))
+
+    def _window_closed(self):
+        return bool(self.queue) and (time.monotonic() - self.queue[0][0] >= self.window
+                                     or self.queued_bytes >= self.batch_bytes)
+
+    def next_batch(self, timeout):
+        """Wait up to timeout for the window to close and take the files of the next batch."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._window_closed():
+                now = time.monotonic()
+                if self._stop.is_set() or now >= deadline:
+                    return []
+                wait = deadline - now
+                if self.queue:
+                    wait = min(wait, self.queue[0][0] + self.window - now)
+                self._cond.wait(max(wait, 0.01))
+            batch, size = [], 0
+            while self.queue and (not batch or size + (self.queue[0][1].size or 0) <= self.batch_bytes):
+                _, blob = self.queue.pop(0)
+                batch.append(blob)
+                size += blob.size or 0
+            self.queued_bytes -= size
+            self.in_flight = batch
+            return batch
+
+    def process(self, batch):
+        """Run the pipeline on one batch and release its rows from the backpressure limit."""
+        rows = sum(self.estimate_rows(blob) for blob in batch)
+        number = self.stats['batches'] + 1
+        print(f"Batch {number}: {len(batch)} files, ~{rows} rows: {[blob.name for blob in batch]}")
+        started = time.perf_counter()
+        try:
+            with get_metrics().span('micro_batch', kind='batch', files=len(batch)):
+                ELTPipeline(bucket_name=getattr(self.bucket, 'name', None), creds=self.storage_client,
+                            bucket_files=batch, mode=self.mode).run()
+        except Exception as e:
+            # The files stay unprocessed: the next poll (or rescan) offers them again
+            print(f"Batch {number} failed: {e}")
+            self.stats['failed_batches'] += 1
+            self.rescan = True
+        latency = time.perf_counter() - started
+        with self._cond:
+            self.in_flight = []
+            self.names.difference_update(blob.name for blob in batch)
+            self.pending_rows -= rows
+            self.stats['batches'] += 1
+            self.stats['files'] += len(batch)
+            self.stats['rows'] += rows
+            self.stats['last_latency_s'] = latency
+            self.stats['max_latency_s'] = max(self.stats['max_latency_s'], latency)
+            self._cond.notify_all()
+        print(f"Batch {number} done in {latency:.1f} s; queue depth {len(self.queue)} files, "
+              f"~{self.pending_rows} rows pending")
+        self.publish()
+
+    def publish(self):
+        """Publish queue depth and the latest batch latency as metrics gauges."""
+        get_metrics().gauge(daemon_queue_files=len(self.queue), daemon_in_flight_files=len(self.in_flight),
+                            daemon_pending_rows=self.pending_rows,
+                            daemon_batch_latency_seconds=self.stats['last_latency_s'] or 0,
+                            daemon_batches=self.stats['batches'])
+
+    def run(self, max_batches=None):
+        """Poll, cut and process batches until stop() (or KeyboardInterrupt, or max_batches)."""
+        observer = None
+        if self.input_dir is not None:
+            from watchdog.observers import Observer
+            observer = Observer()
+            observer.schedule(self.handler, self.input_dir, recursive=False)
+            observer.start()
+        print(f"Watching {self.input_dir or 'bucket ' + getattr(self.bucket, 'name', '')}: batch window "
+              f"{self.window} s / {self.batch_bytes} bytes, intake paused above {self.max_pending_rows} rows")
+        try:
+            while not self._stop.is_set():
+                self.poll()
+                batch = self.next_batch(self.poll_interval)
+                if batch:
+                    self.process(batch)
+                if max_batches and self.stats['batches'] >= max_batches:
+                    break
+        except KeyboardInterrupt:
+            print("Stopping daemon.")
+        finally:
+            self.stop()
+            if observer is not None:
+                observer.stop()
+                observer.join()
+        return self.stats
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the pipeline continuously over micro-batches of new files.')
+    parser.add_argument('--input-dir', default=None, help='Watch this local directory instead of the bucket')
+    parser.add_argument('--window', type=float, default=DAEMON_BATCH_WINDOW, help='Seconds a batch stays open')
+    parser.add_argument('--batch-bytes', type=int, default=DAEMON_BATCH_BYTES)
+    parser.add_argument('--max-pending-rows', type=int, default=DAEMON_MAX_PENDING_ROWS)
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    options = dict(window=args.window, batch_bytes=args.batch_bytes, max_pending_rows=args.max_pending_rows,
+                   poll_interval=args.poll_interval)
+    if args.input_dir:
+        daemon = MicroBatchDaemon(input_dir=args.input_dir, **options)
+    else:
+        storage_client = get_storage_client()
+        daemon = MicroBatchDaemon(bucket=storage_client.get_bucket(BUCKET_NAME), storage_client=storage_client,
+                                  **options)
+    daemon.run()
 
 
 if __name__ == "__main__":
-    # Initial processing of any existing files
-    process_new_files()
-    
-    # Start continuous processing
-    # continuous_processing()
\ No newline at end of file
+    main()
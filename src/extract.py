@@ -1,15 +1,15 @@
 import pandas as pd
-from sqlalchemy import create_engine, text
 import os
 from datetime import datetime
-import glob
-import shutil
-import pandas_gbq
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from src.utils import process_scd_type2, get_processed_files
-from google.cloud import bigquery
-from src.config import INPUT_DIR, PROCESSED_DIR, BATCH_SIZE, engine, POLL_INTERVAL, PROJECT_ID, DATASET_ID, TABLE_ID
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config import INPUT_DIR, PROCESSED_DIR, BATCH_SIZE, STREAMING_EXTRACT, STAGING_AUDIT, EXTRACT_QUEUE_DEPTH
+from src.ingest import iter_blob_chunks
+from src.splitter import iter_csv_chunks
+from src.writer import get_writer
+from src.manifest import get_manifest
+from src.checkpoint import get_checkpoints
+from src.metrics import get_metrics, traced
 
 # class Extract:
 #     """ Read raw JSON files from Google Storage Bucket """
@@ -17,14 +17,16 @@ from src.config import INPUT_DIR, PROCESSED_DIR, BATCH_SIZE, engine, POLL_INTERV
 #         self.data = []
 #         self.bucket_files = bucket_files
 
-def extract(bucket_files = []):
+@traced('extract')
+def extract(bucket_files = [], streaming=STREAMING_EXTRACT):
     print("Starting data extraction...")
-    processed_files = get_processed_files(project_id=PROJECT_ID)
+    manifest = get_manifest()
+    metrics = get_metrics()
     # for blob in self.bucket_files:
     #     if blob.name.endswith('.csv'):
     #         # content = blob.download_as_text()
     #         new_files = [blob.download_as_text() if blob.name not in processed_files]
-    new_files = [file for file in bucket_files if file.name.endswith('.csv') and file.name not in processed_files]
+    new_files = manifest.filter_new(bucket_files)
     print(f"New files to process: {new_files}")
             # df = pd.read_csv(content)
     # csv_files = glob.glob(f"{INPUT_DIR}*.csv")
@@ -40,6 +42,44 @@ def extract(bucket_files = []):
         print("No new files to process.")
         return False
     
+    # Files a crashed run left partly staged resume from their checkpoint
+    checkpoints = get_checkpoints()
+    resume = checkpoints.begin(new_files)
+    
+    if streaming:
+        # Download and parse several blobs concurrently, loading chunks as they arrive
+        sizes = {blob.name: blob.size for blob in new_files}
+        print(f"Streaming new files: {[blob.name for blob in new_files]}")
+        # Chunks of different files interleave, so file spans are ended explicitly
+        file_spans, rows, skipped = {}, 0, 0
+        for blob_name, item in iter_blob_chunks(new_files, resume=resume, positions=True):
+            file_basename = os.path.basename(blob_name)
+            if blob_name not in file_spans:
+                file_spans[blob_name] = metrics.start_span('extract_file', file=file_basename)
+            if item is None:
+                mark_processed(file_basename)
+                checkpoints.finish(file_basename)
+                file_span = file_spans[blob_name]
+                file_span.add(bytes_read=sizes.get(blob_name) or 0)
+                file_span.end()
+                print(f"Completed loading {file_basename} to staging.")
+                continue
+            range_start, index, chunk = item
+            if checkpoints.is_staged(file_basename, range_start, index):
+                skipped += 1
+                continue
+            with metrics.span('extract_chunk', kind='chunk', parent=file_spans[blob_name]) as span:
+                load_to_staging(chunk, file_basename, checkpoints.chunk_id(file_basename, range_start, index))
+                span.add(rows_in=len(chunk), rows_out=len(chunk))
+            checkpoints.staged_chunk(file_basename, range_start, index, len(chunk))
+            rows += len(chunk)
+        get_writer().flush()
+        manifest.save()
+        print(f"Staged {rows} rows from {len(new_files)} files"
+              + (f" ({skipped} chunks were staged by an earlier run)." if skipped else "."))
+        return True
+    
+    import shutil
     print(f"Downloading new files: {[blob.name for blob in new_files]}")
     for blob in new_files:
         file_path = os.path.join(INPUT_DIR, blob.name)
@@ -50,48 +90,135 @@ def extract(bucket_files = []):
         print("No new files to process.")
         return False
                 
-    for file in downloaded_files:
+    for blob, file in zip(new_files, downloaded_files):
         print(f"Loading {file} into Staging_Sales...")
         file_basename = os.path.basename(file)
         
-        
-        for chunk in pd.read_csv(file, chunksize=BATCH_SIZE):
-            # Add metadata only - no data processing in extract
-            chunk['file_name'] = file_basename
-            chunk['processed_timestamp'] = datetime.now()
+        with metrics.span('extract_file', kind='file', file=file_basename) as file_span:
+            file_span.add(bytes_read=os.path.getsize(file))
+            for range_start, index, chunk in iter_csv_chunks(file, batch_size=BATCH_SIZE,
+                                                             resume_from=resume.get(blob.name), positions=True):
+                if checkpoints.is_staged(file_basename, range_start, index):
+                    continue
+                with metrics.span('extract_chunk', kind='chunk') as span:
+                    load_to_staging(chunk, file_basename, checkpoints.chunk_id(file_basename, range_start, index))
+                    span.add(rows_in=len(chunk), rows_out=len(chunk))
+                checkpoints.staged_chunk(file_basename, range_start, index, len(chunk))
             
-            # Load raw data into staging
-            # chunk.to_sql('Staging_Sales', engine, if_exists='append', index=False)
-            pandas_gbq.to_gbq(
-                chunk,
-                f'{DATASET_ID}.Staging_Sales',
-                project_id=PROJECT_ID,
-                if_exists='append'
-            )
-            print(f"Loaded chunk from {file} into Staging_Sales.")
-        
-        # After processing, mark the file as processed
-        print(f"Marking {file_basename} as processed.")
-        
-        # Mark file as processed
-        # pd.DataFrame({
-        #     'file_name': [file_basename],
-        #     'processed_timestamp': [datetime.now()],
-        # }).to_sql('Processed_Files', engine, if_exists='append', index=False)
-        upload_path = f"{DATASET_ID}.Processed_Files"
-        print(f"Uploading processed file metadata to {upload_path}")
-        pandas_gbq.to_gbq(
-            pd.DataFrame({
-                'file_name': [file_basename],
-                'processed_timestamp': [datetime.now()],
-            }),
-            destination_table=upload_path,
-            project_id=PROJECT_ID,
-            if_exists='append'
-        )
+            mark_processed(file_basename)
+            checkpoints.finish(file_basename)
         
         # Move file to processed
         shutil.move(file, os.path.join(PROCESSED_DIR, file_basename))
         print(f"Completed loading {file} to staging.")
     
-    return True
\ No newline at end of file
+    get_writer().flush()
+    manifest.save()
+    return True
+
+
+def extract_stream(bucket_files=[], staging_audit=STAGING_AUDIT):
+    """
+    Stream raw chunks of new files for in-memory processing, skipping the staging round-trip.
+
+    Args:
+        bucket_files (list): Blobs in the bucket; already processed files are skipped.
+        staging_audit (bool): Also append each chunk to Staging_Sales in the background.
+
+    Yields:
+        tuple: (file name, tagged DataFrame chunk), then (file name, None) once the file
+        has been read completely. Callers mark files processed after loading them.
+    """
+    print("Starting streaming extraction...")
+    new_files = get_manifest().filter_new(bucket_files)
+    if not new_files:
+        print("No new files to process.")
+        return
+    print(f"Streaming new files: {[blob.name for blob in new_files]}")
+    
+    # A single background writer keeps the audit copy off the critical path; the semaphore
+    # bounds how many chunks can wait for it
+    audit = ThreadPoolExecutor(max_workers=1, thread_name_prefix='staging-audit') if staging_audit else None
+    in_flight = threading.BoundedSemaphore(EXTRACT_QUEUE_DEPTH)
+    audits = []
+    # Stage and file spans are detached and cover the whole stream; chunk spans time only
+    # this generator's own work, so no span is current across a yield
+    metrics = get_metrics()
+    sizes = {blob.name: blob.size for blob in new_files}
+    stage = metrics.start_span('extract_stream', kind='stage')
+    file_spans = {}
+    try:
+        for blob_name, chunk in iter_blob_chunks(new_files):
+            file_basename = os.path.basename(blob_name)
+            if blob_name not in file_spans:
+                file_spans[blob_name] = metrics.start_span('extract_file', parent=stage, file=file_basename)
+            if chunk is not None:
+                with metrics.span('extract_chunk', kind='chunk', parent=file_spans[blob_name]) as span:
+                    tag_chunk(chunk, file_basename)
+                    if audit:
+                        in_flight.acquire()
+                        future = audit.submit(upload_staging, chunk)
+                        future.add_done_callback(lambda _: in_flight.release())
+                        audits.append(future)
+                    span.add(rows_in=len(chunk), rows_out=len(chunk))
+            else:
+                file_spans[blob_name].add(bytes_read=sizes.get(blob_name) or 0)
+                file_spans[blob_name].end()
+            yield file_basename, chunk
+    finally:
+        if audit:
+            audit.shutdown(wait=True)
+            failed = [f.exception() for f in audits if f.exception()]
+            if failed:
+                print(f"Warning: {len(failed)} staging audit writes failed: {failed[0]}")
+            else:
+                print(f"Wrote {len(audits)} audit chunks to Staging_Sales.")
+            get_writer().flush('Staging_Sales')
+        stage.end()
+
+
+def upload_staging(chunk):
+    """Buffer an already tagged chunk for Staging_Sales in the bulk writer."""
+    get_writer().write('Staging_Sales', chunk)
+
+
+def tag_chunk(chunk, file_basename):
+    """Add the source file metadata columns Staging_Sales expects."""
+    # Add metadata only - no data processing in extract
+    chunk['file_name'] = file_basename
+    chunk['processed_timestamp'] = datetime.now()
+    return chunk
+
+
+def load_to_staging(chunk, file_basename, chunk_id=None):
+    """Append a raw chunk, tagged with its source file (and chunk ID), to Staging_Sales."""
+    tag_chunk(chunk, file_basename)
+    chunk['chunk_id'] = chunk_id
+    
+    # Load raw data into staging
+    # chunk.to_sql('Staging_Sales', engine, if_exists='append', index=False)
+    upload_staging(chunk)
+
+
+def mark_processed(file_basename):
+    """
+    Record a fully staged file in Processed_Files and the local manifest.
+
+    The Processed_Files row stays in the writer's buffer, so a run's markers go out in one
+    load job; callers persist the manifest with get_manifest().save() after flushing.
+    """
+    print(f"Marking {file_basename} as processed.")
+    writer = get_writer()
+    # The marker must never land before the file's staged rows
+    writer.flush('Staging_Sales')
+    
+    # Mark file as processed
+    # pd.DataFrame({
+    #     'file_name': [file_basename],
+    #     'processed_timestamp': [datetime.now()],
+    # }).to_sql('Processed_Files', engine, if_exists='append', index=False)
+    writer.write('Processed_Files', pd.DataFrame({
+        'file_name': [file_basename],
+        'processed_timestamp': [datetime.now()],
+    }))
+    get_manifest().record(file_basename)
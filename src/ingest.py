@@ -0,0 +1,76 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config import BATCH_SIZE, EXTRACT_WORKERS, EXTRACT_QUEUE_DEPTH
+from src.splitter import iter_csv_chunks
+
+_POLL_SECONDS = 0.5
+
+
+def _put(chunks, item, stop):
+    """Put item on the bounded queue, giving up if the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            chunks.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _read_blob(blob, chunks, stop, batch_size, resume_from=None, positions=False):
+    """Parse a blob straight from its byte stream into the queue, then signal end of file."""
+    try:
+        # Staging_Sales columns are all STRING: chunks are parsed as text so direct mode sees
+        # the values a staged run reads back (e.g. category '1011000', not 1011000.0)
+        for chunk in iter_csv_chunks(blob, batch_size=batch_size, resume_from=resume_from, positions=positions):
+            if not _put(chunks, (blob.name, chunk), stop):
+                return
+        _put(chunks, (blob.name, None), stop)
+    except Exception as e:
+        _put(chunks, (blob.name, e), stop)
+
+
+def iter_blob_chunks(blobs, batch_size=BATCH_SIZE, workers=EXTRACT_WORKERS, queue_depth=EXTRACT_QUEUE_DEPTH,
+                     resume=None, positions=False):
+    """
+    Download and parse several blobs concurrently, yielding their chunks as they arrive.
+
+    Up to `workers` blobs are streamed at once without temp files, large ones as several
+    byte ranges parsed concurrently (src/splitter.py); parsed chunks wait in a
+    queue of at most `queue_depth` chunks, so workers pause while the consumer is busy.
+    Chunks of one file arrive in order; chunks of different files may interleave.
+
+    Args:
+        blobs (list): google.cloud.storage Blob objects to read.
+        batch_size (int): Rows per parsed chunk.
+        workers (int): Number of concurrent downloads.
+        queue_depth (int): Maximum number of parsed chunks held in memory.
+        resume (dict): Blob name -> byte offset to resume the blob from (see iter_csv_chunks).
+        positions (bool): Yield (range start, index in range, chunk) tuples instead of chunks.
+
+    Yields:
+        tuple: (blob name, DataFrame chunk), then (blob name, None) once the blob is complete.
+    """
+    resume = resume or {}
+    blobs = list(blobs)
+    if not blobs:
+        return
+    chunks = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    pending = len(blobs)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(workers, len(blobs))),
+                                  thread_name_prefix='extract')
+    try:
+        for blob in blobs:
+            executor.submit(_read_blob, blob, chunks, stop, batch_size, resume.get(blob.name), positions)
+        while pending:
+            name, chunk = chunks.get()
+            if isinstance(chunk, Exception):
+                raise RuntimeError(f"Failed to read {name}: {chunk}") from chunk
+            if chunk is None:
+                pending -= 1
+            yield name, chunk
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,216 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+from src.config import PROJECT_ID, DATASET_ID, KEY_CACHE_DIR
+from src.warehouse import get_warehouse
+from src.key_resolution import normalize_keys
+from src.metrics import get_metrics
+
+# Dimension table -> (natural key column, surrogate key column, is SCD Type 2)
+DIMENSIONS = {
+    'Store_Dim': ('store_id', 'store_key', True),
+    'Item_Dim': ('itemno', 'item_key', True),
+    'Vendor_Dim': ('vendor_no', 'vendor_key', True),
+}
+MAX_KEYS_PER_QUERY = 10000
+
+
+def _sql_literals(dim_table, values):
+    """Render natural keys as a comma-separated list of BigQuery literals."""
+    if dim_table == 'Store_Dim':
+        return ', '.join(str(int(v)) for v in values)
+    return ', '.join("'" + str(v).replace('\\', '\\\\').replace("'", "\\'") + "'" for v in values)
+
+
+class KeyCache:
+    """
+    Local on-disk cache of natural key -> surrogate key maps for the dimension tables.
+
+    Each dimension is stored as a Parquet file in cache_dir alongside a metadata file
+    holding the high-water mark (the SCD date the cache is current to) and cumulative
+    hit/miss counters. SCD dimensions are refreshed once per load with only the versions
+    started or expired since the high-water mark; keys missing from the cache are fetched
+    on demand.
+    """
+
+    def __init__(self, cache_dir=KEY_CACHE_DIR, project_id=PROJECT_ID, dataset_name=DATASET_ID):
+        self.cache_dir = cache_dir
+        self.project_id = project_id
+        self.dataset_name = dataset_name
+        os.makedirs(cache_dir, exist_ok=True)
+        self.meta_path = os.path.join(cache_dir, 'meta.json')
+        self.meta = self._read_meta()
+        self.maps = {}
+        self.stats = {'hits': 0, 'misses': 0, 'queries': 0, 'rows_fetched': 0}
+        # Dimensions refreshed since the last refresh_all(); lookups of the others refresh first
+        self.refreshed = set()
+        # Dimensions are looked up concurrently; each only touches its own map
+        self._lock = threading.Lock()
+
+    def _read_meta(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                return json.load(f)
+        return {'high_water_marks': {}, 'totals': {}}
+
+    def _path(self, dim_table):
+        return os.path.join(self.cache_dir, f'{dim_table}.parquet')
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def _query(self, query):
+        get_metrics().count(warehouse_jobs=1)
+        result = get_warehouse(self.project_id, self.dataset_name).read(query)
+        self._count(queries=1, rows_fetched=len(result))
+        return result
+
+    def _table(self, dim_table):
+        return f"`{self.project_id}.{self.dataset_name}.{dim_table}`"
+
+    def get_map(self, dim_table):
+        """Return the cached map for dim_table as a Series indexed by natural key."""
+        if dim_table not in self.maps:
+            natural_key, surrogate_key, _ = DIMENSIONS[dim_table]
+            path = self._path(dim_table)
+            if os.path.exists(path):
+                cached = pd.read_parquet(path)
+                index = normalize_keys(dim_table, cached[natural_key])
+                self.maps[dim_table] = pd.Series(cached[surrogate_key].to_numpy(), index=index.to_numpy(),
+                                                 name=surrogate_key)
+            else:
+                self.maps[dim_table] = pd.Series(dtype='Int64', name=surrogate_key)
+        return self.maps[dim_table]
+
+    def _upsert(self, dim_table, fetched):
+        """
+        Replace the cached entries of the natural keys in `fetched` with its active versions.
+
+        Every distinct surrogate key of a natural key is kept: a natural key with several
+        active versions maps to all of them, so resolve_fact_keys() rejects its rows as fan-out.
+        """
+        natural_key, surrogate_key, _ = DIMENSIONS[dim_table]
+        if fetched.empty:
+            return
+        versions = pd.DataFrame({
+            'key': normalize_keys(dim_table, fetched[natural_key]).to_numpy(),
+            'surrogate': pd.to_numeric(fetched[surrogate_key], errors='coerce').astype('Int64').to_numpy(),
+        })
+        # A version without a surrogate key is not cached, so it is fetched again once it has one
+        versions = versions.dropna().drop_duplicates()
+        update = pd.Series(versions['surrogate'].to_numpy(), index=versions['key'].to_numpy(), name=surrogate_key)
+        fan_out = update.index[update.index.duplicated()].unique()
+        if len(fan_out):
+            print(f"Warning: {len(fan_out)} {natural_key} values have several active versions in {dim_table}")
+        current = self.get_map(dim_table)
+        current = current[~current.index.isin(update.index)]
+        self.maps[dim_table] = pd.concat([current, update]).astype('Int64')
+
+    def invalidate(self, dim_table, natural_keys=None):
+        """Drop cached entries for natural_keys (or the whole dimension) so they are re-fetched."""
+        if natural_keys is None:
+            natural_key, surrogate_key, _ = DIMENSIONS[dim_table]
+            self.maps[dim_table] = pd.Series(dtype='Int64', name=surrogate_key)
+            self.meta['high_water_marks'].pop(dim_table, None)
+            return
+        current = self.get_map(dim_table)
+        keys = normalize_keys(dim_table, natural_keys)
+        self.maps[dim_table] = current[~current.index.isin(keys)]
+
+    def refresh(self, dim_table):
+        """Apply versions started or expired since the high-water mark of an SCD dimension."""
+        natural_key, surrogate_key, is_scd = DIMENSIONS[dim_table]
+        high_water_mark = self.meta['high_water_marks'].get(dim_table)
+        # Versions are stamped with the warehouse's CURRENT_DATE(), which is a UTC date
+        today = datetime.now(timezone.utc).date().isoformat()
+        self.refreshed.add(dim_table)
+        if not is_scd or high_water_mark is None:
+            # Nothing cached yet: keys are fetched on demand as misses
+            self.meta['high_water_marks'][dim_table] = today
+            return
+
+        # start_date/end_date are DATEs, so re-read the high-water mark day itself. The
+        # versions changed since then come with every active version of their natural keys
+        changed = f"start_date >= DATE '{high_water_mark}' OR end_date >= DATE '{high_water_mark}'"
+        changes = self._query(
+            f"SELECT {natural_key}, {surrogate_key}, is_active FROM {self._table(dim_table)} "
+            f"WHERE {changed} OR (is_active = TRUE AND {natural_key} IN "
+            f"(SELECT {natural_key} FROM {self._table(dim_table)} WHERE {changed}))"
+        )
+        if not changes.empty:
+            is_active = changes['is_active'].fillna(False).astype(bool)
+            # Changed keys are replaced by their active versions (or dropped when none is left)
+            self.invalidate(dim_table, changes[natural_key])
+            self._upsert(dim_table, changes[is_active])
+            print(f"Refreshed {dim_table} key cache: {int(is_active.sum())} active versions, "
+                  f"{int((~is_active).sum())} expired")
+        self.meta['high_water_marks'][dim_table] = today
+
+    def refresh_all(self):
+        """Refresh every dimension; called once per load so lookups of its parts query no changes."""
+        self.refreshed.clear()
+        for dim_table in DIMENSIONS:
+            self.refresh(dim_table)
+
+    def lookup(self, dim_table, natural_keys):
+        """
+        Resolve natural keys to surrogate keys, fetching cache misses from the warehouse.
+
+        A dimension not refreshed since the last refresh_all() is refreshed first.
+
+        Args:
+            dim_table (str): Dimension table name (e.g. 'Store_Dim').
+            natural_keys (iterable): Natural key values from the batch.
+
+        Returns:
+            pd.DataFrame: Columns [natural key, surrogate key] for the keys found.
+        """
+        natural_key, surrogate_key, is_scd = DIMENSIONS[dim_table]
+        if dim_table not in self.refreshed:
+            self.refresh(dim_table)
+
+        wanted = normalize_keys(dim_table, natural_keys).dropna().drop_duplicates()
+        current = self.get_map(dim_table)
+        hit = wanted.isin(current.index).to_numpy()
+        missing = wanted[~hit]
+        self._count(hits=int(hit.sum()), misses=len(missing))
+
+        active = " AND is_active = TRUE" if is_scd else ""
+        for start in range(0, len(missing), MAX_KEYS_PER_QUERY):
+            batch = missing.iloc[start:start + MAX_KEYS_PER_QUERY]
+            fetched = self._query(
+                f"SELECT {natural_key}, {surrogate_key} FROM {self._table(dim_table)} "
+                f"WHERE {natural_key} IN ({_sql_literals(dim_table, batch)}){active}"
+            )
+            self._upsert(dim_table, fetched)
+        current = self.get_map(dim_table)
+
+        found = current[current.index.isin(wanted)]
+        return pd.DataFrame({natural_key: found.index, surrogate_key: found.to_numpy()})
+
+    def save(self):
+        """Write cached maps and metadata (with cumulative counters) to cache_dir."""
+        for dim_table, mapping in self.maps.items():
+            natural_key, surrogate_key, _ = DIMENSIONS[dim_table]
+            pd.DataFrame({natural_key: mapping.index, surrogate_key: mapping.to_numpy()}).to_parquet(
+                self._path(dim_table), index=False)
+        totals = self.meta.setdefault('totals', {})
+        for name, value in self.stats.items():
+            totals[name] = totals.get(name, 0) + value
+        with open(self.meta_path, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        self.stats = {name: 0 for name in self.stats}
+
+
+_caches = {}
+
+
+def get_key_cache(dataset_name=DATASET_ID):
+    """Process-wide KeyCache per dataset, so maps loaded by one run stay warm for the next."""
+    if dataset_name not in _caches:
+        _caches[dataset_name] = KeyCache(dataset_name=dataset_name)
+    return _caches[dataset_name]
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# (sales column, dimension table, natural key column, surrogate key column); date_key is
+# derived arithmetically by date_keys()
+FACT_KEYS = [
+    ('store', 'Store_Dim', 'store_id', 'store_key'),
+    ('itemno', 'Item_Dim', 'itemno', 'item_key'),
+    ('vendor_no', 'Vendor_Dim', 'vendor_no', 'vendor_key'),
+]
+MISSING_KEY = -1
+
+
+def date_keys(dates):
+    """
+    Derive date_key = yyyymmdd arithmetically.
+
+    Args:
+        dates (pd.Series): Dates (anything pd.to_datetime accepts).
+
+    Returns:
+        np.ndarray: int64 keys, MISSING_KEY for unparseable dates.
+    """
+    dates = pd.to_datetime(pd.Series(dates), errors='coerce')
+    keys = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    return keys.fillna(MISSING_KEY).to_numpy(dtype='int64')
+
+
+def normalize_keys(dim_table, values):
+    """Cast natural key values to one type per dimension (matching sql/warehouse.sql)."""
+    values = pd.Series(values)
+    if dim_table == 'Store_Dim':
+        return pd.to_numeric(values, errors='coerce').astype('Int64')
+    return values.astype(str)
+
+
+def build_key_index(dim_table, key_frame, natural_key, surrogate_key, keep_duplicates=None):
+    """
+    Build a hash index over a dimension's natural keys.
+
+    Args:
+        dim_table (str): Dimension table name, used to normalize key types.
+        key_frame (pd.DataFrame): Frame with natural_key and surrogate_key columns.
+        natural_key (str): Natural key column.
+        surrogate_key (str): Surrogate key column.
+        keep_duplicates (str): 'first'/'last' to keep one row per duplicated natural key,
+            or None to leave duplicated (fan-out) keys out of the index.
+
+    Returns:
+        tuple: (pd.Index of unique natural keys, int64 surrogate keys aligned to it,
+                pd.Index of fan-out natural keys).
+    """
+    natural = normalize_keys(dim_table, key_frame[natural_key]).reset_index(drop=True)
+    surrogate = pd.to_numeric(key_frame[surrogate_key], errors='coerce').fillna(MISSING_KEY)
+    surrogate = surrogate.to_numpy(dtype=np.int64)
+
+    duplicated = natural.duplicated(keep=False).to_numpy()
+    fan_out = pd.Index(natural[duplicated].unique())
+    if keep_duplicates:
+        keep = ~natural.duplicated(keep=keep_duplicates).to_numpy()
+    else:
+        keep = ~duplicated
+    return pd.Index(natural[keep]), surrogate[keep], fan_out
+
+
+def lookup_keys(index, surrogate, values):
+    """Map normalized natural key values to surrogate keys, MISSING_KEY where not found."""
+    positions = index.get_indexer(values)
+    resolved = np.full(len(positions), MISSING_KEY, dtype=np.int64)
+    found = positions >= 0
+    resolved[found] = surrogate[positions[found]]
+    return resolved
+
+
+def resolve_fact_keys(sales_data, key_frames):
+    """
+    Resolve all dimension keys of the fact frame in a single vectorized pass.
+
+    Fan-out (a natural key appearing more than once in a dimension) is detected once up
+    front; rows pointing at a duplicated SCD key are rejected rather than multiplied.
+    Rows whose natural key is not in a dimension are rejected as "<surrogate key>:missing_key",
+    so they can be replayed once the dimension row exists.
+
+    Args:
+        sales_data (pd.DataFrame): Sales rows with store, itemno and vendor_no.
+        key_frames (dict): Dimension table -> frame of [natural key, surrogate key].
+
+    Returns:
+        tuple: (sales rows with store_key/item_key/vendor_key columns added,
+                rejected rows with a 'reject_reason' column).
+    """
+    resolved = {}
+    reasons = pd.Series(np.nan, index=sales_data.index, dtype='object')
+    for column, dim_table, natural_key, surrogate_key in FACT_KEYS:
+        index, surrogate, fan_out = build_key_index(dim_table, key_frames[dim_table],
+                                                    natural_key, surrogate_key)
+        values = normalize_keys(dim_table, sales_data[column])
+        if len(fan_out):
+            print(f"Warning: {len(fan_out)} duplicated {natural_key} values in {dim_table}")
+            hits = values.isin(fan_out).to_numpy()
+            reasons[hits & reasons.isna().to_numpy()] = f"{column}:fan_out"
+        resolved[surrogate_key] = lookup_keys(index, surrogate, values)
+        missing = resolved[surrogate_key] == MISSING_KEY
+        reasons[missing & reasons.isna().to_numpy()] = f"{surrogate_key}:missing_key"
+
+    sales_data = sales_data.assign(**resolved)
+    rejected = reasons.notna().to_numpy()
+    if not rejected.any():
+        return sales_data, sales_data.iloc[0:0].assign(reject_reason=pd.Series(dtype='object'))
+    return sales_data[~rejected], sales_data[rejected].assign(reject_reason=reasons[rejected])
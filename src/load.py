@@ -1,13 +1,20 @@
 import pandas as pd
-import pandas_gbq
-from google.cloud import bigquery
-from src.common import UserCredentials
 from src.utils import process_scd_type2
-from src.config import PROJECT_ID, DATASET_ID
-import gc
-from decimal import Decimal, ROUND_HALF_UP
-import numpy as np
+from src.config import PROJECT_ID, DATASET_ID, PARALLEL_WORKERS
+from src.encoding import encode_numeric_columns, NUMERIC_10_2, NUMERIC_5_2
+from src.validation import split_valid, SALES_FACT_RULES
+from src.key_cache import get_key_cache
+from src.key_resolution import resolve_fact_keys, date_keys, FACT_KEYS
+from src.calendar_dim import ensure_calendar
+from src.transform import iter_sales
+from src.writer import get_writer
+from src.dedup import get_dedup_index
+from src.dead_letter import get_dead_letters
+from src.metrics import get_metrics, traced
+from src.parallel import prepare_facts_partitioned
+from src import aio
 
+@traced('load')
 def load(transformed_data, dataset_name=DATASET_ID):
     if not transformed_data:
         print("No data provided for loading.")
@@ -15,18 +22,14 @@ def load(transformed_data, dataset_name=DATASET_ID):
     
     print("Starting load phase...")
     
-    # Initialize credentials and BigQuery client
-    conn = bigquery.Client()
+    writer = get_writer()
     
-    # Load dimension tables
+    # Prepare the dimension updates; they touch different tables, so they then run
+    # concurrently on the async I/O layer. Date_Dim only grows when the batch falls
+    # outside its span
+    dimension_updates = {}
     if not transformed_data['dates'].empty:
-        pandas_gbq.to_gbq(
-            transformed_data['dates'],
-            f'{dataset_name}.Date_Dim',
-            project_id=PROJECT_ID,
-            if_exists='append'
-        )
-        print("Loaded Date_Dim")
+        dimension_updates['Date_Dim'] = (ensure_calendar, (transformed_data['dates']['date'],))
     
     if not transformed_data['stores'].empty:
         transformed_data['stores'] = transformed_data['stores'].astype({
@@ -34,9 +37,8 @@ def load(transformed_data, dataset_name=DATASET_ID):
             'county_number': str, 'county': str
         })
         stores = transformed_data['stores'].rename(columns={'store': 'store_id'})
-        process_scd_type2(stores, f'Store_Dim', 'store_id',
-                         ['address', 'city', 'zipcode', 'county_number', 'county'])
-        print("Loaded Store_Dim")
+        dimension_updates['Store_Dim'] = (process_scd_type2, (stores, f'Store_Dim', 'store_id',
+                                          ['address', 'city', 'zipcode', 'county_number', 'county']))
     
     if not transformed_data['items'].empty:
         items_df = transformed_data['items'].copy()
@@ -44,72 +46,73 @@ def load(transformed_data, dataset_name=DATASET_ID):
         items_df['bottle_volume_ml'] = items_df['bottle_volume_ml'].astype(float).round(2)
         items_df['pack'] = items_df['pack'].astype(float).round(2)
         
-        # Check for non-numeric or NaN values in numeric columns
+        # Encode to NUMERIC(10, 2); unparseable values become -1, out-of-range values raise
         for col in ['state_bottle_cost', 'state_bottle_retail']:
-            invalid_rows = items_df[items_df[col].isna() | ~items_df[col].apply(
-                lambda x: isinstance(x, (int, float, str)) and str(x).replace('.', '', 1).replace('-', '', 1).isdigit()
-            )]
-            if not invalid_rows.empty:
+            invalid = pd.to_numeric(items_df[col], errors='coerce').isna()
+            if invalid.any():
                 print(f"Warning: Invalid values found in {col}:")
-                print(invalid_rows[[col]])
-                items_df[col] = pd.to_numeric(items_df[col], errors='coerce').fillna(-1).astype(float)
+                print(items_df.loc[invalid, [col]])
+        encode_numeric_columns(items_df, ['state_bottle_cost', 'state_bottle_retail'], *NUMERIC_10_2)
         
-        # Convert to Decimal with 2 decimal places to match NUMERIC(10, 2)
-        for col in ['state_bottle_cost', 'state_bottle_retail']:
-            items_df[col] = items_df[col].astype(float).apply(
-                lambda x: Decimal(str(round(x, 2))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) 
-                if not pd.isna(x) else Decimal('0.00')
-            )
-        
-        # Validate data to ensure it fits NUMERIC(10, 2)
-        for col in ['state_bottle_cost', 'state_bottle_retail']:
-            invalid_rows = items_df[items_df[col].apply(lambda x: abs(x) > Decimal('99999999.99'))]
-            if not invalid_rows.empty:
-                print(f"Warning: Values in {col} exceed NUMERIC(10, 2) limits:")
-                print(invalid_rows[[col]])
-                raise ValueError(f"Data in {col} contains values exceeding NUMERIC(10, 2) limits")
-        
-        print(f"Processing Item_dim:\n")
-        process_scd_type2(items_df, 'Item_Dim', 'itemno',
-                         ['category', 'category_name', 'pack', 'bottle_volume_ml',
-                          'state_bottle_cost', 'state_bottle_retail'])
-        print("Loaded Item_Dim")
+        dimension_updates['Item_Dim'] = (process_scd_type2, (items_df, 'Item_Dim', 'itemno',
+                                         ['category', 'category_name', 'pack', 'bottle_volume_ml',
+                                          'state_bottle_cost', 'state_bottle_retail']))
     
     if not transformed_data['vendors'].empty:
         transformed_data['vendors'] = transformed_data['vendors'].astype({'vendor_no': str})
-        process_scd_type2(transformed_data['vendors'], f'Vendor_Dim', 'vendor_no',
-                         ['vendor_name'])
-        print("Loaded Vendor_Dim")
-    
-    # Cache dimension keys
-    date_keys = pandas_gbq.read_gbq(f"SELECT date, date_key FROM {dataset_name}.Date_Dim", 
-                                    project_id=PROJECT_ID)
-    date_keys['date'] = pd.to_datetime(date_keys['date'])
-    
-    store_keys = pandas_gbq.read_gbq(f"SELECT store_id, store_key FROM {dataset_name}.Store_Dim WHERE is_active = TRUE", 
-                                     project_id=PROJECT_ID)
-    store_keys['store_id'] = store_keys['store_id'].fillna(-1).astype(int)  # Fill NaN with -1 for inactive stores
-    store_keys['store_id'] = store_keys['store_id'].astype(int)
-    store_keys['store_key'] = store_keys['store_key'].fillna(-1).astype(int)  # Fill NaN with -1 for inactive stores
-    store_keys['store_key'] = store_keys['store_key'].astype(int)  # Ensure store_key is int
-    
-    item_keys = pandas_gbq.read_gbq(f"SELECT itemno, item_key FROM {dataset_name}.Item_Dim WHERE is_active = TRUE", 
-                                    project_id=PROJECT_ID)
-    item_keys['itemno'] = item_keys['itemno'].fillna('Unknown').astype(str)  # Fill NaN with 'Unknown'
-    item_keys['item_key'] = item_keys['item_key'].fillna(-1).astype(int)
-    item_keys['itemno'] = item_keys['itemno'].astype(str)
-    item_keys['item_key'] = item_keys['item_key'].astype(int)  # Ensure item_key is int
-    
-    vendor_keys = pandas_gbq.read_gbq(f"SELECT vendor_no, vendor_key FROM {dataset_name}.Vendor_Dim WHERE is_active = TRUE", 
-                                      project_id=PROJECT_ID)
-    vendor_keys['vendor_no'] = vendor_keys['vendor_no'].fillna('Unknown').astype(str)  # Fill NaN with 'Unknown'
-    vendor_keys['vendor_key'] = vendor_keys['vendor_key'].fillna(-1).astype(int)
-    vendor_keys['vendor_no'] = vendor_keys['vendor_no'].astype(str)
-    vendor_keys['vendor_key'] = vendor_keys['vendor_key'].astype(int)  # Ensure vendor_key is int
-    
-    # Prepare Sales_Fact data
-    sales_data = transformed_data['sales'].copy()
-    
+        dimension_updates['Vendor_Dim'] = (process_scd_type2, (transformed_data['vendors'], f'Vendor_Dim',
+                                           'vendor_no', ['vendor_name']))
+    
+    aio.gather(*dimension_updates.values())
+    print(f"Loaded {', '.join(dimension_updates)}")
+    
+    # Dimension rows must be in the warehouse before their keys are looked up
+    writer.flush()
+    
+    # Resolve dimension keys through the local key cache and load Sales_Fact part by part
+    # (a budgeted transform may have spilled most of the sales rows to disk)
+    key_cache = get_key_cache(dataset_name)
+    key_cache.refresh_all()
+    metrics = get_metrics()
+    started = pd.Timestamp.now()
+    rejected, loaded = [], 0
+    for sales_data in iter_sales(transformed_data):
+        with metrics.span('load_part', kind='chunk') as span:
+            rows_in = len(sales_data)
+            rejected_rows = load_sales(sales_data, key_cache, writer)
+            span.add(rows_in=rows_in, rows_out=rows_in - len(rejected_rows), rows_rejected=len(rejected_rows))
+        loaded += rows_in - len(rejected_rows)
+        rejected.append(rejected_rows)
+        del sales_data
+    writer.flush('Sales_Fact')
+    # Rows of an earlier direct-mode group whose update is in this one go once the update is loaded
+    get_dedup_index().delete_replaced(started)
+    print(f"Total loaded: {loaded} records into Sales_Fact table.")
+    print(f"Key cache: {key_cache.stats['hits']} hits, {key_cache.stats['misses']} misses, "
+          f"{key_cache.stats['queries']} warehouse queries")
+    key_cache.save()
+    
+    # Rejected rows go to the dead-letter store once the rest is loaded, one file per reason
+    rejected_rows = pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame()
+    if not rejected_rows.empty:
+        print(f"Warning: Rejected {len(rejected_rows)} rows: "
+              f"{rejected_rows['reject_reason'].value_counts().to_dict()}")
+        dead_letters = get_dead_letters()
+        dead_letters.write(rejected_rows)
+        print(f"Saved rejected rows to the dead-letter store {dead_letters.root} (run {metrics.run_id}); "
+              f"load them again with `python -m src.dead_letter replay`")
+
+
+def load_sales(sales_data, key_cache, writer, workers=PARALLEL_WORKERS):
+    """
+    Validate, key and encode one part of the sales rows and load it into Sales_Fact.
+
+    Dimension keys of the whole part are looked up once through the key cache; with more
+    than one worker the rest (prepare_facts) runs by hash partition in a process pool.
+
+    Returns:
+        pd.DataFrame: Rejected rows as they were passed in, with a 'reject_reason' column.
+    """
     # Validate required columns
     required_columns = ['invoice_line_no', 'store', 'date', 'itemno', 'vendor_no']
     missing_cols = [col for col in required_columns if col not in sales_data.columns]
@@ -121,188 +124,79 @@ def load(transformed_data, dataset_name=DATASET_ID):
         'revenue', 'profit', 'cost', 'total_bottles_sold', 'total_volume_sold_in_liters',
         'profit_margin', 'average_bottle_price', 'volume_per_bottle_sold', 'processed_timestamp'
     ]
-    sales_data = sales_data[[col for col in necessary_columns if col in sales_data.columns]]
-    
-    # Process in chunks
-    chunk_size = 1000
-    sales_fact_chunks = []
-    failed_chunks = []
-    
-    date_keys = date_keys.drop_duplicates(subset=['date'], keep='last')
-    date_keys['date'] = pd.to_datetime(date_keys['date'], errors='coerce')
-    date_keys = date_keys.set_index('date')
-    
-    for start in range(0, len(sales_data), chunk_size):
-        end = min(start + chunk_size, len(sales_data))
-        chunk = sales_data.iloc[start:end].copy()  # Avoid SettingWithCopyWarning
-        print(f"Processing chunk {start // chunk_size + 1} ({len(chunk)} rows)...")
-        
-        # Ensure consistent data types for INTEGER columns
-        integer_cols = ['store', 'itemno', 'vendor_no']
-        for col in integer_cols:
-            invalid_rows = chunk[~chunk[col].apply(
-                lambda x: str(x).replace('-', '').isdigit() if pd.notna(x) else False
-            )]
-            if not invalid_rows.empty:
-                print(f"Warning: Invalid values in {col}:")
-                print(invalid_rows[[col]])
-            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(-1).astype(int)
-        
-        # Convert date column
-        chunk['date'] = pd.to_datetime(chunk['date'], errors='coerce')
-        
-        # Convert numeric columns to Decimal for NUMERIC(10, 2) and NUMERIC(5, 2)
-        numeric_cols = [
-            'revenue', 'profit', 'cost', 'total_volume_sold_in_liters',
-            'average_bottle_price', 'volume_per_bottle_sold'
-        ]
-        for col in numeric_cols:
-            if col in chunk.columns:
-                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(-1).astype(float).apply(
-                    lambda x: Decimal(str(round(x, 2))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) 
-                    if not pd.isna(x) else Decimal('0.00')
-                )
-        
-        if 'profit_margin' in chunk.columns:
-            # chunk['profit_margin'] = pd.to_numeric(chunk['profit_margin'], errors='coerce').fillna(-1).astype(float).apply(
-            #     lambda x: Decimal(str(round(x, 2))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) 
-            #     if not pd.isna(x) else Decimal('0.00')
-            # )
-            numeric_profit_margin = pd.to_numeric(chunk['profit_margin'], errors='coerce').fillna(-1).astype(float)
-    
-            clamped_profit_margin = np.clip(numeric_profit_margin, -999.99, 999.99)
-            chunk['profit_margin'] = pd.Series(clamped_profit_margin, index=chunk.index).apply(
-                lambda x: Decimal(str(round(x, 2))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) 
-                if not pd.isna(x) else Decimal('0.00')
-            )
-        # Ensure total_bottles_sold is INTEGER
-        if 'total_bottles_sold' in chunk.columns:
-            chunk['total_bottles_sold'] = pd.to_numeric(chunk['total_bottles_sold'], errors='coerce').fillna(-1).astype(int)
-        
-        # Add processed_timestamp
-        chunk['processed_timestamp'] = pd.Timestamp.now()
-        
-        # Drop rows with NaT in date
-        if chunk['date'].isna().any():
-            print(f"Warning: Dropping {chunk['date'].isna().sum()} rows with NaT in 'date' for chunk {start // chunk_size + 1}")
-            chunk = chunk.dropna(subset=['date'])
-        
-        try:
-            # Filter dimension keys
-            chunk_dates = chunk['date'].unique()
-            chunk_stores = chunk['store'].unique()
-            chunk_items = chunk['itemno'].unique()
-            chunk_vendors = chunk['vendor_no'].unique()
-            
-            # Filter and deduplicate date_keys
-            filtered_date_keys = date_keys.loc[chunk_dates, ['date_key']].reset_index().drop_duplicates(subset=['date'], keep='first')
-            filtered_store_keys = store_keys[store_keys['store_id'].isin(chunk_stores)][['store_id', 'store_key']]
-            filtered_item_keys = item_keys[item_keys['itemno'].isin(chunk_items)][['itemno', 'item_key']]
-            filtered_vendor_keys = vendor_keys[vendor_keys['vendor_no'].isin(chunk_vendors)][['vendor_no', 'vendor_key']]
-            
-            # Merge with date_keys
-            chunk_merged = chunk.merge(filtered_date_keys, on='date', how='left')
-            if len(chunk_merged) > len(chunk):
-                chunk.to_csv(f'chunk_before_merge_{start // chunk_size + 1}.csv', index=False)
-                chunk_merged.to_csv(f'chunk_after_merge_{start // chunk_size + 1}.csv', index=False)
-                raise ValueError(f"Unexpected row increase after date merge in chunk {start // chunk_size + 1}. Saved data for debugging.")
-            
-            # Set default for missing date_key and ensure INTEGER
-            chunk_merged['date_key'] = pd.to_numeric(chunk_merged['date_key'], errors='coerce').fillna(-1).astype(int)
-            
-            # Merge with store_keys and drop store_id to avoid duplicate columns
-            chunk_merged = chunk_merged.merge(filtered_store_keys, left_on='store', right_on='store_id', how='left').drop(columns=['store_id'], errors='ignore')
-            if len(chunk_merged) > len(chunk):
-                raise ValueError("Unexpected row increase after store merge.")
-            chunk_merged['store_key'] = pd.to_numeric(chunk_merged['store_key'], errors='coerce').fillna(-1).astype(int)
-            
-            # Merge with item_keys
-            chunk_merged = chunk_merged.merge(filtered_item_keys, on='itemno', how='left')
-            if len(chunk_merged) > len(chunk):
-                raise ValueError("Unexpected row increase after item merge.")
-            chunk_merged['item_key'] = pd.to_numeric(chunk_merged['item_key'], errors='coerce').fillna(-1).astype(int)
-            
-            # Merge with vendor_keys
-            chunk_merged = chunk_merged.merge(filtered_vendor_keys, on='vendor_no', how='left')
-            if len(chunk_merged) > len(chunk):
-                raise ValueError("Unexpected row increase after vendor merge.")
-            chunk_merged['vendor_key'] = pd.to_numeric(chunk_merged['vendor_key'], errors='coerce').fillna(-1).astype(int)
-            
-            # Debug: Check for string values in INTEGER columns
-            integer_cols_final = ['store', 'date_key', 'store_key', 'item_key', 'vendor_key', 'total_bottles_sold']
-            for col in integer_cols_final:
-                if col in chunk_merged.columns and chunk_merged[col].apply(lambda x: isinstance(x, str)).any():
-                    print(f"Warning: String values found in {col}:")
-                    print(chunk_merged[chunk_merged[col].apply(lambda x: isinstance(x, str))][[col]])
-                    raise ValueError(f"String values in {col} detected before loading.")
-            
-            # Select final columns
-            required_columns = [
-                'invoice_line_no', 'store', 'date_key', 'store_key', 'item_key', 'vendor_key',
-                'revenue', 'profit', 'cost', 'total_bottles_sold', 'total_volume_sold_in_liters',
-                'profit_margin', 'average_bottle_price', 'volume_per_bottle_sold', 'processed_timestamp'
-            ]
-            missing_cols = [col for col in required_columns if col not in chunk_merged.columns]
-            if missing_cols:
-                raise ValueError(f"Missing required columns in chunk {start // chunk_size + 1}: {missing_cols}")
-            
-            chunk_fact = chunk_merged[required_columns].dropna(subset=['date_key', 'store_key', 'item_key', 'vendor_key'])
-            if not chunk_fact.empty:
-                # Final type check before loading
-                print(f"Chunk {start // chunk_size + 1} dtypes:\n{chunk_fact.dtypes}")
-                sales_fact_chunks.append(chunk_fact)
-                print(f"Chunk {start // chunk_size + 1} processed successfully: {len(chunk_fact)} valid records")
-        
-        except ValueError as ve:
-            print(f"ValueError in chunk {start // chunk_size + 1}: {ve}")
-            chunk.to_csv(f'failed_chunk_{start // chunk_size + 1}.csv', index=False)
-            failed_chunks.append({'start_index': start, 'data': chunk})
-        except MemoryError as me:
-            print(f"MemoryError in chunk {start // chunk_size + 1}: {me}")
-            chunk.to_csv(f'failed_chunk_{start // chunk_size + 1}.csv', index=False)
-            failed_chunks.append({'start_index': start, 'data': chunk})
-        except Exception as e:
-            print(f"Unexpected error in chunk {start // chunk_size + 1}: {e}")
-            chunk.to_csv(f'failed_chunk_{start // chunk_size + 1}.csv', index=False)
-            failed_chunks.append({'start_index': start, 'data': chunk})
-        finally:
-            del chunk, chunk_merged, filtered_date_keys, filtered_store_keys, filtered_item_keys, filtered_vendor_keys
-            gc.collect()
-    
-    # Save failed chunks
-    if failed_chunks:
-        pd.DataFrame(failed_chunks, columns=['start_index', 'data']).to_csv('failed_chunks.csv')
-        print(f"Saved {len(failed_chunks)} failed chunks to 'failed_chunks.csv'")
-    
-    # Load chunks to Sales_Fact
-    print("Loading Sales_Fact...")
-    if sales_fact_chunks:
-        batch_size = 10000  # Larger batch size for BigQuery
-        total_loaded = 0
-        
-        for i in range(0, len(sales_fact_chunks), batch_size // chunk_size):
-            batch_chunks = sales_fact_chunks[i:i + (batch_size // chunk_size)]
-            if batch_chunks:
-                sales_fact_batch = pd.concat(batch_chunks, ignore_index=True)
-                if not sales_fact_batch.empty:
-                    # Debug: Check for '4849' in INTEGER columns
-                    for col in ['store', 'date_key', 'store_key', 'item_key', 'vendor_key', 'total_bottles_sold']:
-                        if col in sales_fact_batch.columns and sales_fact_batch[col].astype(str).str.contains('4849').any():
-                            print(f"Value '4849' found in {col}:\n{sales_fact_batch[sales_fact_batch[col].astype(str).str.contains('4849')][[col]]}")
-                    
-                    pandas_gbq.to_gbq(
-                        sales_fact_batch,
-                        f'{dataset_name}.Sales_Fact',
-                        project_id=PROJECT_ID,
-                        if_exists='append'
-                    )
-                    total_loaded += len(sales_fact_batch)
-                    print(f"Loaded batch {i // (batch_size // chunk_size) + 1}: {len(sales_fact_batch)} records")
-                del sales_fact_batch, batch_chunks
-                gc.collect()
-        
-        print(f"Total loaded: {total_loaded} records into Sales_Fact table.")
-        del sales_fact_chunks
-        gc.collect()
+    sales_data = sales_data[[col for col in necessary_columns if col in sales_data.columns]].reset_index(drop=True)
+    
+    # The dimensions' cache misses are fetched concurrently; they are reads, so safe to repeat
+    lookups = aio.gather(*[(key_cache.lookup, (dim_table, sales_data[column]), {'idempotent': True})
+                           for column, dim_table, _, _ in FACT_KEYS])
+    key_frames = {dim_table: frame for (_, dim_table, _, _), frame in zip(FACT_KEYS, lookups)}
+    processed_timestamp = pd.Timestamp.now()
+    if workers > 1 and not sales_data.empty:
+        sales_fact, rejected_rows = prepare_facts_partitioned(sales_data, key_frames, processed_timestamp, workers)
     else:
-        print("No chunks processed.")
\ No newline at end of file
+        # prepare_facts converts columns in place; rejected rows keep the values passed in
+        sales_fact, rejected_rows = prepare_facts(sales_data.copy(deep=False), key_frames, processed_timestamp)
+    rejected_rows = sales_data.loc[rejected_rows.index].assign(reject_reason=rejected_rows['reject_reason'])
+    del sales_data
+    
+    # Buffered for Sales_Fact; load() flushes once all parts are written
+    if not sales_fact.empty:
+        writer.write('Sales_Fact', sales_fact)
+        # Committed to the dedup index by the pipeline together with the watermark
+        get_dedup_index().add(sales_fact)
+    return rejected_rows
+
+
+def prepare_facts(sales_data, key_frames, processed_timestamp):
+    """
+    Turn cleaned sales rows into Sales_Fact rows; rows are independent of each other.
+
+    Args:
+        sales_data (pd.DataFrame): Cleaned sales rows.
+        key_frames (dict): Dimension table -> frame of [natural key, surrogate key].
+        processed_timestamp (pd.Timestamp): Load time stamped on every row.
+
+    Returns:
+        tuple: (Sales_Fact rows, rejected rows with a 'reject_reason' column).
+    """
+    # Validate whole columns once; quarantine bad rows instead of discarding whole chunks
+    sales_data, rejected_rows = split_valid(sales_data, SALES_FACT_RULES)
+    
+    # Convert types for the whole batch (values already validated)
+    sales_data['store'] = pd.to_numeric(sales_data['store'], errors='coerce').fillna(-1).astype(int)
+    sales_data['date'] = pd.to_datetime(sales_data['date'], errors='coerce')
+    
+    # Encode numeric columns as NUMERIC(10, 2) and NUMERIC(5, 2)
+    encode_numeric_columns(sales_data, [
+        'revenue', 'profit', 'cost', 'total_volume_sold_in_liters',
+        'average_bottle_price', 'volume_per_bottle_sold'
+    ], *NUMERIC_10_2)
+    # profit_margin is clamped to the NUMERIC(5, 2) range rather than rejected
+    encode_numeric_columns(sales_data, ['profit_margin'], *NUMERIC_5_2, clip=True)
+    # Ensure total_bottles_sold is INTEGER
+    if 'total_bottles_sold' in sales_data.columns:
+        sales_data['total_bottles_sold'] = pd.to_numeric(sales_data['total_bottles_sold'], errors='coerce').fillna(-1).astype(int)
+    
+    sales_data['processed_timestamp'] = processed_timestamp
+    
+    # date_key is yyyymmdd; the other keys map every row in one pass, misses get -1
+    sales_data['date_key'] = date_keys(sales_data['date'])
+    sales_data, fan_out_rows = resolve_fact_keys(sales_data, key_frames)
+    rejected_rows = pd.concat([rejected_rows, fan_out_rows])
+    
+    # Check INTEGER columns by dtype rather than scanning values
+    integer_cols_final = ['store', 'date_key', 'store_key', 'item_key', 'vendor_key', 'total_bottles_sold']
+    for col in integer_cols_final:
+        if col in sales_data.columns and not pd.api.types.is_integer_dtype(sales_data[col]):
+            raise ValueError(f"Non-integer dtype {sales_data[col].dtype} in {col} detected before loading.")
+    
+    # Select final columns
+    required_columns = [
+        'invoice_line_no', 'store', 'date_key', 'store_key', 'item_key', 'vendor_key',
+        'revenue', 'profit', 'cost', 'total_bottles_sold', 'total_volume_sold_in_liters',
+        'profit_margin', 'average_bottle_price', 'volume_per_bottle_sold', 'processed_timestamp'
+    ]
+    missing_cols = [col for col in required_columns if col not in sales_data.columns]
+    if missing_cols:
+        raise ValueError(f"Missing required columns: {missing_cols}")
+    return sales_data[required_columns], rejected_rows
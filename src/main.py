@@ -1,38 +1,117 @@
-from src.extract import extract
-from src.transform import transform
+from src.extract import extract, extract_stream, mark_processed
+from src.transform import transform, transform_stream
 from src.load import load
-from src.config import BUCKET_NAME, DATASET_ID, TABLE_ID, INPUT_PATH, OUTPUT_PATH
-from google.cloud import storage
+from src.writer import get_writer
+from src.watermark import commit_watermark
+from src.manifest import get_manifest
+from src.dedup import get_dedup_index
+from src.metrics import traced
+from src.shards import shard_count, extract_shard, commit_shards
+from src.config import BUCKET_NAME, BUCKET_PREFIX, DATASET_ID, TABLE_ID, INPUT_PATH, OUTPUT_PATH, PIPELINE_MODE, STAGING_AUDIT, MANIFEST_FULL_LISTING
+from src.clients import get_storage_client
+import os
 # from src.load import Load
 class ELTPipeline:
     """ Run Extract → Transform → Load """
-    def __init__(self, bucket_name, creds, bucket_files):
+    def __init__(self, bucket_name, creds, bucket_files, mode=PIPELINE_MODE, staging_audit=STAGING_AUDIT):
         self.bucket_name = bucket_name
         self.storage_client = creds
         self.bucket_files = bucket_files
+        self.mode = mode
+        self.staging_audit = staging_audit
 
+    @traced('pipeline', kind='run')
     def run(self):
         """ Method to execute ETL Pipeline"""
+        if self.mode == 'direct':
+            return self.run_direct()
         extractor = extract(bucket_files=self.bucket_files)
         if not extractor:
             print("No new files to process. Exiting pipeline.")
             return
+        self.transform_load()
+
+    def transform_load(self):
+        """ Transform what is staged since the watermark and load it """
         transformer = transform()
 
         load(transformed_data=transformer, dataset_name=DATASET_ID)
+        if transformer:
+            commit_watermark(transformer.get('watermark'))
+            get_dedup_index().commit()
+
+    def run_direct(self):
+        """ Transform extract's chunk stream in memory, without reading Staging_Sales back """
+        chunks = extract_stream(bucket_files=self.bucket_files, staging_audit=self.staging_audit)
+        for transformer, completed_files in transform_stream(chunks):
+            if transformer:
+                load(transformed_data=transformer, dataset_name=DATASET_ID)
+                # Keeps a later staged run from re-reading the audit copy of these rows
+                commit_watermark(transformer.get('watermark'))
+                get_dedup_index().commit()
+            # A file is only marked processed once all of its rows are loaded
+            for file_name in completed_files:
+                mark_processed(file_name)
+        get_writer().flush()
+        get_manifest().save()
+
+
+def run_event(storage_client, bucket_name, file_name, task_index=0, task_count=1, step='extract'):
+    """
+    Process the single object named by a storage event (INPUT_BUCKET/INPUT_FILE).
+
+    A job run with one task runs the whole pipeline on the object. With several tasks
+    (CLOUD_RUN_TASK_COUNT) each task stages one newline-aligned byte range of it, and a
+    following run with step='commit' marks the file processed, once every shard has
+    completed, then transforms and loads it.
+
+    Args:
+        task_count (int): Tasks of the extract run (SHARD_COUNT, passed to both runs).
+        step (str): 'extract' or 'commit'.
+    """
+    blob = storage_client.bucket(bucket_name).get_blob(file_name)
+    if blob is None:
+        raise FileNotFoundError(f"gs://{bucket_name}/{file_name} does not exist")
+    if not get_manifest().filter_new([blob]):
+        print(f"{file_name} is already processed (or not a CSV file). Skipping.")
+        return
+    pipeline = ELTPipeline(bucket_name=bucket_name, creds=storage_client, bucket_files=[blob])
+    count = shard_count(blob.size, task_count)
+    if count == 1 and step != 'commit':
+        if task_index == 0:
+            pipeline.run()
+    elif step == 'commit':
+        if count > 1:
+            commit_shards(blob, count)
+            pipeline.transform_load()
+    elif task_index < count:
+        extract_shard(blob, task_index, count)
 
 
 if __name__ == "__main__":
 
 
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
 
-    BUCKET_FILES = storage_client.get_bucket(BUCKET_NAME)
-    print(type(BUCKET_FILES))
-    print(f"Files in bucket {BUCKET_NAME}: {[file.name for file in BUCKET_FILES.list_blobs()]}")
-    pipeline = ELTPipeline(
-        bucket_name=BUCKET_NAME,
-        creds=storage_client,
-        bucket_files=BUCKET_FILES.list_blobs()
-    )
-    pipeline.run()
\ No newline at end of file
+    INPUT_FILE = os.environ.get('INPUT_FILE')
+    if INPUT_FILE:
+        # Event-driven run (workflow.yaml): only the object that triggered it
+        run_event(
+            storage_client,
+            bucket_name=os.environ.get('INPUT_BUCKET', BUCKET_NAME),
+            file_name=INPUT_FILE,
+            task_index=int(os.environ.get('CLOUD_RUN_TASK_INDEX', 0)),
+            task_count=int(os.environ.get('SHARD_COUNT', os.environ.get('CLOUD_RUN_TASK_COUNT', 1))),
+            step=os.environ.get('ETL_STEP', 'extract'),
+        )
+    else:
+        BUCKET = storage_client.get_bucket(BUCKET_NAME)
+        # List once, from the manifest's marker, and hand the new blobs to the pipeline
+        BUCKET_FILES = get_manifest().list_new(BUCKET, prefix=BUCKET_PREFIX, full_listing=MANIFEST_FULL_LISTING)
+        print(f"New files in bucket {BUCKET_NAME}: {[file.name for file in BUCKET_FILES]}")
+        pipeline = ELTPipeline(
+            bucket_name=BUCKET_NAME,
+            creds=storage_client,
+            bucket_files=BUCKET_FILES
+        )
+        pipeline.run()
@@ -0,0 +1,126 @@
+import os
+import json
+import pandas as pd
+from google.api_core.exceptions import GoogleAPIError
+from src.config import PROJECT_ID, DATASET_ID, MANIFEST_DIR
+from src.warehouse import get_warehouse
+from src.utils import get_processed_files
+
+MANIFEST_COLUMNS = ['file_name', 'generation', 'size', 'md5_hash', 'processed_timestamp']
+
+
+class FileManifest:
+    """
+    Local index of processed bucket objects, kept in sync with Processed_Files.
+
+    The manifest stores each processed object's name, generation, size and md5 in a
+    Parquet file plus a listing marker: the highest object name up to which every listed
+    object has been processed. Listing restarts from that marker (GCS lists names in
+    lexicographic order), so only objects named at or after it are fetched; use
+    full_listing=True for buckets whose new object names do not sort last.
+    """
+
+    def __init__(self, manifest_dir=MANIFEST_DIR, project_id=PROJECT_ID, dataset_name=DATASET_ID):
+        self.project_id = project_id
+        self.dataset_name = dataset_name
+        os.makedirs(manifest_dir, exist_ok=True)
+        self.path = os.path.join(manifest_dir, 'manifest.parquet')
+        self.meta_path = os.path.join(manifest_dir, 'manifest.json')
+        if os.path.exists(self.path):
+            self.entries = pd.read_parquet(self.path).set_index('file_name')
+        else:
+            self.entries = pd.DataFrame(columns=MANIFEST_COLUMNS).set_index('file_name')
+        self.meta = {'marker': None, 'synced_through': None}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+        self.listed = []
+        self.pending = []
+        self._blobs = {}
+        self._synced = False
+
+    def sync(self):
+        """Pull Processed_Files rows written since the last sync (all of them on first use)."""
+        if self._synced:
+            return
+        query = f"SELECT file_name, processed_timestamp FROM `{self.project_id}.{self.dataset_name}.Processed_Files`"
+        if self.meta.get('synced_through'):
+            query += f" WHERE processed_timestamp > TIMESTAMP '{self.meta['synced_through']}'"
+        try:
+            rows = get_warehouse(self.project_id, self.dataset_name).read(query)
+        except GoogleAPIError:
+            # get_processed_files creates the table when it does not exist yet
+            rows = pd.DataFrame({'file_name': sorted(get_processed_files(self.project_id, self.dataset_name))})
+        if 'processed_timestamp' in rows and rows['processed_timestamp'].notna().any():
+            self.meta['synced_through'] = pd.to_datetime(rows['processed_timestamp'], utc=True).max().isoformat()
+        rows = rows[~rows['file_name'].isin(self.entries.index)]
+        if not rows.empty:
+            rows = rows.reindex(columns=MANIFEST_COLUMNS).set_index('file_name')
+            self.entries = pd.concat([self.entries, rows])
+            print(f"Synced {len(rows)} processed files into the local manifest")
+        self._synced = True
+
+    def is_processed(self, blob):
+        return os.path.basename(blob.name) in self.entries.index
+
+    def filter_new(self, blobs):
+        """Return the CSV blobs not yet processed."""
+        self.sync()
+        self._blobs.update({os.path.basename(blob.name): blob for blob in blobs})
+        new_blobs = [blob for blob in blobs if blob.name.endswith('.csv') and not self.is_processed(blob)]
+        generation = self.entries['generation']
+        for blob in blobs:
+            name = os.path.basename(blob.name)
+            if name in self.entries.index and not pd.isna(generation.get(name)) \
+                    and getattr(blob, 'generation', None) not in (None, generation.get(name)):
+                print(f"Warning: {blob.name} was overwritten (generation {blob.generation}) after it was processed")
+        return new_blobs
+
+    def list_new(self, bucket, prefix=None, full_listing=False):
+        """
+        List only the bucket objects that still need processing.
+
+        Args:
+            bucket (google.cloud.storage.Bucket): Bucket to list.
+            prefix (str): Only list objects under this prefix.
+            full_listing (bool): Ignore the marker and list the whole prefix.
+
+        Returns:
+            list: New CSV blobs.
+        """
+        marker = None if full_listing else self.meta.get('marker')
+        self.listed = list(bucket.list_blobs(prefix=prefix, start_offset=marker))
+        self.pending = self.filter_new(self.listed)
+        print(f"Listed {len(self.listed)} objects from marker {marker!r}: {len(self.pending)} new")
+        return self.pending
+
+    def record(self, file_name):
+        """Add a processed file to the manifest (persisted by save())."""
+        blob = self._blobs.get(file_name)
+        self.entries.loc[file_name] = {
+            'generation': getattr(blob, 'generation', None),
+            'size': getattr(blob, 'size', None),
+            'md5_hash': getattr(blob, 'md5_hash', None),
+            'processed_timestamp': pd.Timestamp.now(tz='UTC'),
+        }
+
+    def save(self):
+        """Persist entries and advance the listing marker past fully processed objects."""
+        for blob in sorted(self.listed, key=lambda b: b.name):
+            if blob.name.endswith('.csv') and not self.is_processed(blob):
+                break
+            self.meta['marker'] = blob.name
+        self.entries.reset_index().to_parquet(self.path, index=False)
+        with open(self.meta_path, 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+
+_manifest = None
+
+
+def get_manifest():
+    """Process-wide FileManifest."""
+    global _manifest
+    if _manifest is None:
+        _manifest = FileManifest()
+    return _manifest
@@ -0,0 +1,332 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from src.config import METRICS_SINKS, METRICS_DIR, METRICS_CHUNK_SAMPLE
+
+# Counters every span carries. A finished span adds its I/O counters to its parent; row
+# counters only roll up from the chunks and files that make up a stage, since the rows of
+# different stages (or of the dimensions inside load) are not the same rows
+COUNTERS = ('rows_in', 'rows_out', 'rows_rejected', 'bytes_read', 'bytes_written', 'warehouse_jobs')
+ROW_COUNTERS = ('rows_in', 'rows_out', 'rows_rejected')
+PART_KINDS = ('chunk', 'file')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Span:
+    """
+    Timing and counters of one unit of work (a stage, a file or a chunk).
+
+    Used as a context manager the span becomes the current span of its thread, so
+    Metrics.count() calls made inside it (e.g. by the bulk writer) are attributed to it.
+    A span can also be started and ended explicitly when its work interleaves with other
+    spans, e.g. files whose chunks arrive interleaved.
+    """
+
+    def __init__(self, metrics, name, kind, labels, parent=None):
+        self.metrics = metrics
+        self.name = name
+        self.kind = kind
+        self.labels = labels
+        self.parent = parent
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def add(self, **counts):
+        """Increment counters (rows_in=..., bytes_written=..., ...)."""
+        # Children running in other threads (e.g. concurrent I/O calls) add to the same span
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] += value
+
+    def end(self, error=None):
+        record = {
+            'run_id': self.metrics.run_id,
+            'span': self.name,
+            'kind': self.kind,
+            'parent': self.parent.name if self.parent else None,
+            'labels': self.labels,
+            'started_at': self.started_at.isoformat(),
+            'wall_s': round(time.perf_counter() - self._wall, 6),
+            # Process CPU time, so a stage's worker threads count towards it
+            'cpu_s': round(time.process_time() - self._cpu, 6),
+            **self.counters,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+        if error is not None:
+            record['error'] = type(error).__name__
+        if self.parent:
+            self.parent.add(**{name: value for name, value in self.counters.items()
+                               if self.kind in PART_KINDS or name not in ROW_COUNTERS})
+        self.metrics.emit(record)
+        return record
+
+    def __enter__(self):
+        self.start()
+        self.metrics._stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._stack().pop()
+        self.end(exc)
+
+
+class _NoopSpan:
+    """Span returned when no sink is configured; every method does nothing."""
+    counters = dict.fromkeys(COUNTERS, 0)
+
+    def start(self):
+        return self
+
+    def add(self, **counts):
+        pass
+
+    def end(self, error=None):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class NullSink:
+    """Discards every span."""
+
+    def emit(self, record, sampled):
+        pass
+
+    def gauge(self, record):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Append one JSON object per (sampled) finished span to a file."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'a', buffering=1)
+        self._lock = threading.Lock()
+
+    def emit(self, record, sampled):
+        if not sampled:
+            return
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self.file.write(line + '\n')
+
+    def gauge(self, record):
+        self.emit(record, True)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class PrometheusSink:
+    """
+    Aggregate every finished span by (span, kind) and write the totals in the Prometheus
+    text exposition format, e.g. for the node_exporter textfile collector. The file is
+    rewritten (atomically) whenever a stage ends and on close.
+    """
+
+    def __init__(self, path, prefix='etl'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.prefix = prefix
+        self.totals = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record, sampled):
+        key = (record['span'], record['kind'])
+        with self._lock:
+            totals = self.totals.setdefault(key, dict.fromkeys(('spans', 'wall_s', 'cpu_s') + COUNTERS, 0))
+            totals['spans'] += 1
+            for name in ('wall_s', 'cpu_s') + COUNTERS:
+                totals[name] += record[name]
+            totals['peak_rss_mb'] = max(totals.get('peak_rss_mb', 0), record['peak_rss_mb'])
+        if record['kind'] == 'stage':
+            self.flush()
+
+    def gauge(self, record):
+        with self._lock:
+            self.gauges.update(record['gauges'])
+        self.flush()
+
+    def render(self):
+        metrics = [('spans', 'spans_total', 'counter', 'Finished spans.'),
+                   ('wall_s', 'span_wall_seconds_total', 'counter', 'Wall time spent in spans.'),
+                   ('cpu_s', 'span_cpu_seconds_total', 'counter', 'Process CPU time spent in spans.')]
+        metrics += [(name, f'{name}_total', 'counter', f'{name.replace("_", " ").capitalize()}.')
+                    for name in COUNTERS]
+        metrics.append(('peak_rss_mb', 'peak_rss_megabytes', 'gauge', 'Peak resident set size at span end.'))
+        lines = []
+        with self._lock:
+            for field, metric, metric_type, help_text in metrics:
+                name = f'{self.prefix}_{metric}'
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+                for (span, kind), totals in sorted(self.totals.items()):
+                    lines.append(f'{name}{{span="{span}",kind="{kind}"}} {totals[field]:g}')
+            for gauge, value in sorted(self.gauges.items()):
+                name = f'{self.prefix}_{gauge}'
+                lines += [f'# TYPE {name} gauge', f'{name} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.flush()
+
+
+class Metrics:
+    """
+    Creates spans and hands finished ones to the sinks.
+
+    With no sinks every span is the shared no-op span, so instrumented code costs one
+    attribute check per call. Chunk spans are always aggregated but only one in
+    chunk_sample is passed on as sampled, so line-oriented sinks stay small.
+    """
+
+    def __init__(self, sinks=(), chunk_sample=METRICS_CHUNK_SAMPLE):
+        self.sinks = [sink for sink in sinks if not isinstance(sink, NullSink)]
+        self.enabled = bool(self.sinks)
+        self.chunk_sample = max(1, chunk_sample)
+        self.run_id = uuid.uuid4().hex[:12]
+        self._local = threading.local()
+        self._chunks = {}
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self):
+        """The innermost span entered by this thread, or None."""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def attach(self, span):
+        """Make span, started by another thread, the current span of this thread for a while."""
+        if not self.enabled or span is None:
+            yield
+            return
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def span(self, name, kind='stage', parent=None, **labels):
+        """A span to use as a context manager; its parent defaults to the current span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, kind, labels, parent=parent or self.current())
+
+    def start_span(self, name, kind='file', parent=None, **labels):
+        """A started span that is ended explicitly and never becomes the current span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, kind, labels, parent=parent or self.current()).start()
+
+    def count(self, **counts):
+        """Add counters to the current span of this thread (dropped outside any span)."""
+        if not self.enabled:
+            return
+        span = self.current()
+        if span is not None:
+            span.add(**counts)
+
+    def gauge(self, **values):
+        """Publish point-in-time values (e.g. queue depth) that replace their previous value."""
+        if not self.enabled:
+            return
+        record = {'run_id': self.run_id, 'at': datetime.now(timezone.utc).isoformat(), 'gauges': values}
+        for sink in self.sinks:
+            sink.gauge(record)
+
+    def emit(self, record):
+        sampled = True
+        if record['kind'] == 'chunk':
+            with self._lock:
+                seen = self._chunks[record['span']] = self._chunks.get(record['span'], 0) + 1
+            sampled = (seen - 1) % self.chunk_sample == 0
+        for sink in self.sinks:
+            sink.emit(record, sampled)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+        self.enabled = False
+
+
+def make_sink(name, metrics_dir=METRICS_DIR):
+    """Sink for a METRICS_SINKS entry: 'jsonl', 'prometheus' or 'none'."""
+    if name == 'jsonl':
+        return JsonLinesSink(os.path.join(metrics_dir, 'spans.jsonl'))
+    if name == 'prometheus':
+        return PrometheusSink(os.path.join(metrics_dir, 'etl.prom'))
+    if name == 'none':
+        return NullSink()
+    raise ValueError(f"Unknown metrics sink {name!r}")
+
+
+def traced(name, kind='stage'):
+    """Run the decorated function inside a span; it can add counters with get_metrics().count()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().span(name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_metrics = None
+
+
+def get_metrics():
+    """Process-wide Metrics for the sinks configured in METRICS_SINKS, closed at exit."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics([make_sink(name) for name in METRICS_SINKS])
+        atexit.register(_metrics.close)
+    return _metrics
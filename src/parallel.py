@@ -0,0 +1,159 @@
+import atexit
+import multiprocessing
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from src.config import PARALLEL_PARTITION_BY, PARALLEL_DIR, PARALLEL_START_METHOD
+
+_pool = None
+_pool_workers = 0
+# Key tables memory-mapped by this (worker) process, by path
+_shared_keys = {}
+
+
+def partition_ids(df, by=PARALLEL_PARTITION_BY, partitions=1):
+    """
+    Partition of every row: a hash of its `by` value modulo partitions.
+
+    Values are hashed as text with pandas' fixed-key hash, so a store lands in the same
+    partition whether it was parsed as a number or a string, in every process.
+    """
+    if by not in df.columns:
+        # file_name is not carried into fact preparation; store always is
+        by = 'store'
+    values = df[by].astype(str).to_numpy(dtype=object)
+    return (pd.util.hash_array(values) % np.uint64(partitions)).astype(np.int64)
+
+
+def _types_mapper(arrow_type):
+    # NUMERIC columns stay Arrow decimals, as encode_numeric produced them
+    if pa.types.is_decimal(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def write_frame(df, path):
+    """Write df (with its index) as an Arrow IPC file."""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(path, 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_frame(path):
+    """Read an Arrow IPC file written by write_frame through a memory map."""
+    return ipc.open_file(pa.memory_map(path)).read_all().to_pandas(types_mapper=_types_mapper)
+
+
+def _key_frames(key_paths):
+    """Key tables of the current run, mapped once per worker process."""
+    for path in set(_shared_keys) - set(key_paths.values()):
+        del _shared_keys[path]
+    for path in key_paths.values():
+        if path not in _shared_keys:
+            _shared_keys[path] = read_frame(path)
+    return {dim_table: _shared_keys[path] for dim_table, path in key_paths.items()}
+
+
+def _clean_task(in_path, out_path):
+    from src.transform import clean_rows
+    write_frame(clean_rows(read_frame(in_path)), out_path)
+    return out_path
+
+
+def _facts_task(in_path, out_path, rejected_path, key_paths, processed_timestamp):
+    from src.load import prepare_facts
+    sales_fact, rejected_rows = prepare_facts(read_frame(in_path), _key_frames(key_paths), processed_timestamp)
+    write_frame(sales_fact, out_path)
+    write_frame(rejected_rows, rejected_path)
+    return out_path, rejected_path
+
+
+def get_pool(workers):
+    """Process-wide pool of `workers` processes, recreated if the worker count changes."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = ProcessPoolExecutor(max_workers=workers,
+                                    mp_context=multiprocessing.get_context(PARALLEL_START_METHOD))
+        _pool_workers = workers
+    return _pool
+
+
+@atexit.register
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def _run_partitioned(df, workers, task, *args, outputs=1, partition_dir=PARALLEL_DIR):
+    """
+    Run task on each non-empty hash partition of df and merge the results in row order.
+
+    Partitions and results are exchanged as Arrow files in a directory scoped to this call.
+    Every row keeps its original index, so sorting the concatenated results by index
+    gives the same rows in the same order as running task on df in one piece.
+
+    Returns:
+        list[pd.DataFrame]: One merged frame per task output.
+    """
+    run_dir = os.path.join(partition_dir, uuid.uuid4().hex)
+    os.makedirs(run_dir)
+    try:
+        ids = partition_ids(df, partitions=workers)
+        futures = []
+        for partition in range(workers):
+            part = df[ids == partition]
+            if part.empty:
+                continue
+            in_path = os.path.join(run_dir, f'in-{partition:03d}.arrow')
+            write_frame(part, in_path)
+            out_paths = [os.path.join(run_dir, f'out{n}-{partition:03d}.arrow') for n in range(outputs)]
+            futures.append(get_pool(workers).submit(task, in_path, *out_paths, *args))
+        results = [future.result() for future in futures]
+        if outputs == 1:
+            results = [[path] for path in results]
+        merged = []
+        for n in range(outputs):
+            parts = [read_frame(paths[n]) for paths in results]
+            merged.append(pd.concat(parts).sort_index(kind='stable') if parts else df.iloc[0:0])
+        return merged
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def clean_partitioned(staging_data, workers):
+    """clean_rows over hash partitions of staging_data in the process pool."""
+    return _run_partitioned(staging_data, workers, _clean_task)[0]
+
+
+def prepare_facts_partitioned(sales_data, key_frames, processed_timestamp, workers, partition_dir=PARALLEL_DIR):
+    """
+    prepare_facts over hash partitions of sales_data in the process pool.
+
+    The key tables are written once per call as Arrow files that every worker maps
+    read-only, instead of being pickled into each task.
+
+    Returns:
+        tuple: (Sales_Fact rows, rejected rows with a 'reject_reason' column).
+    """
+    keys_dir = os.path.join(partition_dir, f'keys-{uuid.uuid4().hex}')
+    os.makedirs(keys_dir)
+    try:
+        key_paths = {}
+        for dim_table, key_frame in key_frames.items():
+            key_paths[dim_table] = os.path.join(keys_dir, f'{dim_table}.arrow')
+            write_frame(key_frame, key_paths[dim_table])
+        sales_fact, rejected_rows = _run_partitioned(sales_data, workers, _facts_task, key_paths,
+                                                     processed_timestamp, outputs=2,
+                                                     partition_dir=partition_dir)
+        return sales_fact, rejected_rows
+    finally:
+        shutil.rmtree(keys_dir, ignore_errors=True)
@@ -0,0 +1,67 @@
+import os
+import re
+from functools import lru_cache
+import pyarrow as pa
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql')
+SQL_FILES = ['warehouse.sql', 'source_db.sql', 'processed.sql']
+
+_CREATE_TABLE = re.compile(r"CREATE TABLE\s+`?([\w\-.]+)`?\s*\((.*?)\);", re.DOTALL | re.IGNORECASE)
+_COLUMN = re.compile(r"^(\w+)\s+(\w+(?:\(\s*\d+\s*,\s*\d+\s*\))?)(.*)$")
+_NUMERIC = re.compile(r"NUMERIC\(\s*(\d+)\s*,\s*(\d+)\s*\)", re.IGNORECASE)
+
+
+def _arrow_type(sql_type):
+    """Map a BigQuery/SQLite column type from the sql/ scripts to an Arrow type."""
+    numeric = _NUMERIC.match(sql_type)
+    if numeric:
+        return pa.decimal128(int(numeric.group(1)), int(numeric.group(2)))
+    return {
+        'INT64': pa.int64(),
+        'INTEGER': pa.int64(),
+        'STRING': pa.string(),
+        'TEXT': pa.string(),
+        'FLOAT64': pa.float64(),
+        'BOOL': pa.bool_(),
+        'DATE': pa.date32(),
+        'DATETIME': pa.timestamp('us'),
+        'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+    }[sql_type.upper()]
+
+
+def parse_tables(sql):
+    """
+    Parse CREATE TABLE statements into column definitions.
+
+    Returns:
+        dict: Table name (without project/dataset) -> list of (column, SQL type, NOT NULL).
+    """
+    tables = {}
+    for name, body in _CREATE_TABLE.findall(sql):
+        columns = []
+        for line in body.splitlines():
+            line = line.split('--')[0].strip().rstrip(',')
+            match = _COLUMN.match(line)
+            if match:
+                column, sql_type, rest = match.groups()
+                columns.append((column, sql_type, 'NOT NULL' in rest.upper()))
+        tables[name.split('.')[-1]] = columns
+    return tables
+
+
+@lru_cache(maxsize=None)
+def table_columns():
+    """Column definitions of every table declared in the sql/ scripts."""
+    tables = {}
+    for file_name in SQL_FILES:
+        with open(os.path.join(SQL_DIR, file_name)) as f:
+            tables.update(parse_tables(f.read()))
+    return tables
+
+
+def arrow_schema(table):
+    """Arrow schema for a warehouse table, as declared in the sql/ scripts."""
+    return pa.schema([
+        pa.field(column, _arrow_type(sql_type), nullable=not not_null)
+        for column, sql_type, not_null in table_columns()[table]
+    ])
@@ -0,0 +1,125 @@
+import os
+from datetime import datetime, timezone
+import pandas as pd
+from google.api_core.exceptions import GoogleAPIError
+from src.config import PROJECT_ID, DATASET_ID, BATCH_SIZE, SHARD_MIN_BYTES
+from src.warehouse import get_warehouse
+from src.extract import load_to_staging, mark_processed
+from src.manifest import get_manifest
+from src.checkpoint import get_checkpoints
+from src.metrics import get_metrics, traced
+from src.splitter import iter_csv_chunks
+from src.writer import get_writer
+
+
+def shard_count(size, tasks, min_bytes=SHARD_MIN_BYTES):
+    """
+    Number of shards a file of `size` bytes is split into across `tasks` tasks.
+
+    Every task computes the same count from the object size, so tasks beyond it (for a
+    file too small to be worth splitting that far) agree to stage nothing.
+    """
+    return max(1, min(tasks, size // max(1, min_bytes)))
+
+
+def shard_range(size, index, count):
+    """Byte range [start, end) of shard `index` out of `count` equal shards of `size` bytes."""
+    return size * index // count, size * (index + 1) // count
+
+
+def iter_shard_chunks(blob, index, count, batch_size=BATCH_SIZE, resume_from=None, positions=False):
+    """
+    Parse the records of shard `index` of `count` of a CSV blob, reading only its byte range.
+
+    Args:
+        resume_from (int): Skip the ranges starting before this offset (see iter_csv_chunks).
+        positions (bool): Yield (range start, index in range, chunk) instead of chunks.
+
+    Yields:
+        pd.DataFrame: Chunks of at most batch_size rows of text columns.
+    """
+    start, end = shard_range(blob.size, index, count)
+    yield from iter_csv_chunks(blob, start, end, batch_size=batch_size, resume_from=resume_from,
+                               positions=positions)
+
+
+@traced('extract_shard')
+def extract_shard(blob, index, count):
+    """
+    Stage the records of one shard of a blob and record the shard as complete.
+
+    The file itself is not marked processed: commit_shards() does that once every shard
+    has completed. Chunks are checkpointed like extract()'s, within the shard's byte
+    range, so a retried shard skips the chunks an earlier attempt already staged.
+
+    Returns:
+        int: Rows staged by this attempt.
+    """
+    file_basename = os.path.basename(blob.name)
+    metrics = get_metrics()
+    start, end = shard_range(blob.size, index, count)
+    checkpoints = get_checkpoints()
+    resume = checkpoints.begin([blob], byte_range=(start, end))
+    rows, skipped = 0, 0
+    for range_start, chunk_index, chunk in iter_shard_chunks(blob, index, count, resume_from=resume.get(blob.name),
+                                                             positions=True):
+        if checkpoints.is_staged(file_basename, range_start, chunk_index):
+            skipped += 1
+            continue
+        with metrics.span('extract_chunk', kind='chunk') as span:
+            load_to_staging(chunk, file_basename, checkpoints.chunk_id(file_basename, range_start, chunk_index))
+            span.add(rows_in=len(chunk), rows_out=len(chunk))
+        checkpoints.staged_chunk(file_basename, range_start, chunk_index, len(chunk))
+        rows += len(chunk)
+    metrics.count(bytes_read=end - start)
+    # Loads the shard's last staged rows; the progress row must never land before them
+    checkpoints.commit()
+    checkpoints.finish(file_basename)
+    writer = get_writer()
+    writer.flush('Staging_Sales')
+    writer.write('Shard_Progress', pd.DataFrame({
+        'file_name': [file_basename],
+        'generation': [blob.generation],
+        'shard_index': [index],
+        'shard_count': [count],
+        'row_count': [rows],
+        'completed_at': [datetime.now(timezone.utc)],
+    }))
+    writer.flush('Shard_Progress')
+    print(f"Staged shard {index + 1}/{count} of {file_basename}: {rows} rows from bytes {start}-{end}"
+          + (f" ({skipped} chunks were staged by an earlier attempt)." if skipped else ""))
+    return rows
+
+
+def completed_shards(file_name, generation, count, project_id=PROJECT_ID, dataset_name=DATASET_ID):
+    """Indices of the shards of this generation of a file recorded as complete."""
+    query = f"""
+        SELECT DISTINCT shard_index FROM `{project_id}.{dataset_name}.Shard_Progress`
+        WHERE file_name = '{file_name}' AND generation = {int(generation)} AND shard_count = {int(count)}
+    """
+    try:
+        return set(get_warehouse(project_id, dataset_name).read(query)['shard_index'].astype(int))
+    except GoogleAPIError as e:
+        if "404" not in str(e):
+            raise
+        return set()
+
+
+def commit_shards(blob, count):
+    """
+    Mark a sharded file processed once all `count` shards of its generation completed.
+
+    Raises:
+        RuntimeError: If any shard has not completed; the file stays unprocessed.
+    """
+    file_basename = os.path.basename(blob.name)
+    missing = sorted(set(range(count)) - completed_shards(file_basename, blob.generation, count))
+    if missing:
+        raise RuntimeError(f"Shards {missing} of {file_basename} (generation {blob.generation}) "
+                           f"have not completed; not marking it processed")
+    manifest = get_manifest()
+    manifest.filter_new([blob])
+    mark_processed(file_basename)
+    get_writer().flush()
+    manifest.save()
+    print(f"All {count} shards of {file_basename} completed; marked processed")
@@ -0,0 +1,271 @@
+import csv
+import io
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from src.config import BATCH_SIZE, SPLIT_RANGE_BYTES, SPLIT_WORKERS, SPLIT_SCAN_BYTES
+
+# Records after a candidate boundary that must parse to the header's column count
+CHECK_RECORDS = 8
+_QUOTE_OR_NEWLINE = re.compile(rb'["\n]')
+
+
+def open_source(source, chunk_size=None):
+    """Binary stream of a local CSV path or a GCS blob (ranged reads of chunk_size bytes)."""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    if chunk_size:
+        return source.open('rb', chunk_size=chunk_size)
+    return source.open('rb')
+
+
+def source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return source.size
+
+
+def _first_record(data, quoted):
+    """Index just past the first newline outside quotes, given the quote state at data[0]."""
+    for match in _QUOTE_OR_NEWLINE.finditer(data):
+        if match.group() == b'"':
+            # An escaped quote ("") toggles twice, so the state stays right
+            quoted = not quoted
+        elif not quoted:
+            return match.end()
+    return None
+
+
+def _check_records(data, columns, at_eof):
+    """
+    Whether data starts with whole records of `columns` fields.
+
+    Returns:
+        bool or None: None when the window ends before CHECK_RECORDS records are checked.
+    """
+    reader = csv.reader(io.StringIO(data.decode('utf-8', errors='replace'), newline=''), strict=True)
+    checked = 0
+    try:
+        for row in reader:
+            if not row:
+                # Blank lines are skipped by the parser too
+                continue
+            if len(row) != columns:
+                # The end of the window may cut the last record short
+                if at_eof or next(reader, None) is not None:
+                    return False
+                return None
+            checked += 1
+            if checked == CHECK_RECORDS:
+                return True
+    except csv.Error:
+        return False if at_eof else None
+    return True if at_eof else None
+
+
+def _quote_state(stream, start, end, block_bytes=SPLIT_SCAN_BYTES):
+    """Whether byte `end` is inside a quoted field, by counting quotes from the record start `start`."""
+    stream.seek(start)
+    quotes = 0
+    while start < end:
+        block = stream.read(min(block_bytes, end - start))
+        if not block:
+            break
+        quotes += block.count(b'"')
+        start += len(block)
+    # An escaped quote ("") counts twice, so only the field delimiters change the parity
+    return quotes % 2 == 1
+
+
+def record_start(stream, offset, columns, size, scan_bytes=SPLIT_SCAN_BYTES, known=None):
+    """
+    Offset of the first record that starts at or after `offset`.
+
+    A byte offset does not tell whether it is inside a quoted field, which may hold
+    newlines (e.g. multi-line addresses). Both cases are tried: each gives the first
+    newline outside quotes as a candidate boundary, and a candidate is kept only if the
+    records after it parse to the header's column count. The scan window doubles until
+    one reading is left. When both readings hold (the tail of a quoted field can look
+    like whole records), the quotes are counted from `known` to offset instead.
+
+    Args:
+        stream: Seekable binary stream of the file.
+        offset (int): Byte offset, after the header line.
+        columns (int): Number of header fields.
+        size (int): File size in bytes.
+        known (int): A record start before offset, e.g. the previous range boundary
+            (default: the start of the first record).
+
+    Returns:
+        int: Offset of the record start, or size if no record starts after offset.
+
+    Raises:
+        ValueError: If no boundary is followed by records of `columns` fields.
+    """
+    if offset >= size:
+        return size
+    if known is not None and known >= offset:
+        return known
+    quoted_at = None
+    while True:
+        stream.seek(offset - 1)
+        # data[0] is the byte before offset, so a record starting exactly at offset is found
+        data = stream.read(scan_bytes + 1)
+        at_eof = offset - 1 + len(data) >= size
+        if quoted_at is not None:
+            position = _first_record(data, quoted_at)
+            if position is not None:
+                return offset - 1 + position
+            if at_eof:
+                return size
+            scan_bytes *= 2
+            continue
+        candidates = {}
+        for quoted in (False, True):
+            position = _first_record(data, quoted)
+            if position is not None:
+                candidates[quoted] = _check_records(data[position:], columns, at_eof)
+        held = [quoted for quoted, check in candidates.items() if check]
+        if len(held) == 1 and None not in candidates.values():
+            return offset - 1 + _first_record(data, held[0])
+        if len(held) == 2:
+            if known is None:
+                stream.seek(0)
+                known = len(stream.readline())
+            quoted_at = _quote_state(stream, known, offset - 1)
+            continue
+        if at_eof:
+            if not candidates:
+                return size
+            raise ValueError(f"No record boundary after byte {offset}: records do not have {columns} fields")
+        scan_bytes *= 2
+
+
+def split_ranges(stream, size, count, start=0, end=None):
+    """
+    Split [start, end) of a CSV file into up to `count` record-aligned byte ranges.
+
+    Offsets inside the header line are moved past it, so the ranges only hold records.
+    A range ends where the next begins, so ranges that tile a file hold every record once.
+
+    Returns:
+        tuple: (header line bytes, list of (start, end) ranges, in file order).
+    """
+    end = size if end is None else min(end, size)
+    stream.seek(0)
+    header = stream.readline()
+    columns = len(next(csv.reader([header.decode('utf-8', errors='replace')])))
+    offsets = [start + (end - start) * i // count for i in range(count + 1)]
+    bounds = []
+    for offset in offsets:
+        if offset <= len(header):
+            bounds.append(len(header))
+        else:
+            # Each boundary is a known record start for the quote count of the next
+            bounds.append(record_start(stream, offset, columns, size, known=bounds[-1] if bounds else None))
+    ranges = [(bounds[i], bounds[i + 1]) for i in range(count) if bounds[i] < bounds[i + 1]]
+    return header, ranges
+
+
+class RangeReader(io.RawIOBase):
+    """Binary stream of bytes [start, end) of a seekable stream, after `prefix` (the header line)."""
+
+    def __init__(self, stream, start, end, prefix=b''):
+        self.stream = stream
+        self.pos = start
+        self.end = end
+        self.prefix = prefix
+        stream.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        if self.prefix:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+        elif self.pos < self.end:
+            data = self.stream.read(min(size, self.end - self.pos))
+            self.pos += len(data)
+        else:
+            data = b''
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _parse_range(stream, header, start, end, batch_size):
+    """Parse one record-aligned range as text columns, yielding chunks of batch_size rows."""
+    reader = io.BufferedReader(RangeReader(stream, start, end, prefix=header), buffer_size=8 * 1024 * 1024)
+    try:
+        for chunk in pd.read_csv(reader, chunksize=batch_size, dtype=str):
+            if not chunk.empty:
+                yield chunk
+    except pd.errors.EmptyDataError:
+        return
+
+
+def _read_range(source, header, start, end, batch_size):
+    with open_source(source) as stream:
+        return list(_parse_range(stream, header, start, end, batch_size))
+
+
+def iter_csv_chunks(source, start=0, end=None, range_bytes=SPLIT_RANGE_BYTES, workers=SPLIT_WORKERS,
+                    batch_size=BATCH_SIZE, resume_from=None, positions=False):
+    """
+    Parse a CSV file as record-aligned byte ranges, several at a time, in row order.
+
+    [start, end) is split into ranges of about range_bytes, each parsed from its own
+    stream (a ranged read for a blob) with the file's header line. Up to `workers` ranges
+    are parsed concurrently and their chunks are yielded in file order. A file that fits
+    in one range, or workers=1, is parsed from a single stream as it is read.
+
+    The ranges only depend on the file size and range_bytes, so a chunk's position (the
+    start of its range and its index in the range) identifies it across runs as long as
+    range_bytes and batch_size are unchanged.
+
+    Args:
+        source: Local path or google.cloud.storage Blob.
+        start (int): First byte offset; the records starting in [start, end) are parsed.
+        end (int): End byte offset (default: end of file).
+        resume_from (int): Skip the ranges starting before this offset, a range start
+            returned with positions=True.
+        positions (bool): Yield (range start, index in range, chunk) instead of chunks.
+
+    Yields:
+        pd.DataFrame: Chunks of at most batch_size rows of text columns.
+    """
+    size = source_size(source)
+    end = size if end is None else min(end, size)
+    count = max(1, math.ceil((end - start) / range_bytes))
+
+    def positioned(range_start, chunks):
+        for index, chunk in enumerate(chunks):
+            yield (range_start, index, chunk) if positions else chunk
+
+    with open_source(source, chunk_size=SPLIT_SCAN_BYTES if count > 1 else None) as stream:
+        header, ranges = split_ranges(stream, size, count, start, end)
+        if resume_from:
+            ranges = [(range_start, range_end) for range_start, range_end in ranges if range_start >= resume_from]
+        if workers <= 1 or len(ranges) <= 1:
+            for range_start, range_end in ranges:
+                yield from positioned(range_start, _parse_range(stream, header, range_start, range_end, batch_size))
+            return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='split') as executor:
+        # At most `workers` parsed ranges wait in memory ahead of the consumer
+        pending = []
+        ranges = iter(ranges)
+        for range_start, range_end in ranges:
+            pending.append((range_start, executor.submit(_read_range, source, header, range_start, range_end,
+                                                         batch_size)))
+            if len(pending) == workers:
+                break
+        while pending:
+            range_start, future = pending.pop(0)
+            chunks = future.result()
+            next_range = next(ranges, None)
+            if next_range:
+                pending.append((next_range[0], executor.submit(_read_range, source, header, *next_range,
+                                                               batch_size)))
+            yield from positioned(range_start, chunks)
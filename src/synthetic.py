@@ -0,0 +1,262 @@
+import argparse
+import os
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from src.schema import arrow_schema
+
+# Staging_Sales columns a source file carries (file_name, processed_timestamp and chunk_id are added by extract)
+SOURCE_COLUMNS = [field.name for field in arrow_schema('Staging_Sales')
+                  if field.name not in ('file_name', 'processed_timestamp', 'chunk_id')]
+STORE_COLUMNS = ['address', 'city', 'zipcode', 'store_location', 'county_number', 'county']
+CATEGORY_COLUMNS = ['category', 'category_name']
+PACKS = np.array([6, 12, 24, 48])
+BOTTLE_VOLUMES = np.array([50, 200, 375, 750, 1000, 1750])
+STREETS = np.array(['MAIN ST', 'UNIVERSITY AVE', 'GRAND AVE', 'HICKMAN RD', 'E 14TH ST', '1ST AVE',
+                    'LINCOLN WAY', 'DOUGLAS AVE', 'MERLE HAY RD', 'HWY 30', 'N DODGE ST', 'W BROADWAY'])
+GALLONS_PER_LITER = 0.264172
+SAMPLER_RESOLUTION = 1 << 20
+
+
+def _weights(rng, n, skew):
+    """Zipf-like popularity over n entities, shuffled so ids are unrelated to rank."""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _sampler(weights, resolution=SAMPLER_RESOLUTION):
+    """
+    Quantized inverse CDF of weights: table[rng.integers(0, len(table), n)] draws n
+    entities with (to 1/resolution) those probabilities, far faster than rng.choice.
+    """
+    quantiles = (np.arange(resolution) + 0.5) / resolution
+    return np.searchsorted(np.cumsum(weights), quantiles).clip(max=len(weights) - 1).astype(np.int32)
+
+
+def _strings(*parts):
+    """Element-wise concatenation of string-convertible arrays into an object array."""
+    result = np.asarray(parts[0]).astype(str).astype(object)
+    for part in parts[1:]:
+        result = result + np.asarray(part).astype(str).astype(object)
+    return result
+
+
+class SalesGenerator:
+    """
+    Seedable, vectorized generator of Staging_Sales rows.
+
+    Stores, items, vendors and categories are drawn once with Iowa-like cardinalities and
+    skewed (Zipf-like) popularity; sales rows are then generated a chunk at a time as
+    Arrow tables, so memory is bounded by the chunk size and a seed always produces the
+    same files.
+
+    Every store, item and vendor has an original and a drifted version of its SCD
+    attributes; a drift_rate share of them switches to the drifted version on a random
+    day of the date range (stores relocate, items are repriced, vendors are renamed).
+
+    Args:
+        seed (int): Seed for every random draw.
+        stores, items, vendors, categories, cities (int): Dimension cardinalities.
+        start_date, end_date (str): Sales dates are spread evenly over this range.
+        duplicate_rate (float): Share of rows that repeat an earlier (invoice_line_no,
+            store) of the same chunk with new sale quantities (an update).
+        null_rate (float): Share of rows with nulls in the store address columns, and
+            independently in the category columns.
+        drift_rate (float): Share of stores, items and vendors whose attributes change.
+    """
+
+    def __init__(self, seed=0, stores=2600, items=12000, vendors=350, categories=100, cities=450,
+                 start_date='2012-01-01', end_date='2024-12-31', duplicate_rate=0.01,
+                 null_rate=0.005, drift_rate=0.05):
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.start = np.datetime64(start_date, 'D')
+        self.days = int((np.datetime64(end_date, 'D') - self.start).astype(int)) + 1
+        self.duplicate_rate = duplicate_rate
+        self.null_rate = null_rate
+        self.drift_rate = drift_rate
+        self._make_stores(stores, cities)
+        self._make_vendors(vendors)
+        self._make_items(items, categories, vendors)
+
+    def _drift(self, n):
+        """Per entity: the day its drifted version takes effect (days past the range if never)."""
+        drifts = self.rng.random(n) < self.drift_rate
+        return np.where(drifts, self.rng.integers(1, self.days, n), self.days)
+
+    def _make_stores(self, n, cities):
+        rng = self.rng
+        counties = rng.integers(1, 100, cities)
+        zipcodes = rng.integers(50001, 52810, cities)
+        lon, lat = rng.uniform(-96.6, -90.1, cities), rng.uniform(40.4, 43.5, cities)
+        self.store_ids = _strings(2000 + np.arange(n))
+        self.store_sampler = _sampler(_weights(rng, n, 0.8))
+        city = rng.integers(0, cities, (2, n))
+        # Versions interleaved: 2*i is store i as opened, 2*i+1 after it relocated
+        city = city.T.ravel()
+        number = rng.integers(1, 5000, 2 * n)
+        street = STREETS[rng.integers(0, len(STREETS), 2 * n)]
+        city_names = _strings('CITY ', np.arange(cities))
+        self.store_names = _strings('STORE ', self.store_ids, ' / ', city_names[city[::2]])
+        self.store_attributes = {
+            'address': _strings(number, ' ', street),
+            'city': city_names[city],
+            'zipcode': _strings(zipcodes[city]),
+            'store_location': _strings('POINT (', lon[city].round(5), ' ', lat[city].round(5), ')'),
+            'county_number': _strings(counties[city]),
+            'county': _strings('COUNTY ', counties[city]),
+        }
+        self.store_change = self._drift(n)
+
+    def _make_vendors(self, n):
+        numbers = np.sort(self.rng.choice(np.arange(1, 1000), n, replace=False))
+        self.vendor_nos = _strings(numbers)
+        names = _strings('VENDOR ', numbers, ' SPIRITS')
+        self.vendor_names = np.column_stack([names, names + ' INC']).ravel()
+        self.vendor_change = self._drift(n)
+
+    def _make_items(self, n, categories, vendors):
+        rng = self.rng
+        codes = 1011000 + 100 * np.arange(categories)
+        self.category_codes = _strings(codes)
+        self.category_names = _strings('CATEGORY ', codes)
+        self.item_nos = _strings(np.sort(rng.choice(np.arange(10000, 100000), n, replace=False)))
+        self.item_sampler = _sampler(_weights(rng, n, 1.0))
+        self.item_vendor = rng.choice(vendors, n, p=_weights(rng, vendors, 1.2))
+        self.item_desc = _strings('ITEM ', self.item_nos)
+        self.item_pack = PACKS[rng.integers(0, len(PACKS), n)]
+        self.item_volume = BOTTLE_VOLUMES[rng.integers(0, len(BOTTLE_VOLUMES), n)]
+        # Versions interleaved as for stores: the drifted version is recategorized and repriced
+        category = rng.integers(0, categories, (n, 2)).ravel()
+        cost = rng.uniform(2.0, 40.0, n).round(2)
+        cost = np.column_stack([cost, (cost * rng.uniform(1.02, 1.25, n)).round(2)]).ravel()
+        self.item_category = category
+        self.item_cost = cost
+        self.item_retail = (cost * 1.5).round(2)
+        self.item_change = self._drift(n)
+
+    def table(self, first_row, rows, total_rows):
+        """
+        Generate rows first_row..first_row+rows-1 of a total_rows data set.
+
+        Dates advance with the row number, so consecutive chunks (and files) cover
+        consecutive stretches of the date range, as the source extracts do.
+
+        Returns:
+            pa.Table: Columns of SOURCE_COLUMNS; numbers are numeric, not yet strings.
+        """
+        rng = self.rng
+        position = first_row + np.arange(rows)
+        day = (position * self.days // max(total_rows, 1)).astype(np.int64)
+        invoice = position.copy()
+        store = self.store_sampler[rng.integers(0, SAMPLER_RESOLUTION, rows)]
+        item = self.item_sampler[rng.integers(0, SAMPLER_RESOLUTION, rows)]
+        bottles = rng.integers(1, 13, rows) * np.where(rng.random(rows) < 0.1, rng.integers(2, 5, rows), 1)
+
+        # Updates: a row takes the invoice line, store, item and day of an earlier row
+        updates = rng.random(rows) < self.duplicate_rate
+        updates[0] = False
+        updated = np.flatnonzero(updates)
+        source = (rng.random(len(updated)) * updated).astype(np.int64)
+        for column in (invoice, store, item, day):
+            column[updated] = column[source]
+
+        vendor = self.item_vendor[item]
+        store_version = 2 * store + (day >= self.store_change[store])
+        item_version = 2 * item + (day >= self.item_change[item])
+        vendor_version = 2 * vendor + (day >= self.vendor_change[vendor])
+        store_nulls = rng.random(rows) < self.null_rate
+        category_nulls = rng.random(rows) < self.null_rate
+
+        def take(values, index, nulls=None):
+            return pa.array(values).take(pa.array(index, mask=nulls))
+
+        volume = self.item_volume[item]
+        retail = self.item_retail[item_version]
+        liters = (bottles * volume / 1000).round(2)
+        category = self.item_category[item_version]
+        columns = {
+            'invoice_line_no': pc.binary_join_element_wise(
+                'INV-', pc.utf8_lpad(pc.cast(pa.array(invoice + 1), pa.string()), 11, '0'), ''),
+            'date': pa.array(self.start + day.astype('timedelta64[D]')),
+            'store': take(self.store_ids, store),
+            'name': take(self.store_names, store),
+            **{col: take(self.store_attributes[col], store_version, store_nulls) for col in STORE_COLUMNS},
+            'category': take(self.category_codes, category, category_nulls),
+            'category_name': take(self.category_names, category, category_nulls),
+            'vendor_no': take(self.vendor_nos, vendor),
+            'vendor_name': take(self.vendor_names, vendor_version),
+            'itemno': take(self.item_nos, item),
+            'im_desc': take(self.item_desc, item),
+            'pack': pa.array(self.item_pack[item]),
+            'bottle_volume_ml': pa.array(volume),
+            'state_bottle_cost': pa.array(self.item_cost[item_version]),
+            'state_bottle_retail': pa.array(retail),
+            'sale_bottles': pa.array(bottles),
+            'sale_dollars': pa.array((bottles * retail).round(2)),
+            'sale_liters': pa.array(liters),
+            'sale_gallons': pa.array((liters * GALLONS_PER_LITER).round(2)),
+        }
+        return pa.table({col: columns[col] for col in SOURCE_COLUMNS})
+
+    def tables(self, rows, chunk_rows=1_000_000):
+        """Yield the rows of a rows-row data set as Arrow tables of at most chunk_rows rows."""
+        for first_row in range(0, rows, chunk_rows):
+            yield self.table(first_row, min(chunk_rows, rows - first_row), rows)
+
+    def write(self, output_dir, rows, file_format='csv', rows_per_file=100_000):
+        """
+        Write a rows-row data set as chunk_NNNN.csv / .parquet files of rows_per_file rows.
+
+        Parquet files use the Staging_Sales column types (all strings), CSV files the
+        same text as the source extracts.
+
+        Returns:
+            list[str]: Paths of the files written.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        staging = pa.schema([pa.field(col, pa.string()) for col in SOURCE_COLUMNS])
+        paths = []
+        for part, table in enumerate(self.tables(rows, rows_per_file)):
+            path = os.path.join(output_dir, f'chunk_{part:04d}.{file_format}')
+            table = table.cast(staging)
+            if file_format == 'parquet':
+                pq.write_table(table, path)
+            else:
+                pa_csv.write_csv(table, path, pa_csv.WriteOptions(quoting_style='needed'))
+            paths.append(path)
+        return paths
+
+
+def generate(output_dir, rows, file_format='csv', rows_per_file=100_000, seed=0, **options):
+    """Write rows synthetic Staging_Sales rows to output_dir; options go to SalesGenerator."""
+    return SalesGenerator(seed=seed, **options).write(output_dir, rows, file_format, rows_per_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic Iowa liquor sales in the Staging_Sales layout.')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--output', default='input/')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--rows-per-file', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.01)
+    parser.add_argument('--null-rate', type=float, default=0.005)
+    parser.add_argument('--drift-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = generate(args.output, args.rows, args.format, args.rows_per_file, seed=args.seed,
+                     duplicate_rate=args.duplicate_rate, null_rate=args.null_rate,
+                     drift_rate=args.drift_rate)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {args.rows:,} rows to {len(paths)} {args.format} files in {args.output} "
+          f"in {elapsed:.2f} s ({args.rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
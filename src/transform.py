@@ -1,36 +1,96 @@
-from src.config import engine
+import os
+import uuid
 import pandas as pd
-from google.cloud import bigquery
-from src.config import PROJECT_ID, DATASET_ID
-import pandas_gbq
+from src.config import PROJECT_ID, DATASET_ID, DIRECT_BATCH_ROWS, TRANSFORM_MEMORY_BUDGET, TRANSFORM_PAGE_ROWS, SPILL_DIR, PARALLEL_WORKERS
+from src.warehouse import get_warehouse
+from src.watermark import read_watermark, slice_watermark
+from src.dedup import get_dedup_index
+from src.metrics import get_metrics, traced, peak_rss_mb
+from src.parallel import clean_partitioned
 
-def transform():
+# Staging_Sales columns transform actually uses
+TRANSFORM_COLUMNS = [
+    'invoice_line_no', 'date', 'store', 'address', 'city', 'zipcode', 'county_number', 'county',
+    'category', 'category_name', 'vendor_no', 'vendor_name', 'itemno', 'im_desc', 'pack',
+    'bottle_volume_ml', 'state_bottle_cost', 'state_bottle_retail', 'sale_bottles',
+    'sale_dollars', 'sale_liters', 'file_name', 'processed_timestamp'
+]
+# Low-cardinality text columns kept as categoricals
+CATEGORICAL_COLUMNS = ['city', 'county', 'category_name', 'vendor_name']
+# Dimension frame -> natural key; the last version of each key wins
+DIMENSION_KEYS = {'dates': 'date', 'stores': 'store', 'items': 'itemno', 'vendors': 'vendor_no'}
+
+@traced('transform')
+def transform(memory_budget=TRANSFORM_MEMORY_BUDGET):
+    """
+    Transform the Staging_Sales rows added since the last committed watermark.
+
+    Args:
+        memory_budget (int): Bytes of cleaned sales rows to hold in memory; when set, the
+            slice is read and cleaned page by page and the excess is spilled to Parquet.
+    """
     print("Starting transform phase...")
+    get_dedup_index().begin()
     
-    # Get all unprocessed records from staging
+    # Read only the staging rows added since the last committed watermark
+    high_water_mark = read_watermark(project_id=PROJECT_ID, dataset_name=DATASET_ID)
     staging_query = f"""
-        SELECT * FROM `{PROJECT_ID}.{DATASET_ID}.Staging_Sales`
-        WHERE processed_timestamp > COALESCE((SELECT MAX(processed_timestamp) FROM `{PROJECT_ID}.{DATASET_ID}.Sales_Fact`), '1900-01-01')
+        SELECT {', '.join(TRANSFORM_COLUMNS)} FROM `{PROJECT_ID}.{DATASET_ID}.Staging_Sales`
     """
+    if high_water_mark is not None:
+        staging_query += f"WHERE processed_timestamp > DATETIME '{high_water_mark.isoformat(sep=' ')}'"
+    print(f"Reading Staging_Sales after watermark {high_water_mark}")
+    get_metrics().count(warehouse_jobs=1)
     
-    try:
-        # staging_data = pd.read_sql(staging_query, engine)
-        staging_data = pandas_gbq.read_gbq(staging_query, project_id=PROJECT_ID)
-    except:
-        # First run - get all data
-        # staging_data = pd.read_sql("SELECT * FROM Staging_Sales", engine)
-        staging_data = pandas_gbq.read_gbq("SELECT * FROM `{PROJECT_ID}.{DATASET_ID}.Staging_Sales`", project_id=PROJECT_ID)
+    if memory_budget:
+        pages = get_warehouse().read_pages(staging_query, TRANSFORM_PAGE_ROWS)
+        return transform_budgeted(pages, memory_budget)
+    
+    # staging_data = pd.read_sql(staging_query, get_engine())
+    staging_data = get_warehouse().read(staging_query)
 
     if staging_data.empty:
         print("No new data to transform.")
         return None
     
-    # Data cleaning
-    ## Duplicated
-    staging_data = staging_data[staging_data.duplicated(subset=['invoice_line_no', 'store'], keep='first') | ~staging_data.duplicated(subset=['invoice_line_no', 'store'], keep=False)]
+    watermark = slice_watermark(staging_data)
+    transformed = clean_sales(staging_data)
+    if transformed is not None:
+        # Committed by the pipeline once the slice has been loaded
+        transformed['watermark'] = watermark
+    print(f"Peak RSS {peak_rss_mb():.0f} MB")
+    return transformed
+
+
+def clean_sales(staging_data, workers=PARALLEL_WORKERS):
+    """
+    Clean raw staging rows, derive metrics and project the dimension frames for load().
+
+    Args:
+        staging_data (pd.DataFrame): Raw Staging_Sales rows.
+        workers (int): With more than one, rows are cleaned by hash partition in a
+            process pool (see src/parallel.py); the result is the same as with one.
+    """
+    staging_data = staging_data[[col for col in TRANSFORM_COLUMNS if col in staging_data.columns]]
+    rows_in = len(staging_data)
     
+    # Data cleaning
+    if workers > 1 and not staging_data.empty:
+        staging_data = clean_partitioned(staging_data, workers)
+    else:
+        staging_data = clean_rows(staging_data)
+    ## Duplicated: against everything already loaded, and within the slice (first update wins);
+    ## only rows that survived cleaning count as occurrences
+    staging_data = staging_data[get_dedup_index().check(staging_data)]
+    transformed = project_dimensions(staging_data)
+    get_metrics().count(rows_in=rows_in, rows_out=len(staging_data), rows_rejected=rows_in - len(staging_data))
+    print(f"Transformed {len(staging_data)} records for loading.")
+    return transformed
+
+
+def clean_rows(staging_data):
+    """Fill, drop and cast raw rows and derive the sales metrics; rows are independent."""
     ## NUll
-    staging_data.drop(columns=["store_location"], inplace=True)
     # staging_data = staging_data.dropna(subset=['state_bottle_cost', 'state_bottle_retail', 'sale_bottles', 'sale_dollars', 'sale_liters', 'sale_gallons'])
     staging_data.fillna(value={'address': 'Unknown',
                     'city': 'Unknown',
@@ -43,7 +103,7 @@ def transform():
     ## Type Casting
     staging_data['date'] = pd.to_datetime(staging_data['date'], errors='coerce')
     numeric_cols = ['state_bottle_cost', 'state_bottle_retail', 'sale_bottles', 
-                  'sale_dollars', 'sale_liters', 'sale_gallons']
+                  'sale_dollars', 'sale_liters']
     for col in numeric_cols:
         staging_data[col] = pd.to_numeric(staging_data[col], errors='coerce')
     
@@ -56,7 +116,11 @@ def transform():
     staging_data['profit_margin'] = (staging_data['profit'] / staging_data['revenue'] * 100).round(2).where(staging_data['revenue'] > 0, 0)
     staging_data['average_bottle_price'] = (staging_data['sale_dollars'] / staging_data['sale_bottles']).round(2).where(staging_data['sale_bottles'] > 0, 0)
     staging_data['volume_per_bottle_sold'] = (staging_data['sale_liters'] / staging_data['sale_bottles']).round(2).where(staging_data['sale_bottles'] > 0, 0)
-    
+    return staging_data
+
+
+def project_dimensions(staging_data):
+    """Project the dimension frames of cleaned rows; the last version of each key wins."""
     # Prepare dimension data
     # transformed = {
     #     'dates': staging_data[['date']],
@@ -65,27 +129,137 @@ def transform():
     #     'vendors': staging_data[['vendor_no', 'vendor_name']],
     #     'sales': staging_data
     # }
+    # Repeated text columns as categoricals; the dimension projections are deduplicated
+    # straight away instead of copying the whole slice for each of them
+    for col in CATEGORICAL_COLUMNS:
+        staging_data[col] = staging_data[col].astype('category')
     transformed = {
-    'dates': staging_data[['date']].copy(),
-    'stores': staging_data[['store', 'address', 'city', 'zipcode', 'county_number', 'county']].copy(),
-    'items': staging_data[['itemno', 'im_desc', 'category', 'category_name', 'pack', 'bottle_volume_ml', 'state_bottle_cost', 'state_bottle_retail']].copy(),
-    'vendors': staging_data[['vendor_no', 'vendor_name']].copy(),
-    'sales': staging_data.copy()
+    'dates': staging_data[['date']].drop_duplicates(subset=['date'], keep='last'),
+    'stores': staging_data[['store', 'address', 'city', 'zipcode', 'county_number', 'county']].drop_duplicates(subset=['store'], keep='last'),
+    'items': staging_data[['itemno', 'im_desc', 'category', 'category_name', 'pack', 'bottle_volume_ml', 'state_bottle_cost', 'state_bottle_retail']].drop_duplicates(subset=['itemno'], keep='last'),
+    'vendors': staging_data[['vendor_no', 'vendor_name']].drop_duplicates(subset=['vendor_no'], keep='last'),
+    'sales': staging_data
     }
-    
-    # Prepare date dimension attributes
-    transformed['dates']['date'] = pd.to_datetime(transformed['dates']['date'])
-    transformed['dates'].drop_duplicates(subset=['date'], keep='last', inplace=True)
-    transformed['dates']['year'] = transformed['dates']['date'].dt.year
-    transformed['dates']['month'] = transformed['dates']['date'].dt.month
-    transformed['dates']['day'] = transformed['dates']['date'].dt.day
-    transformed['dates']['quarter'] = transformed['dates']['date'].dt.quarter
-    transformed['dates']['weekday'] = transformed['dates']['date'].dt.day_name()
-    
-    transformed['stores'].drop_duplicates(subset=['store'], keep='last', inplace=True)
-    transformed['items'].drop_duplicates(subset=['itemno'], keep='last', inplace=True)
-    transformed['vendors'].drop_duplicates(subset=['vendor_no'], keep='last', inplace=True)
-    
-    
-    print(f"Transformed {len(staging_data)} records for loading.")
-    return transformed
\ No newline at end of file
+    return transformed
+
+
+def transform_stream(chunks, batch_rows=DIRECT_BATCH_ROWS):
+    """
+    Transform a stream of raw chunks in groups of about batch_rows rows.
+
+    Only one group is held in memory at a time. Duplicates on (invoice_line_no, store) are
+    removed against the dedup index, which also covers earlier groups of the run.
+
+    Args:
+        chunks (iterable): (file name, chunk) pairs from extract_stream; a None chunk marks
+            the end of that file.
+        batch_rows (int): Rows to accumulate before transforming.
+
+    Yields:
+        tuple: (transformed data or None, list of files whose rows are all in this or an
+        earlier group).
+    """
+    get_dedup_index().begin()
+    group, rows, completed = [], 0, []
+    for file_name, chunk in chunks:
+        if chunk is None:
+            completed.append(file_name)
+            continue
+        group.append(chunk)
+        rows += len(chunk)
+        if rows >= batch_rows:
+            yield _transform_group(group), completed
+            group, rows, completed = [], 0, []
+    if group or completed:
+        yield (_transform_group(group) if group else None), completed
+
+
+@traced('transform_batch', kind='chunk')
+def _transform_group(group):
+    staging_data = pd.concat(group, ignore_index=True)
+    watermark = slice_watermark(staging_data)
+    transformed = clean_sales(staging_data)
+    if transformed is not None:
+        transformed['watermark'] = watermark
+    return transformed
+
+
+def _merge_dimension(parts, key):
+    merged = pd.concat(parts, ignore_index=True).drop_duplicates(subset=[key], keep='last')
+    for col in CATEGORICAL_COLUMNS:
+        if col in merged.columns:
+            merged[col] = merged[col].astype('category')
+    return merged
+
+
+def transform_budgeted(pages, memory_budget, spill_dir=SPILL_DIR):
+    """
+    Clean a staging slice page by page within a memory budget.
+
+    Dimension projections are deduplicated per page and merged at the end. Cleaned sales
+    rows stay in memory until they exceed memory_budget bytes, then they are spilled to
+    a Parquet file in spill_dir; load() streams the spilled parts back one at a time.
+
+    Args:
+        pages (iterable): Raw Staging_Sales DataFrames.
+        memory_budget (int): Bytes of cleaned sales rows to keep in memory.
+        spill_dir (str): Directory for spilled Parquet parts.
+
+    Returns:
+        dict: Transformed data as from clean_sales, plus 'sales_spill' (Parquet paths) and
+        'watermark'; None if the slice is empty.
+    """
+    dimensions = {name: [] for name in DIMENSION_KEYS}
+    sales, sales_bytes, spilled = [], 0, []
+    high_water_mark, files, rows = None, set(), 0
+    run_dir = os.path.join(spill_dir, uuid.uuid4().hex)
+    metrics = get_metrics()
+    for page in pages:
+        if page.empty:
+            continue
+        with metrics.span('transform_page', kind='chunk') as span:
+            rows += len(page)
+            watermark = slice_watermark(page)
+            high_water_mark = max(filter(pd.notna, [high_water_mark, watermark['high_water_mark']]), default=None)
+            files.update(watermark['files'])
+            cleaned = clean_sales(page)
+            del page
+            for name in DIMENSION_KEYS:
+                dimensions[name].append(cleaned[name])
+            sales.append(cleaned['sales'])
+            sales_bytes += cleaned['sales'].memory_usage(deep=True).sum()
+            if sales_bytes > memory_budget:
+                os.makedirs(run_dir, exist_ok=True)
+                path = os.path.join(run_dir, f'sales-{len(spilled):05d}.parquet')
+                pd.concat(sales, ignore_index=True).to_parquet(path, index=False)
+                spilled.append(path)
+                span.add(bytes_written=os.path.getsize(path))
+                sales, sales_bytes = [], 0
+    if not rows:
+        print("No new data to transform.")
+        return None
+
+    transformed = {name: _merge_dimension(parts, DIMENSION_KEYS[name]) for name, parts in dimensions.items()}
+    transformed['sales'] = pd.concat(sales, ignore_index=True) if sales else pd.DataFrame()
+    transformed['sales_spill'] = spilled
+    transformed['watermark'] = {'high_water_mark': high_water_mark, 'files': sorted(files)}
+    print(f"Transformed {rows} staging rows in pages ({len(spilled)} parts spilled); "
+          f"peak RSS {peak_rss_mb():.0f} MB")
+    return transformed
+
+
+def iter_sales(transformed):
+    """
+    Yield the sales rows of a transform result part by part, removing spilled files once read.
+
+    First occurrences superseded by an update in a later page are left out.
+    """
+    dedup = get_dedup_index()
+    spilled = transformed.get('sales_spill', [])
+    for path in spilled:
+        yield dedup.drop_superseded(pd.read_parquet(path))
+        os.remove(path)
+    if spilled:
+        os.rmdir(os.path.dirname(spilled[0]))
+    if not transformed['sales'].empty:
+        yield dedup.drop_superseded(transformed['sales'])
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from src.encoding import numeric_limit
+
+# Reject reason codes, reported as "<column>:<reason>"
+NULL = 'null'
+NOT_INTEGER = 'not_integer'
+NOT_NUMERIC = 'not_numeric'
+OUT_OF_RANGE = 'out_of_range'
+NUMERIC_OVERFLOW = 'numeric_overflow'
+INVALID_DATE = 'invalid_date'
+
+INT64_MAX = 2 ** 63 - 1
+
+
+class ColumnRule:
+    """
+    Validation rule for one column, declared with its BigQuery type from sql/warehouse.sql.
+
+    Args:
+        sql_type (str): 'INT64', 'STRING', 'DATE' or 'NUMERIC'.
+        nullable (bool): Whether nulls are allowed (False for NOT NULL columns).
+        precision (int): NUMERIC precision.
+        scale (int): NUMERIC scale.
+        integer (bool): For STRING codes that must hold an integer (e.g. itemno).
+        min_value (float): Inclusive lower bound for INT64/NUMERIC values.
+        max_value (float): Inclusive upper bound for INT64/NUMERIC values.
+        clamp (bool): NUMERIC values outside the precision are clamped on load, not rejected.
+    """
+
+    def __init__(self, sql_type, nullable=True, precision=None, scale=None, integer=False,
+                 min_value=None, max_value=None, clamp=False):
+        self.sql_type = sql_type
+        self.nullable = nullable
+        self.precision = precision
+        self.scale = scale
+        self.integer = integer or sql_type == 'INT64'
+        self.min_value = min_value
+        self.max_value = max_value
+        self.clamp = clamp
+
+    def reasons(self):
+        """Reason codes this rule can produce, in the order they are checked."""
+        codes = [NULL]
+        if self.sql_type == 'DATE':
+            codes.append(INVALID_DATE)
+        if self.integer:
+            codes.append(NOT_INTEGER)
+        if self.sql_type == 'NUMERIC':
+            codes += [NOT_NUMERIC, NUMERIC_OVERFLOW]
+        codes.append(OUT_OF_RANGE)
+        return codes
+
+    def check(self, series):
+        """Return {reason: boolean failure mask} for the column, computed on the whole column."""
+        present = series.notna().to_numpy()
+        failures = {NULL: np.zeros(len(series), dtype=bool) if self.nullable else ~present}
+
+        if self.sql_type == 'DATE':
+            parsed = pd.to_datetime(series, errors='coerce')
+            failures[INVALID_DATE] = present & parsed.isna().to_numpy()
+            return failures
+
+        if not (self.integer or self.sql_type == 'NUMERIC'):
+            return failures
+
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        parsed = ~np.isnan(values)
+        with np.errstate(invalid='ignore'):
+            if self.integer:
+                failures[NOT_INTEGER] = present & ~(parsed & (np.floor(values) == values))
+            if self.sql_type == 'NUMERIC':
+                failures[NOT_NUMERIC] = present & ~parsed
+                if not self.clamp:
+                    limit = numeric_limit(self.precision, self.scale)
+                    failures[NUMERIC_OVERFLOW] = parsed & (np.abs(np.round(values, self.scale)) > limit)
+
+            out_of_range = np.zeros(len(series), dtype=bool)
+            if self.sql_type == 'INT64':
+                out_of_range |= parsed & (np.abs(values) > INT64_MAX)
+            if self.min_value is not None:
+                out_of_range |= parsed & (values < self.min_value)
+            if self.max_value is not None:
+                out_of_range |= parsed & (values > self.max_value)
+        failures[OUT_OF_RANGE] = out_of_range
+        return failures
+
+
+# Columns of the sales frame handed to load(), typed as their Sales_Fact / dimension
+# natural-key counterparts in sql/warehouse.sql
+SALES_FACT_RULES = {
+    'invoice_line_no': ColumnRule('STRING', nullable=False),
+    'store': ColumnRule('INT64', nullable=False),
+    'date': ColumnRule('DATE', nullable=False),
+    'itemno': ColumnRule('STRING', nullable=False, integer=True),
+    'vendor_no': ColumnRule('STRING', nullable=False, integer=True),
+    'revenue': ColumnRule('NUMERIC', precision=10, scale=2),
+    'profit': ColumnRule('NUMERIC', precision=10, scale=2),
+    'cost': ColumnRule('NUMERIC', precision=10, scale=2),
+    'total_bottles_sold': ColumnRule('INT64'),
+    'total_volume_sold_in_liters': ColumnRule('NUMERIC', precision=10, scale=2),
+    'profit_margin': ColumnRule('NUMERIC', precision=5, scale=2, clamp=True),
+    'average_bottle_price': ColumnRule('NUMERIC', precision=10, scale=2),
+    'volume_per_bottle_sold': ColumnRule('NUMERIC', precision=10, scale=2),
+}
+
+
+def validate(df, rules=SALES_FACT_RULES):
+    """
+    Validate whole columns of df against rules.
+
+    Args:
+        df (pd.DataFrame): Data to validate. Rules for missing columns are skipped.
+        rules (dict): Column name -> ColumnRule.
+
+    Returns:
+        pd.Series: Categorical reject reason per row ("<column>:<reason>"), NaN for valid rows.
+    """
+    categories = []
+    codes = np.full(len(df), -1, dtype=np.int16)
+    for col, rule in rules.items():
+        if col not in df.columns:
+            continue
+        failures = rule.check(df[col])
+        for reason in rule.reasons():
+            mask = failures.get(reason)
+            categories.append(f"{col}:{reason}")
+            if mask is None or not mask.any():
+                continue
+            # Keep the first failing rule as the row's reason
+            codes[(codes == -1) & mask] = len(categories) - 1
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories),
+                     index=df.index, name='reject_reason')
+
+
+def split_valid(df, rules=SALES_FACT_RULES):
+    """
+    Split df into rows that pass rules and quarantined rows.
+
+    Returns:
+        tuple: (valid rows, rejected rows with a 'reject_reason' column).
+    """
+    reasons = validate(df, rules)
+    rejected = reasons.notna().to_numpy()
+    if not rejected.any():
+        return df, df.iloc[0:0].assign(reject_reason=pd.Series(dtype='object'))
+    return df[~rejected].copy(), df[rejected].assign(reject_reason=reasons[rejected].astype(str))
@@ -0,0 +1,428 @@
+import io
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from src.clients import get_bigquery_client, read_gbq
+from src.config import PROJECT_ID, DATASET_ID, DB_URL, WAREHOUSE_BACKEND, EMBEDDED_WAREHOUSE_PATH
+from src.metrics import get_metrics
+from src.schema import table_columns
+
+_NUMERIC = re.compile(r"NUMERIC\(\s*(\d+)\s*,\s*(\d+)\s*\)", re.IGNORECASE)
+_TABLE_REF = re.compile(r"`(?:[\w\-]+\.)*(\w+)`")
+_TYPED_LITERAL = re.compile(r"\b(DATE|DATETIME|TIMESTAMP)\s+'([^']*)'", re.IGNORECASE)
+# Declared type -> column type of the embedded engines
+_DUCKDB_TYPES = {'INT64': 'BIGINT', 'INTEGER': 'BIGINT', 'STRING': 'VARCHAR', 'TEXT': 'VARCHAR',
+                 'FLOAT64': 'DOUBLE', 'BOOL': 'BOOLEAN', 'DATE': 'DATE', 'DATETIME': 'TIMESTAMP',
+                 'TIMESTAMP': 'TIMESTAMPTZ'}
+_SQLITE_TYPES = {'INT64': 'INTEGER', 'INTEGER': 'INTEGER', 'FLOAT64': 'REAL', 'BOOL': 'INTEGER', 'NUMERIC': 'REAL'}
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def _bigquery_field(column, sql_type, not_null):
+    from google.cloud import bigquery
+    mode = 'REQUIRED' if not_null else 'NULLABLE'
+    numeric = _NUMERIC.match(sql_type)
+    if numeric:
+        return bigquery.SchemaField(column, 'NUMERIC', mode=mode, precision=int(numeric.group(1)),
+                                    scale=int(numeric.group(2)))
+    field_type = {'TEXT': 'STRING', 'INTEGER': 'INT64'}.get(sql_type.upper(), sql_type.upper())
+    return bigquery.SchemaField(column, field_type, mode=mode)
+
+
+def _row_hash_sql(alias, attributes):
+    """SQL expression fingerprinting a version's attributes (NULL-safe, type-aware)."""
+    return f"FARM_FINGERPRINT(TO_JSON_STRING(STRUCT({', '.join(f'{alias}.{attr}' for attr in attributes)})))"
+
+
+class BigQueryWarehouse:
+    """The BigQuery dataset: pandas_gbq reads, Parquet load jobs and MERGE statements."""
+
+    def __init__(self, project_id=PROJECT_ID, dataset_name=DATASET_ID):
+        self.project_id = project_id
+        self.dataset_name = dataset_name
+
+    @property
+    def client(self):
+        return get_bigquery_client(self.project_id)
+
+    def table_id(self, table):
+        return f"{self.project_id}.{self.dataset_name}.{table}"
+
+    def read(self, query):
+        """Run a query and return its rows as a DataFrame."""
+        return read_gbq(query, project_id=self.project_id)
+
+    def read_pages(self, query, page_rows):
+        """Run a query and yield its rows as DataFrames of at most page_rows rows."""
+        return self.client.query(query).result(page_size=page_rows).to_dataframe_iterable()
+
+    def load(self, table, parquet_bytes, replace=False):
+        """Append (or replace) a table's rows from Parquet bytes as one load job; the BulkWriter backend entry point."""
+        from google.cloud import bigquery
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=(bigquery.WriteDisposition.WRITE_TRUNCATE if replace
+                               else bigquery.WriteDisposition.WRITE_APPEND),
+        )
+        self.client.load_table_from_file(
+            io.BytesIO(parquet_bytes), self.table_id(table), job_config=job_config, rewind=True
+        ).result()
+
+    def insert(self, table, arrow_table, replace=False):
+        """Bulk insert an Arrow table."""
+        sink = io.BytesIO()
+        pq.write_table(arrow_table, sink)
+        self.load(table, sink.getvalue(), replace=replace)
+
+    def create_table(self, table):
+        """Create a table declared in sql/ in the dataset, unless it exists."""
+        from google.cloud import bigquery
+        schema = [_bigquery_field(*column) for column in table_columns()[table]]
+        self.client.create_table(bigquery.Table(self.table_id(table), schema=schema), exists_ok=True)
+
+    def create_schema(self):
+        """Create every table declared in sql/ that does not exist yet."""
+        for table in table_columns():
+            self.create_table(table)
+
+    def execute(self, statement):
+        """Run a DML statement and return the number of rows it affected."""
+        job = self.client.query(statement)
+        job.result()
+        return job.num_dml_affected_rows or 0
+
+    def add_column(self, table, column):
+        """Add a column declared in sql/ to a table created before it was declared."""
+        field = _bigquery_field(*next(c for c in table_columns()[table] if c[0] == column))
+        self.client.query(f"ALTER TABLE `{self.table_id(table)}` ADD COLUMN IF NOT EXISTS "
+                          f"{field.name} {field.field_type}").result()
+
+    def merge_scd(self, dim_table, batch, key_col, attributes, surrogate_col):
+        """
+        Apply a batch of dimension versions as SCD Type 2 changes with one MERGE.
+
+        The batch is loaded into a staging table scoped to this run (expiring after an
+        hour), and its row_hash fingerprints are compared with the active versions of the
+        batch's keys only. Active versions written before row_hash existed are hashed on
+        the fly. Inserted versions are numbered on from the dimension's highest surrogate key.
+
+        Args:
+            batch (pa.Table): One version per key, typed like dim_table.
+            surrogate_col (str): Surrogate key column, e.g. 'store_key'.
+
+        Returns:
+            dict: Number of 'inserted' and 'expired' versions.
+        """
+        client = self.client
+        target = f"`{self.table_id(dim_table)}`"
+        stage_id = self.table_id(f"_scd_{dim_table}_{uuid.uuid4().hex[:12]}")
+        columns = ', '.join([key_col] + attributes)
+        changed = f"COALESCE(T.row_hash, {_row_hash_sql('T', attributes)}) != S.row_hash"
+        # The changed keys appear twice in the source: once keyed, to expire the active
+        # version, and once with a NULL merge key, which never matches and so is inserted.
+        # Keyed rows without an active version are inserted too; only the inserted rows
+        # are numbered
+        merge_query = f"""
+        MERGE {target} T
+        USING (
+            WITH batch AS (
+                SELECT {columns}, {_row_hash_sql('B', attributes)} AS row_hash
+                FROM `{stage_id}` B
+            ),
+            source AS (
+                SELECT S.{key_col} AS merge_key, S.*, T.{key_col} IS NULL AS inserted
+                FROM batch S
+                LEFT JOIN {target} T ON T.{key_col} = S.{key_col} AND T.is_active = TRUE
+                UNION ALL
+                SELECT NULL AS merge_key, S.*, TRUE AS inserted FROM batch S
+                JOIN {target} T ON T.{key_col} = S.{key_col} AND T.is_active = TRUE
+                WHERE {changed}
+            )
+            SELECT *, CASE WHEN inserted THEN
+                (SELECT COALESCE(MAX({surrogate_col}), 0) FROM {target})
+                + ROW_NUMBER() OVER (PARTITION BY inserted ORDER BY {key_col}) END AS surrogate_key
+            FROM source
+        ) S
+        ON T.{key_col} = S.merge_key AND T.is_active = TRUE
+        WHEN MATCHED AND {changed} THEN
+            UPDATE SET end_date = CURRENT_DATE(), is_active = FALSE
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT ({surrogate_col}, {columns}, row_hash, start_date, end_date, is_active)
+            VALUES (S.surrogate_key, {', '.join('S.' + col for col in [key_col] + attributes)}, S.row_hash,
+                    CURRENT_DATE(), NULL, TRUE)
+        """
+        metrics = get_metrics()
+        try:
+            # Dimensions created before row_hash existed gain the column on first use
+            client.query(f"ALTER TABLE {target} ADD COLUMN IF NOT EXISTS row_hash INT64").result()
+            metrics.count(warehouse_jobs=1)
+            self.insert(stage_id.split('.')[-1], batch, replace=True)
+            metrics.count(warehouse_jobs=1)
+            # Table metadata calls (expiry, cleanup) are not jobs
+            table = client.get_table(stage_id)
+            table.expires = datetime.now(timezone.utc) + timedelta(hours=1)
+            client.update_table(table, ['expires'])
+            job = client.query(merge_query)
+            metrics.count(warehouse_jobs=1)
+            job.result()
+            dml_stats = job.dml_stats
+            return {'inserted': dml_stats.inserted_row_count if dml_stats else 0,
+                    'expired': dml_stats.updated_row_count if dml_stats else 0}
+        finally:
+            client.delete_table(stage_id, not_found_ok=True)
+
+
+def _sqlite_frame(df):
+    """Convert Arrow-derived values SQLite cannot bind (decimals, dates, timestamps)."""
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            df[col] = series.dt.tz_convert(None).dt.strftime(TIMESTAMP_FORMAT)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            df[col] = series.dt.strftime(TIMESTAMP_FORMAT)
+        elif series.dtype == object:
+            sample = series.dropna()
+            if not sample.empty and not isinstance(sample.iloc[0], str):
+                first = sample.iloc[0]
+                if hasattr(first, 'as_tuple'):  # decimal.Decimal
+                    df[col] = series.map(lambda v: None if v is None else float(v))
+                elif hasattr(first, 'isoformat'):  # datetime.date
+                    df[col] = series.map(lambda v: None if v is None else v.isoformat())
+    return df
+
+
+def _sqlite_literal(match):
+    kind, value = match.group(1).upper(), match.group(2)
+    if kind == 'DATE':
+        return f"'{value}'"
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return f"'{timestamp.strftime(TIMESTAMP_FORMAT)}'"
+
+
+class EmbeddedWarehouse:
+    """
+    Local database file holding the warehouse tables, for backfills and reprocessing on one machine.
+
+    The engine is DuckDB (columnar; Arrow tables are inserted without a copy) when it is
+    installed, and SQLite otherwise. Every table declared in sql/ is created when the
+    file is opened, and the pipeline's BigQuery queries run with their project/dataset
+    qualifiers dropped. Writes are serialized; DuckDB reads run concurrently with them.
+    """
+
+    def __init__(self, path=EMBEDDED_WAREHOUSE_PATH, engine='duckdb'):
+        if engine == 'duckdb':
+            try:
+                import duckdb
+            except ImportError:
+                print("duckdb is not installed; using SQLite for the embedded warehouse")
+                engine = 'sqlite'
+        if engine == 'sqlite' and path.endswith('.duckdb'):
+            path = DB_URL.replace('sqlite:///', '')
+        self.engine = engine
+        self.path = path
+        self.lock = threading.RLock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if engine == 'duckdb':
+            self._errors = (duckdb.CatalogException,)
+            self.conn = duckdb.connect(path)
+            # TIMESTAMP columns hold UTC instants, as in BigQuery
+            self.conn.execute("SET TimeZone = 'UTC'")
+        else:
+            self._errors = (sqlite3.OperationalError, pd.errors.DatabaseError)
+            # Writes open a transaction that insert() and merge_scd() commit once per call
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._tables = re.compile(r"\b(?:[\w\-]+\.)+(?=(?:" + '|'.join(table_columns()) + r")\b)")
+        self.create_schema()
+
+    def translate(self, sql):
+        """Drop project/dataset qualifiers (and, for SQLite, rewrite typed literals)."""
+        sql = self._tables.sub('', _TABLE_REF.sub(lambda m: m.group(1), sql))
+        if self.engine == 'sqlite':
+            sql = _TYPED_LITERAL.sub(_sqlite_literal, sql)
+            sql = re.sub(r"CURRENT_DATE\(\)", "DATE('now')", sql)
+        return sql
+
+    def _column_type(self, sql_type):
+        if self.engine == 'duckdb':
+            numeric = _NUMERIC.match(sql_type)
+            if numeric:
+                return f"DECIMAL({numeric.group(1)}, {numeric.group(2)})"
+            return _DUCKDB_TYPES[sql_type.upper()]
+        return _SQLITE_TYPES.get(sql_type.split('(')[0].upper(), 'TEXT')
+
+    def _cursor(self):
+        # DuckDB cursors are separate connections to the same database, one per caller
+        return self.conn.cursor() if self.engine == 'duckdb' else self.conn
+
+    def _not_found(self, error):
+        if 'does not exist' in str(error) or 'no such table' in str(error):
+            return NotFound(str(error))
+        return error
+
+    def read(self, query):
+        """Run a query and return its rows as a DataFrame."""
+        sql = self.translate(query)
+        try:
+            if self.engine == 'duckdb':
+                return self._cursor().execute(sql).df()
+            with self.lock:
+                return pd.read_sql_query(sql, self.conn)
+        except self._errors as e:
+            raise self._not_found(e) from e
+
+    def read_pages(self, query, page_rows):
+        """Run a query and yield its rows as DataFrames of at most page_rows rows."""
+        sql = self.translate(query)
+        if self.engine == 'duckdb':
+            for batch in self._cursor().execute(sql).fetch_record_batch(page_rows):
+                yield batch.to_pandas()
+            return
+        # A connection of its own, so writes can go on between pages
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from pd.read_sql_query(sql, conn, chunksize=page_rows)
+        finally:
+            conn.close()
+
+    def load(self, table, parquet_bytes, replace=False):
+        """Append (or replace) a table's rows from Parquet bytes; the BulkWriter backend entry point."""
+        self.insert(table, pq.read_table(io.BytesIO(parquet_bytes)), replace=replace)
+
+    def insert(self, table, arrow_table, replace=False):
+        """Bulk insert an Arrow table, matching columns by name."""
+        with self.lock:
+            cursor = self._cursor()
+            if replace:
+                cursor.execute(f"DELETE FROM {table}")
+            if self.engine == 'duckdb':
+                cursor.register('_insert', arrow_table)
+                try:
+                    cursor.execute(f"INSERT INTO {table} BY NAME SELECT * FROM _insert")
+                finally:
+                    cursor.unregister('_insert')
+            else:
+                try:
+                    _sqlite_frame(arrow_table.to_pandas()).to_sql(table, self.conn, if_exists='append', index=False)
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+
+    def create_table(self, table):
+        """Create a table declared in sql/, unless it exists."""
+        definition = ', '.join(f"{column} {self._column_type(sql_type)}"
+                               for column, sql_type, _ in table_columns()[table])
+        with self.lock:
+            self._cursor().execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+
+    def create_schema(self):
+        """Create every table declared in sql/ that does not exist yet."""
+        for table in table_columns():
+            self.create_table(table)
+
+    def execute(self, statement):
+        """Run a DML statement and return the number of rows it affected."""
+        with self.lock:
+            rows = self._row_count(self._cursor().execute(self.translate(statement)))
+            if self.engine == 'sqlite':
+                self.conn.commit()
+        return rows
+
+    def add_column(self, table, column):
+        """Add a column declared in sql/ to a table created before it was declared."""
+        sql_type = next(c[1] for c in table_columns()[table] if c[0] == column)
+        with self.lock:
+            cursor = self._cursor()
+            if self.engine == 'duckdb':
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {self._column_type(sql_type)}")
+            elif column not in [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {self._column_type(sql_type)}")
+
+    def merge_scd(self, dim_table, batch, key_col, attributes, surrogate_col):
+        """
+        Apply a batch of dimension versions as SCD Type 2 changes in one transaction.
+
+        Active versions whose attributes differ from the batch are expired first; every
+        batch key left without an active version (changed or new) is then inserted, numbered
+        on from the dimension's highest surrogate key. Attributes are compared directly, so
+        row_hash is left empty.
+
+        Args:
+            batch (pa.Table): One version per key, typed like dim_table.
+            surrogate_col (str): Surrogate key column, e.g. 'store_key'.
+
+        Returns:
+            dict: Number of 'inserted' and 'expired' versions.
+        """
+        distinct = 'IS DISTINCT FROM' if self.engine == 'duckdb' else 'IS NOT'
+        changed = ' OR '.join(f"T.{attr} {distinct} S.{attr}" for attr in attributes)
+        columns = [key_col] + attributes
+        # CURRENT_DATE() in BigQuery is a UTC date
+        today = datetime.now(timezone.utc).date().isoformat()
+        with self.lock:
+            cursor = self._cursor()
+            stage = f"_scd_{dim_table}"
+            if self.engine == 'duckdb':
+                cursor.register(stage, batch)
+            else:
+                _sqlite_frame(batch.to_pandas()).to_sql(stage, self.conn, if_exists='replace', index=False)
+            cursor.execute("BEGIN TRANSACTION")
+            try:
+                expired = self._row_count(cursor.execute(
+                    f"UPDATE {dim_table} AS T SET end_date = ?, is_active = FALSE FROM {stage} AS S "
+                    f"WHERE T.{key_col} = S.{key_col} AND T.is_active AND ({changed})", [today]))
+                inserted = self._row_count(cursor.execute(
+                    f"INSERT INTO {dim_table} ({surrogate_col}, {', '.join(columns)}, start_date, end_date, is_active) "
+                    f"SELECT (SELECT COALESCE(MAX({surrogate_col}), 0) FROM {dim_table}) "
+                    f"+ ROW_NUMBER() OVER (ORDER BY S.{key_col}), {', '.join('S.' + col for col in columns)}, "
+                    f"?, NULL, TRUE FROM {stage} AS S "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {dim_table} T WHERE T.{key_col} = S.{key_col} AND T.is_active)",
+                    [today]))
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                if self.engine == 'duckdb':
+                    cursor.unregister(stage)
+                else:
+                    self.conn.execute(f"DROP TABLE IF EXISTS {stage}")
+        return {'inserted': inserted, 'expired': expired}
+
+    def _row_count(self, cursor):
+        if self.engine == 'duckdb':
+            return cursor.fetchone()[0]
+        return max(cursor.rowcount, 0)
+
+
+_warehouses = {}
+_lock = threading.Lock()
+
+
+def get_warehouse(project_id=PROJECT_ID, dataset_name=DATASET_ID, backend=WAREHOUSE_BACKEND):
+    """
+    Process-wide warehouse for WAREHOUSE_BACKEND: 'bigquery' (one per project and dataset)
+    or 'embedded' (one local database, whatever the project and dataset).
+    """
+    key = (project_id, dataset_name) if backend == 'bigquery' else backend
+    with _lock:
+        if key not in _warehouses:
+            _warehouses[key] = BigQueryWarehouse(project_id, dataset_name) if backend == 'bigquery' \
+                else EmbeddedWarehouse()
+        return _warehouses[key]
+
+
+if __name__ == '__main__':
+    warehouse = get_warehouse()
+    warehouse.create_schema()
+    print(f"Created the tables declared in sql/ in the {WAREHOUSE_BACKEND} warehouse")
@@ -0,0 +1,58 @@
+import uuid
+from datetime import datetime, timezone
+import pandas as pd
+from google.api_core.exceptions import GoogleAPIError
+from src.config import PROJECT_ID, DATASET_ID
+from src.warehouse import get_warehouse
+from src.writer import get_writer
+
+
+def read_watermark(project_id=PROJECT_ID, dataset_name=DATASET_ID):
+    """
+    Return the last Staging_Sales processed_timestamp consumed by a committed transform run.
+
+    Falls back to MAX(processed_timestamp) of Sales_Fact once, for datasets loaded before
+    the watermark table existed.
+
+    Returns:
+        pd.Timestamp: High-water mark, or None if nothing has been transformed yet.
+    """
+    try:
+        query = f"SELECT MAX(high_water_mark) AS high_water_mark FROM `{project_id}.{dataset_name}.Transform_Watermark`"
+        high_water_mark = get_warehouse(project_id, dataset_name).read(query)['high_water_mark'].iloc[0]
+    except GoogleAPIError as e:
+        if "404" not in str(e):
+            raise
+        print("Transform_Watermark table not found. Creating it...")
+        get_warehouse(project_id, dataset_name).create_table('Transform_Watermark')
+        high_water_mark = None
+
+    if pd.isna(high_water_mark):
+        query = f"SELECT MAX(processed_timestamp) AS high_water_mark FROM `{project_id}.{dataset_name}.Sales_Fact`"
+        high_water_mark = get_warehouse(project_id, dataset_name).read(query)['high_water_mark'].iloc[0]
+    return None if pd.isna(high_water_mark) else pd.Timestamp(high_water_mark)
+
+
+def slice_watermark(staging_data):
+    """Watermark for a staging slice: its max processed_timestamp and the files it contains."""
+    return {
+        'high_water_mark': pd.to_datetime(staging_data['processed_timestamp']).max(),
+        'files': sorted(staging_data['file_name'].dropna().unique()),
+    }
+
+
+def commit_watermark(watermark, run_id=None):
+    """Record a transformed and loaded slice, one row per consumed file."""
+    if not watermark or pd.isna(watermark['high_water_mark']):
+        return
+    run_id = run_id or uuid.uuid4().hex
+    files = watermark['files'] or [None]
+    writer = get_writer()
+    writer.write('Transform_Watermark', pd.DataFrame({
+        'run_id': run_id,
+        'file_name': files,
+        'high_water_mark': watermark['high_water_mark'],
+        'committed_at': datetime.now(timezone.utc),
+    }))
+    writer.flush('Transform_Watermark')
+    print(f"Committed transform watermark {watermark['high_water_mark']} for {len(watermark['files'])} files")
@@ -0,0 +1,163 @@
+import io
+import os
+import time
+import threading
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.schema import arrow_schema
+from src.metrics import get_metrics
+from src import aio
+from src.warehouse import get_warehouse
+from src.config import (WRITER_BACKEND, LOCAL_WAREHOUSE_DIR,
+                        WRITER_MAX_ROWS, WRITER_MAX_BYTES, WRITER_MAX_LATENCY, WRITER_MAX_IN_FLIGHT)
+
+
+def to_arrow(df, table):
+    """
+    Convert a DataFrame to an Arrow table with the schema declared for `table` in sql/.
+
+    Columns missing from df (e.g. surrogate keys assigned by the warehouse) are written as
+    nulls; extra columns are dropped.
+    """
+    schema = arrow_schema(table)
+    arrays = []
+    for field in schema:
+        if field.name not in df.columns:
+            if not field.nullable:
+                raise ValueError(f"Missing NOT NULL column {field.name} for {table}")
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+        array = pa.array(df[field.name], from_pandas=True)
+        if pa.types.is_dictionary(array.type):
+            array = array.dictionary_decode()
+        if array.type != field.type:
+            array = array.cast(field.type, safe=not pa.types.is_timestamp(field.type))
+        if not field.nullable and array.null_count:
+            raise ValueError(f"{array.null_count} null values in NOT NULL column {table}.{field.name}")
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class LocalBackend:
+    """File-based stand-in for the warehouse: each load job becomes one Parquet file."""
+
+    def __init__(self, root_dir=LOCAL_WAREHOUSE_DIR):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+
+    def load(self, table, parquet_bytes):
+        table_dir = os.path.join(self.root_dir, table)
+        # Loads into the same table may run concurrently; each needs its own part number
+        with self._lock:
+            os.makedirs(table_dir, exist_ok=True)
+            part = len([f for f in os.listdir(table_dir) if f.endswith('.parquet')])
+            with open(os.path.join(table_dir, f'part-{part:05d}.parquet'), 'wb') as f:
+                f.write(parquet_bytes)
+
+    def read(self, table):
+        """Read everything loaded into `table` back as a DataFrame."""
+        table_dir = os.path.join(self.root_dir, table)
+        if not os.path.isdir(table_dir):
+            return arrow_schema(table).empty_table().to_pandas()
+        return pq.read_table(table_dir).to_pandas()
+
+
+class BulkWriter:
+    """
+    Buffer frames per destination table and write them as few large load jobs.
+
+    Frames are converted to Arrow with the table's declared schema when they are written.
+    A table's buffer is flushed (serialized once to Parquet and submitted as one job) when
+    it holds max_rows rows or max_bytes bytes, when its oldest frame is older than
+    max_latency seconds at the next write, or on flush()/close().
+
+    Jobs submitted because a buffer filled up run on the async I/O layer while the caller
+    prepares the next rows; at most max_in_flight per table are outstanding. flush()
+    waits for every job of the table, so callers can rely on its rows being loaded.
+    """
+
+    def __init__(self, backend, max_rows=WRITER_MAX_ROWS, max_bytes=WRITER_MAX_BYTES,
+                 max_latency=WRITER_MAX_LATENCY, max_in_flight=WRITER_MAX_IN_FLIGHT):
+        self.backend = backend
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.max_in_flight = max_in_flight
+        self.buffers = {}
+        self.in_flight = {}
+        self.stats = {'jobs': 0, 'rows': 0, 'bytes': 0}
+        self._lock = threading.RLock()
+
+    def _buffer(self, table):
+        return self.buffers.setdefault(table, {'tables': [], 'rows': 0, 'bytes': 0, 'since': time.monotonic()})
+
+    def write(self, table, df):
+        """Buffer df for `table`, submitting a load job if the size or latency limit is reached."""
+        if df is None or len(df) == 0:
+            return
+        arrow_table = to_arrow(df, table)
+        with self._lock:
+            buffer = self._buffer(table)
+            buffer['tables'].append(arrow_table)
+            buffer['rows'] += arrow_table.num_rows
+            buffer['bytes'] += arrow_table.nbytes
+            if (buffer['rows'] >= self.max_rows or buffer['bytes'] >= self.max_bytes
+                    or time.monotonic() - buffer['since'] >= self.max_latency):
+                self._flush_table(table, wait=False)
+
+    def _flush_table(self, table, wait=True):
+        buffer = self.buffers.pop(table, None)
+        uploads = self.in_flight.setdefault(table, [])
+        if buffer and buffer['tables']:
+            sink = io.BytesIO()
+            pq.write_table(pa.concat_tables(buffer['tables']), sink)
+            parquet_bytes = sink.getvalue()
+            # Appends are not idempotent: a load job whose outcome is unknown is not resubmitted
+            future = aio.submit(self.backend.load, table, parquet_bytes, kind='load', idempotent=False)
+            uploads.append((future, buffer, len(parquet_bytes)))
+        while uploads and (wait or len(uploads) > self.max_in_flight):
+            self._finish(table, uploads.pop(0))
+
+    def _finish(self, table, upload):
+        future, buffer, parquet_size = upload
+        try:
+            future.result()
+        except Exception:
+            # Put the rows back in front of the buffer, so a later flush can retry them
+            pending = self._buffer(table)
+            pending['tables'][:0] = buffer['tables']
+            pending['rows'] += buffer['rows']
+            pending['bytes'] += buffer['bytes']
+            raise
+        self.stats['jobs'] += 1
+        self.stats['rows'] += buffer['rows']
+        self.stats['bytes'] += parquet_size
+        get_metrics().count(warehouse_jobs=1, bytes_written=parquet_size)
+        print(f"Loaded {buffer['rows']} rows into {table} in one load job")
+
+    def flush(self, table=None):
+        """Load one table's buffer, or every buffer when table is None, and wait for its jobs."""
+        with self._lock:
+            for name in [table] if table else list(set(self.buffers) | set(self.in_flight)):
+                self._flush_table(name)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_writer = None
+
+
+def get_writer():
+    """Process-wide BulkWriter for the backend configured in WRITER_BACKEND."""
+    global _writer
+    if _writer is None:
+        backend = LocalBackend() if WRITER_BACKEND == 'local' else get_warehouse()
+        _writer = BulkWriter(backend)
+    return _writer
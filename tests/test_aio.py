@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+from google.auth import exceptions as auth_exceptions
+from requests import exceptions as requests_exceptions
+
+from src import aio
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(aio, 'IO_BACKOFF', 0)
+
+
+def flaky(error, failures):
+    """A function raising `error` on its first `failures` calls, counting its calls."""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return len(calls)
+    return func, calls
+
+
+@pytest.mark.parametrize('error', [
+    api_exceptions.ServiceUnavailable('busy'),
+    requests_exceptions.ConnectionError('connection reset by peer'),
+    auth_exceptions.TransportError('token refresh failed'),
+])
+def test_transient_error_is_retried(error):
+    func, calls = flaky(error, 2)
+
+    assert aio.gather((func, ())) == [3]
+    assert len(calls) == 3
+
+
+def test_timeout_is_not_retried():
+    running = threading.Event()
+    calls = []
+
+    def merge():
+        calls.append(1)
+        running.wait(5)
+
+    with pytest.raises(TimeoutError):
+        aio.gather((merge, (), {'timeout': 0.1, 'idempotent': True}))
+    time.sleep(0.2)
+    running.set()
+    # The timed-out attempt may still be running, so no second one was started
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('error', [api_exceptions.GatewayTimeout('timeout'),
+                                   requests_exceptions.ReadTimeout('read timed out')])
+@pytest.mark.parametrize('idempotent, expected_calls', [(True, 2), (False, 1)])
+def test_gateway_timeout_is_retried_for_idempotent_calls_only(error, idempotent, expected_calls):
+    func, calls = flaky(error, 1)
+
+    if idempotent:
+        aio.gather((func, (), {'idempotent': True}))
+    else:
+        with pytest.raises(type(error)):
+            aio.gather((func, ()))
+    assert len(calls) == expected_calls
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+import src.calendar_dim as calendar_dim
+from src.calendar_dim import build_calendar, ensure_calendar
+from src.warehouse import EmbeddedWarehouse
+from src.writer import BulkWriter
+
+
+@pytest.fixture
+def use_warehouse(tmp_path, monkeypatch):
+    """Point calendar_dim (and its writer) at a fresh embedded warehouse."""
+    monkeypatch.setattr(calendar_dim, '_spans', {})
+
+    def use_warehouse(name='warehouse'):
+        warehouse = EmbeddedWarehouse(str(tmp_path / f'{name}.db'), engine='sqlite')
+        writer = BulkWriter(warehouse, max_latency=3600)
+        monkeypatch.setattr(calendar_dim, 'get_warehouse', lambda *args: warehouse)
+        monkeypatch.setattr(calendar_dim, 'get_writer', lambda: writer)
+        return warehouse
+    return use_warehouse
+
+
+def ensure(*dates):
+    return ensure_calendar(pd.Series(pd.to_datetime(list(dates))), start_year=2020, end_year=2021)
+
+
+def stored_span(warehouse):
+    row = warehouse.read("SELECT MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS n FROM Date_Dim").iloc[0]
+    return str(row['first_date'])[:10], str(row['last_date'])[:10], int(row['n'])
+
+
+def test_build_calendar_keys_every_day():
+    calendar = build_calendar(pd.Timestamp('2024-02-27'), pd.Timestamp('2024-03-01'))
+
+    assert calendar['date_key'].tolist() == [20240227, 20240228, 20240229, 20240301]
+    assert calendar.iloc[2][['year', 'month', 'day', 'quarter', 'weekday']].tolist() == [2024, 2, 29, 1, 'Thursday']
+
+
+def test_date_dim_only_grows_for_dates_outside_its_span(use_warehouse):
+    warehouse = use_warehouse()
+
+    # An empty Date_Dim is pre-built for the configured years
+    assert ensure('2020-06-01') == 731
+    assert ensure('2020-01-01', '2021-12-31') == 0
+    # Whole years are added after and before the span
+    assert ensure('2021-05-01', '2023-02-01') == 730
+    assert ensure('2019-12-31') == 365
+
+    assert stored_span(warehouse) == ('2019-01-01', '2023-12-31', 1826)
+
+
+def test_span_is_read_from_the_stored_calendar(use_warehouse, monkeypatch):
+    use_warehouse()
+    ensure('2020-06-01')
+    # A new process reads the span from Date_Dim
+    monkeypatch.setattr(calendar_dim, '_spans', {})
+
+    assert ensure('2021-07-01') == 0
+    assert ensure('2022-07-01') == 365
+
+
+def test_span_is_kept_per_warehouse(use_warehouse):
+    first = use_warehouse('first')
+    ensure('2020-06-01', '2024-01-01')
+
+    second = use_warehouse('second')
+
+    # The second warehouse's Date_Dim is empty, whatever the first one holds
+    assert ensure('2020-06-01') == 731
+    assert stored_span(second) == ('2020-01-01', '2021-12-31', 731)
+    assert stored_span(first) == ('2020-01-01', '2024-12-31', 1827)
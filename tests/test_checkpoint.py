@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import src.checkpoint as checkpoint
+from src.checkpoint import ExtractCheckpoints
+from src.warehouse import EmbeddedWarehouse
+from src.writer import BulkWriter
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    warehouse.create_schema()
+    writer = BulkWriter(warehouse, max_latency=3600)
+    monkeypatch.setattr(checkpoint, 'get_warehouse', lambda *args: warehouse)
+    monkeypatch.setattr(checkpoint, 'get_writer', lambda: writer)
+    return writer
+
+
+def blob(name='sales.csv', generation=1):
+    return SimpleNamespace(name=f'incoming/{name}', generation=generation)
+
+
+def stage(writer, checkpoints, range_start, index, name='sales.csv'):
+    """Stage one single-row chunk the way extract() does."""
+    writer.write('Staging_Sales', pd.DataFrame({
+        'invoice_line_no': [f'INV-{range_start}-{index}'], 'file_name': [name],
+        'processed_timestamp': [pd.Timestamp.now()], 'chunk_id': [checkpoints.chunk_id(name, range_start, index)]}))
+    checkpoints.staged_chunk(name, range_start, index, 1)
+
+
+def test_new_file_starts_from_the_beginning(writer):
+    checkpoints = ExtractCheckpoints(every_rows=10)
+
+    assert checkpoints.begin([blob()]) == {}
+    assert not checkpoints.is_staged('sales.csv', 100, 0)
+
+
+def test_restarted_run_skips_committed_and_staged_chunks(writer):
+    checkpoints = ExtractCheckpoints(every_rows=2)
+    checkpoints.begin([blob()])
+    stage(writer, checkpoints, 100, 0)
+    stage(writer, checkpoints, 100, 1)
+    # Flushed after the last checkpoint, then the run crashed
+    stage(writer, checkpoints, 200, 0)
+    writer.flush('Staging_Sales')
+
+    restarted = ExtractCheckpoints(every_rows=2)
+
+    assert restarted.begin([blob()]) == {'incoming/sales.csv': 100}
+    assert [restarted.is_staged('sales.csv', *position) for position in [(100, 0), (100, 1), (200, 0), (200, 1)]] \
+        == [True, True, True, False]
+
+
+def test_overwritten_file_starts_over(writer):
+    checkpoints = ExtractCheckpoints(every_rows=1)
+    checkpoints.begin([blob()])
+    stage(writer, checkpoints, 100, 0)
+
+    restarted = ExtractCheckpoints(every_rows=1)
+
+    assert restarted.begin([blob(generation=2)]) == {}
+    assert not restarted.is_staged('sales.csv', 100, 0)
+
+
+def test_shard_only_uses_checkpoints_in_its_range(writer):
+    checkpoints = ExtractCheckpoints(every_rows=1)
+    checkpoints.begin([blob()], byte_range=(0, 1000))
+    stage(writer, checkpoints, 100, 0)
+    checkpoints.begin([blob()], byte_range=(1000, 2000))
+    stage(writer, checkpoints, 1500, 0)
+
+    restarted = ExtractCheckpoints(every_rows=1)
+
+    assert restarted.begin([blob()], byte_range=(0, 1000)) == {'incoming/sales.csv': 100}
+    assert not restarted.is_staged('sales.csv', 200, 0)
+    assert restarted.begin([blob()], byte_range=(1000, 2000)) == {'incoming/sales.csv': 1500}
+    assert not restarted.is_staged('sales.csv', 1600, 0)
+
+
+def test_finish_forgets_the_file(writer):
+    checkpoints = ExtractCheckpoints(every_rows=1)
+    checkpoints.begin([blob()])
+    stage(writer, checkpoints, 100, 0)
+
+    checkpoints.finish('sales.csv')
+
+    assert not checkpoints.is_staged('sales.csv', 100, 0)
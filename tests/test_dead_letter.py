@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+
+import src.dead_letter as dead_letter
+import src.dedup as dedup
+import src.key_cache as key_cache
+import src.writer as writer
+from src.dead_letter import METADATA_COLUMNS, DeadLetterStore
+from src.dedup import DedupIndex
+from src.load import load_sales
+from src.warehouse import EmbeddedWarehouse
+from src.writer import BulkWriter, to_arrow
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DeadLetterStore(str(tmp_path / 'dead_letter'))
+
+
+def rejects(reasons, **columns):
+    return pd.DataFrame({'invoice_line_no': [f'INV-{n}' for n in range(len(reasons))], 'store': 2633,
+                         'revenue': 1.5, 'reject_reason': reasons, **columns}, index=range(10, 10 + len(reasons)))
+
+
+def test_empty_store(store):
+    assert store.files() == []
+    assert store.read([]).columns.tolist() == METADATA_COLUMNS
+    assert store.summary().empty
+
+
+def test_rows_round_trip_as_text(store):
+    assert store.write(rejects(['store:fan_out', 'date:invalid_date']), run_id='run-1') == 2
+
+    rows = store.read(store.files()).sort_values('invoice_line_no')
+
+    assert rows['invoice_line_no'].tolist() == ['INV-0', 'INV-1']
+    assert rows['store'].tolist() == ['2633', '2633'] and rows['revenue'].tolist() == ['1.5', '1.5']
+    assert rows['reject_reason'].tolist() == ['store:fan_out', 'date:invalid_date']
+    assert set(rows['run_id']) == {'run-1'}
+
+
+def test_files_filter_by_reason_and_run(store):
+    store.write(rejects(['store:fan_out', 'date:invalid_date']), run_id='run-1')
+    store.write(rejects(['store:fan_out']), run_id='run-2')
+
+    assert len(store.files()) == 3
+    fan_out = store.read(store.files(reasons=['store:fan_out']))
+    assert sorted(fan_out['run_id']) == ['run-1', 'run-2']
+    latest = store.read(store.files(reasons=['store:fan_out'], run_ids=['run-2']))
+    assert latest['run_id'].tolist() == ['run-2']
+
+
+def test_summary_and_remove(store):
+    store.write(rejects(['store:fan_out', 'store:fan_out', 'date:invalid_date']), run_id='run-1')
+
+    summary = store.summary().set_index('reject_reason')['rows'].to_dict()
+    assert summary == {'date:invalid_date': 1, 'store:fan_out': 2}
+
+    store.remove(store.files(reasons=['store:fan_out']))
+    assert store.read(store.files())['reject_reason'].tolist() == ['date:invalid_date']
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch, store):
+    """The load path's process-wide state, backed by an embedded warehouse in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    for module in (key_cache, dedup):
+        monkeypatch.setattr(module, 'get_warehouse', lambda *args: warehouse)
+    monkeypatch.setattr(writer, '_writer', BulkWriter(warehouse, max_latency=3600))
+    monkeypatch.setattr(dedup, '_index', DedupIndex(index_dir=str(tmp_path / 'dedup')))
+    monkeypatch.setattr(key_cache, '_caches', {})
+    monkeypatch.setattr(dead_letter, '_store', store)
+    return warehouse
+
+
+def merge_dimension(warehouse, dim_table, rows):
+    natural_key, surrogate_key, _ = key_cache.DIMENSIONS[dim_table]
+    batch = pd.DataFrame(rows).assign(start_date=pd.Timestamp('2024-01-01').date(), end_date=None, is_active=True)
+    attributes = [col for col in rows if col != natural_key]
+    warehouse.merge_scd(dim_table, to_arrow(batch, dim_table), natural_key, attributes, surrogate_key)
+
+
+def test_replay_loads_rows_once_their_dimension_row_exists(pipeline, store):
+    merge_dimension(pipeline, 'Store_Dim', {'store_id': [10], 'address': ['1 Main St']})
+    merge_dimension(pipeline, 'Item_Dim', {'itemno': ['1'], 'category': ['Vodka']})
+    merge_dimension(pipeline, 'Vendor_Dim', {'vendor_no': ['1'], 'vendor_name': ['Acme']})
+    sales = pd.DataFrame({'invoice_line_no': ['INV-1', 'INV-2'], 'store': [10, 20], 'date': '2024-01-05',
+                          'itemno': '1', 'vendor_no': '1', 'revenue': 12.5, 'profit': 2.5, 'cost': 10.0,
+                          'total_bottles_sold': 2, 'total_volume_sold_in_liters': 1.5, 'profit_margin': 20.0,
+                          'average_bottle_price': 6.25, 'volume_per_bottle_sold': 0.75})
+
+    rejected = load_sales(sales, key_cache.get_key_cache(), writer.get_writer())
+    writer.get_writer().flush()
+    store.write(rejected)
+
+    assert rejected['reject_reason'].tolist() == ['store_key:missing_key']
+    merge_dimension(pipeline, 'Store_Dim', {'store_id': [20], 'address': ['2 Elm St']})
+
+    assert dead_letter.replay(reasons=['store_key:missing_key']) == {'replayed': 1, 'loaded': 1, 'rejected': 0}
+    facts = pipeline.read("SELECT invoice_line_no, store_key FROM Sales_Fact ORDER BY invoice_line_no")
+    assert facts.values.tolist() == [['INV-1', 1], ['INV-2', 2]]
+    assert store.files() == []
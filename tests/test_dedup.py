@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import src.dedup as dedup
+from src.dedup import DedupIndex, key_hashes
+from src.warehouse import EmbeddedWarehouse
+
+
+@pytest.fixture
+def index(tmp_path):
+    # An existing (empty) index file, so the index is not bootstrapped from Sales_Fact
+    np.save(tmp_path / 'keys.npy', np.empty(0, dtype=np.int64))
+    return DedupIndex(index_dir=str(tmp_path))
+
+
+def rows(*keys):
+    """Sales rows for (invoice_line_no, store, revenue) triples."""
+    return pd.DataFrame(keys, columns=['invoice_line_no', 'store', 'revenue'])
+
+
+def test_key_hashes_ignore_store_parsing():
+    assert (key_hashes(rows(('INV-1', '12', 1))) == key_hashes(rows(('INV-1', 12, 1)))).all()
+
+
+def test_first_occurrence_of_repeated_key_is_dropped(index):
+    chunk = rows(('A', 1, 1), ('B', 1, 1), ('A', 1, 2), ('A', 1, 3), ('B', 2, 1))
+
+    keep = index.check(chunk)
+
+    # Baseline rule: every occurrence after the first is kept
+    assert keep.tolist() == [False, True, True, True, True]
+
+
+def test_update_in_later_page_supersedes_original(index):
+    first_page = rows(('A', 1, 1), ('B', 1, 1))
+    second_page = rows(('C', 1, 1), ('A', 1, 2))
+
+    first_page = first_page[index.check(first_page)]
+    second_page = second_page[index.check(second_page)]
+
+    assert len(first_page) == 2 and len(second_page) == 2
+    loaded = pd.concat([index.drop_superseded(first_page), index.drop_superseded(second_page)])
+    assert sorted(loaded.itertuples(index=False, name=None)) == [('A', 1, 2), ('B', 1, 1), ('C', 1, 1)]
+
+
+def test_rows_loaded_by_earlier_slice_are_suppressed(index):
+    chunk = rows(('A', 1, 1))
+    index.add(chunk[index.check(chunk)])
+    index.commit()
+
+    index.begin()
+
+    assert index.check(rows(('A', 1, 2), ('B', 1, 1))).tolist() == [False, True]
+
+
+def test_rejected_row_does_not_block_later_row(index):
+    # Checked but rejected by load(): never added, so never counts as loaded
+    index.check(rows(('A', 1, 1)))
+    index.commit()
+
+    index.begin()
+
+    assert index.check(rows(('A', 1, 2))).tolist() == [True]
+
+
+def test_commit_persists_keys(index, tmp_path):
+    chunk = rows(('A', 1, 1), ('B', 1, 1))
+    index.add(chunk[index.check(chunk)])
+    index.commit()
+
+    reopened = DedupIndex(index_dir=str(tmp_path))
+
+    assert reopened.check(rows(('A', 1, 2), ('C', 1, 1))).tolist() == [False, True]
+
+
+def test_update_in_later_group_replaces_loaded_row(index, tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    monkeypatch.setattr(dedup, 'get_warehouse', lambda *args: warehouse)
+
+    def load(chunk, loaded_at):
+        warehouse.insert('Sales_Fact', pa.Table.from_pandas(chunk.assign(
+            date_key=0, store_key=0, item_key=0, vendor_key=0, processed_timestamp=pd.Timestamp(loaded_at))))
+        index.add(chunk)
+        index.commit()
+
+    group = rows(('A', 1, 1), ('B', 1, 1))
+    load(group[index.check(group)], '2024-01-01 10:00:00')
+    group = rows(('A', 1, 2), ('C', 1, 1))
+    load(group[index.check(group)], '2024-01-01 11:00:00')
+
+    assert index.delete_replaced(pd.Timestamp('2024-01-01 11:00:00')) == 1
+    facts = warehouse.read("SELECT invoice_line_no, revenue FROM Sales_Fact ORDER BY invoice_line_no")
+    assert facts.values.tolist() == [['A', 2.0], ['B', 1.0], ['C', 1.0]]
+
+
+def test_begin_merges_keys_committed_by_another_job(index, tmp_path):
+    other = DedupIndex(index_dir=str(tmp_path))
+    chunk = rows(('A', 1, 1))
+    other.add(chunk[other.check(chunk)])
+    other.commit()
+
+    index.begin()
+
+    assert index.check(rows(('A', 1, 2))).tolist() == [False]
+
+
+def test_sales_fact_is_read_only_until_an_index_is_stored(tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    warehouse.insert('Sales_Fact', pa.Table.from_pandas(rows(('A', 1, 1)).assign(
+        date_key=0, store_key=0, item_key=0, vendor_key=0, processed_timestamp=pd.Timestamp('2024-01-01'))))
+    reads = []
+    monkeypatch.setattr(warehouse, 'read', lambda query, read=warehouse.read: reads.append(query) or read(query))
+    monkeypatch.setattr(dedup, 'get_warehouse', lambda *args: warehouse)
+
+    first = DedupIndex(index_dir=str(tmp_path / 'index'))
+    assert first.check(rows(('A', 1, 2))).tolist() == [False]
+    first.commit()
+    second = DedupIndex(index_dir=str(tmp_path / 'index'))
+
+    assert len(reads) == 1
+    assert second.check(rows(('A', 1, 2))).tolist() == [False]
@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.encoding import encode_numeric, numeric_limit, round_to_scaled_int
+
+
+def test_numeric_limit():
+    assert numeric_limit(10, 2) == 99999999.99
+    assert numeric_limit(5, 2) == 999.99
+
+
+def test_rounding_matches_per_row_decimal_conversion():
+    # Ties and values whose float multiply lands just off .5
+    values = np.array([0.005, 0.015, 0.125, 1.005, 2.675, -2.675, 8.345, 1234.565, 0.1 + 0.2, -0.005])
+
+    scaled = round_to_scaled_int(values)
+
+    expected = [int(Decimal(str(round(float(value), 2))).scaleb(2)) for value in values]
+    assert scaled.tolist() == expected
+
+
+def test_encode_numeric_parses_and_fills():
+    series = pd.Series(['1.239', '2', None, 'n/a', -3.5], index=[5, 6, 7, 8, 9], name='revenue')
+
+    encoded = encode_numeric(series)
+
+    assert encoded.index.tolist() == [5, 6, 7, 8, 9]
+    assert str(encoded.dtype) == 'decimal128(10, 2)[pyarrow]'
+    assert encoded.tolist() == [Decimal('1.24'), Decimal('2.00'), Decimal('-1.00'), Decimal('-1.00'),
+                                Decimal('-3.50')]
+
+
+def test_encode_numeric_keeps_nulls_without_fill_value():
+    encoded = encode_numeric(pd.Series([1.0, None]), fill_value=None)
+
+    assert encoded.isna().tolist() == [False, True]
+
+
+def test_encode_numeric_rejects_overflow():
+    with pytest.raises(ValueError, match='profit_margin'):
+        encode_numeric(pd.Series([1.0, 1000.0]), precision=5, scale=2, column='profit_margin')
+
+
+def test_encode_numeric_clips_when_asked():
+    encoded = encode_numeric(pd.Series([1000.0, -1e9]), precision=5, scale=2, clip=True)
+
+    assert encoded.tolist() == [Decimal('999.99'), Decimal('-999.99')]
+
+
+def test_encode_numeric_empty():
+    assert len(encode_numeric(pd.Series([], dtype=float))) == 0
@@ -0,0 +1,117 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import src.etl_process as etl_process
+from src.etl_process import MicroBatchDaemon
+from src.metrics import Metrics
+
+
+def blob(name, size=100):
+    return SimpleNamespace(name=name, size=size)
+
+
+class Pipeline:
+    """Records the batches the daemon runs; fails them while `failing` is set."""
+    batches = []
+    failing = False
+
+    def __init__(self, bucket_name, creds, bucket_files, mode):
+        self.bucket_files = bucket_files
+
+    def run(self):
+        if Pipeline.failing:
+            raise RuntimeError('warehouse unavailable')
+        Pipeline.batches.append([b.name for b in self.bucket_files])
+
+
+@pytest.fixture(autouse=True)
+def pipeline(monkeypatch):
+    monkeypatch.setattr(Pipeline, 'batches', [])
+    monkeypatch.setattr(Pipeline, 'failing', False)
+    monkeypatch.setattr(etl_process, 'ELTPipeline', Pipeline)
+    monkeypatch.setattr(etl_process, 'get_metrics', Metrics)
+    return Pipeline
+
+
+def test_batch_is_cut_when_the_window_closes():
+    daemon = MicroBatchDaemon(window=0.2, batch_bytes=10_000)
+    daemon.offer(blob('a.csv'))
+    daemon.offer(blob('b.csv'))
+
+    assert daemon.next_batch(timeout=0.05) == []
+    started = time.monotonic()
+    batch = daemon.next_batch(timeout=5)
+
+    assert [b.name for b in batch] == ['a.csv', 'b.csv']
+    assert time.monotonic() - started < 1
+    assert daemon.queue == [] and daemon.queued_bytes == 0
+
+
+def test_batch_is_cut_at_batch_bytes():
+    daemon = MicroBatchDaemon(window=3600, batch_bytes=250)
+    daemon.offer(blob('a.csv'))
+    daemon.offer(blob('b.csv'))
+    assert daemon.next_batch(timeout=0.05) == []
+
+    daemon.offer(blob('c.csv'))
+    batch = daemon.next_batch(timeout=0.05)
+
+    # The batch takes files up to batch_bytes; the rest waits for the next one
+    assert [b.name for b in batch] == ['a.csv', 'b.csv']
+    assert [b.name for _, b in daemon.queue] == ['c.csv'] and daemon.queued_bytes == 100
+
+
+def test_oversized_file_forms_a_batch_of_its_own():
+    daemon = MicroBatchDaemon(window=3600, batch_bytes=250)
+    daemon.offer(blob('big.csv', size=1000))
+    daemon.offer(blob('a.csv'))
+
+    assert [b.name for b in daemon.next_batch(timeout=0.05)] == ['big.csv']
+
+
+def test_intake_pauses_while_too_many_rows_are_pending():
+    bucket = SimpleNamespace(name='bucket', list_blobs=None)
+    daemon = MicroBatchDaemon(bucket=bucket, window=0, max_pending_rows=10, row_bytes=10)
+    assert daemon.offer(blob('a.csv', size=60))
+    assert daemon.offer(blob('b.csv', size=60))
+
+    assert not daemon.offer(blob('c.csv', size=60))
+    assert daemon.paused and daemon.stats['pauses'] == 1 and daemon.pending_rows == 12
+    # The bucket is not even listed (list_blobs would fail)
+    daemon.poll()
+
+    daemon.process(daemon.next_batch(timeout=0.05))
+
+    assert daemon.pending_rows == 0
+    assert daemon.offer(blob('c.csv', size=60)) and not daemon.paused
+
+
+def test_failed_batch_is_released_and_rescanned(pipeline):
+    daemon = MicroBatchDaemon(window=0)
+    daemon.offer(blob('a.csv'))
+    daemon.rescan = False
+    pipeline.failing = True
+
+    daemon.process(daemon.next_batch(timeout=0.05))
+
+    assert daemon.stats['failed_batches'] == 1 and daemon.rescan
+    assert daemon.names == set() and daemon.pending_rows == 0
+    # Offered again by the next poll, it is queued like a new file
+    pipeline.failing = False
+    assert daemon.offer(blob('a.csv'))
+    daemon.process(daemon.next_batch(timeout=0.05))
+    assert pipeline.batches == [['a.csv']]
+
+
+def test_run_polls_the_bucket_and_processes_batches(pipeline, monkeypatch):
+    listings = [[blob('a.csv'), blob('b.csv'), blob('c.csv')], []]
+    manifest = SimpleNamespace(list_new=lambda bucket, prefix, full_listing: listings.pop(0) if listings else [])
+    monkeypatch.setattr(etl_process, 'get_manifest', lambda: manifest)
+    daemon = MicroBatchDaemon(bucket=SimpleNamespace(name='bucket'), window=0, batch_bytes=200, poll_interval=0.05)
+
+    stats = daemon.run(max_batches=2)
+
+    assert pipeline.batches == [['a.csv', 'b.csv'], ['c.csv']]
+    assert stats['batches'] == 2 and stats['files'] == 3 and stats['last_latency_s'] is not None
@@ -0,0 +1,111 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.dedup as dedup
+import src.extract as extract
+import src.ingest as ingest
+import src.main as main
+import src.manifest as manifest
+import src.transform as transform
+import src.writer as writer
+from src.dedup import DedupIndex
+from src.extract import extract_stream
+from src.manifest import FileManifest
+from src.synthetic import generate
+from src.warehouse import EmbeddedWarehouse
+from src.writer import BulkWriter, to_arrow
+
+
+class Blob:
+    """A local file exposing the Blob attributes extract reads."""
+
+    def __init__(self, path):
+        self.name = f'incoming/{os.path.basename(path)}'
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.generation = 1
+        self.md5_hash = None
+
+    def open(self, mode='rb', chunk_size=None):
+        return open(self.path, mode)
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return [Blob(path) for path in generate(str(tmp_path / 'bucket'), 1500, rows_per_file=500)]
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    monkeypatch.setattr(manifest, 'get_warehouse', lambda *args: warehouse)
+    monkeypatch.setattr(manifest, '_manifest', FileManifest(manifest_dir=str(tmp_path / 'manifest')))
+    monkeypatch.setattr(writer, '_writer', BulkWriter(warehouse, max_latency=3600))
+    monkeypatch.setattr(extract, 'iter_blob_chunks', functools.partial(ingest.iter_blob_chunks, batch_size=200))
+    return warehouse
+
+
+def staged_rows(warehouse):
+    return int(warehouse.read("SELECT COUNT(*) AS n FROM Staging_Sales")['n'].iloc[0])
+
+
+def test_stream_yields_tagged_chunks_then_end_of_file(warehouse, blobs):
+    stream = list(extract_stream(bucket_files=blobs, staging_audit=False))
+
+    for blob in blobs:
+        name = os.path.basename(blob.name)
+        chunks = [chunk for file_name, chunk in stream if file_name == name]
+        # Three chunks of at most 200 rows, then the end marker
+        assert [None if chunk is None else len(chunk) for chunk in chunks] == [200, 200, 100, None]
+        rows = pd.concat(chunks[:-1])
+        assert (rows['file_name'] == name).all() and rows['processed_timestamp'].notna().all()
+    # Without the audit copy nothing is written to Staging_Sales
+    assert staged_rows(warehouse) == 0
+
+
+def test_audit_copy_is_staged_once_the_stream_ends(warehouse, blobs):
+    stream = extract_stream(bucket_files=blobs, staging_audit=True)
+    chunks = [chunk for _, chunk in stream if chunk is not None]
+
+    assert sum(len(chunk) for chunk in chunks) == 1500
+    assert staged_rows(warehouse) == 1500
+
+
+def test_processed_files_are_not_streamed(warehouse, blobs):
+    warehouse.insert('Processed_Files', to_arrow(pd.DataFrame({
+        'file_name': ['chunk_0001.csv'], 'processed_timestamp': pd.Timestamp.now(tz='UTC')}), 'Processed_Files'))
+
+    stream = list(extract_stream(bucket_files=blobs, staging_audit=False))
+
+    assert sorted({file_name for file_name, _ in stream}) == ['chunk_0000.csv', 'chunk_0002.csv']
+
+
+def test_direct_run_marks_files_processed_once_their_rows_are_loaded(warehouse, blobs, tmp_path, monkeypatch):
+    np.save(tmp_path / 'keys.npy', np.empty(0, dtype=np.int64))
+    monkeypatch.setattr(dedup, '_index', DedupIndex(index_dir=str(tmp_path)))
+    # One download at a time, so the files' chunks arrive in order
+    monkeypatch.setattr(extract, 'iter_blob_chunks',
+                        functools.partial(ingest.iter_blob_chunks, batch_size=200, workers=1))
+    monkeypatch.setattr(main, 'transform_stream', functools.partial(transform.transform_stream, batch_rows=700))
+    monkeypatch.setattr(main, 'commit_watermark', lambda watermark: None)
+    loads = []
+
+    def load(transformed_data, dataset_name):
+        processed = [name for name in ('chunk_0000.csv', 'chunk_0001.csv', 'chunk_0002.csv')
+                     if name in manifest.get_manifest().entries.index]
+        loads.append((transformed_data['watermark']['files'], processed))
+
+    monkeypatch.setattr(main, 'load', load)
+
+    main.ELTPipeline('bucket', None, blobs, mode='direct', staging_audit=False).run()
+
+    # Groups of 700 rows: a file is only marked processed after the group holding its last rows
+    assert loads == [(['chunk_0000.csv', 'chunk_0001.csv'], []),
+                     (['chunk_0001.csv', 'chunk_0002.csv'], ['chunk_0000.csv']),
+                     (['chunk_0002.csv'], ['chunk_0000.csv', 'chunk_0001.csv'])]
+    assert sorted(warehouse.read("SELECT file_name FROM Processed_Files")['file_name']) == [
+        'chunk_0000.csv', 'chunk_0001.csv', 'chunk_0002.csv']
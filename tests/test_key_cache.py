@@ -0,0 +1,138 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+import src.key_cache as key_cache
+from src.key_cache import KeyCache
+from src.key_resolution import resolve_fact_keys
+from src.warehouse import EmbeddedWarehouse
+from src.writer import to_arrow
+
+ATTRIBUTES = ['address', 'city', 'zipcode', 'county_number', 'county']
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    monkeypatch.setattr(key_cache, 'get_warehouse', lambda *args: warehouse)
+    return warehouse
+
+
+def merge_stores(warehouse, ids, address='1 Main St'):
+    batch = pd.DataFrame({'store_id': ids, 'address': address, 'city': 'Ames', 'zipcode': '50010',
+                          'county_number': '85', 'county': 'Story', 'start_date': pd.Timestamp('2024-01-01').date(),
+                          'end_date': None, 'is_active': True})
+    warehouse.merge_scd('Store_Dim', to_arrow(batch, 'Store_Dim'), 'store_id', ATTRIBUTES, 'store_key')
+
+
+def keys(frame):
+    return dict(zip(frame['store_id'], frame['store_key']))
+
+
+def test_misses_are_fetched_then_hit(warehouse, tmp_path):
+    merge_stores(warehouse, [10, 20, 30])
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+
+    assert keys(cache.lookup('Store_Dim', ['10', '20', None])) == {10: 1, 20: 2}
+    assert cache.stats == {'hits': 0, 'misses': 2, 'queries': 1, 'rows_fetched': 2}
+
+    # The next load's refresh since the high-water mark brings in the versions merged today,
+    # store 30 included
+    cache.refresh_all()
+    assert keys(cache.lookup('Store_Dim', [10, 20, 30])) == {10: 1, 20: 2, 30: 3}
+    assert cache.stats['hits'] == 3 and cache.stats['misses'] == 2
+
+
+def test_saved_cache_is_reused(warehouse, tmp_path):
+    merge_stores(warehouse, [10, 20])
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+    cache.lookup('Store_Dim', [10, 20])
+    cache.save()
+
+    reopened = KeyCache(cache_dir=str(tmp_path / 'cache'))
+
+    assert keys(reopened.lookup('Store_Dim', [10, 20])) == {10: 1, 20: 2}
+    assert reopened.stats['misses'] == 0
+    assert reopened.meta['totals']['misses'] == 2
+
+
+def test_refresh_applies_new_versions(warehouse, tmp_path):
+    merge_stores(warehouse, [10, 20])
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+    cache.lookup('Store_Dim', [10, 20])
+
+    # Store 20 moves: its old version expires and the new one gets the next key
+    merge_stores(warehouse, [20], address='2 Elm St')
+    cache.refresh_all()
+
+    assert keys(cache.lookup('Store_Dim', [10, 20])) == {10: 1, 20: 3}
+
+
+def test_invalidate_drops_entries(warehouse, tmp_path):
+    merge_stores(warehouse, [10, 20])
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+    cache.lookup('Store_Dim', [10, 20])
+
+    cache.invalidate('Store_Dim', ['10'])
+    assert cache.get_map('Store_Dim').index.tolist() == [20]
+
+    cache.invalidate('Store_Dim')
+    assert cache.get_map('Store_Dim').empty
+    assert 'Store_Dim' not in cache.meta['high_water_marks']
+
+
+def add_active_version(warehouse, store_id, store_key):
+    """A second active version of a store, as a broken SCD merge would leave it."""
+    warehouse.insert('Store_Dim', to_arrow(pd.DataFrame({
+        'store_key': [store_key], 'store_id': [store_id], 'start_date': [pd.Timestamp.now().date()],
+        'is_active': [True]}), 'Store_Dim'))
+
+
+@pytest.mark.parametrize('cached_first', [False, True])
+def test_duplicate_active_versions_are_rejected_as_fan_out(warehouse, tmp_path, cached_first):
+    merge_stores(warehouse, [10, 20])
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+    if cached_first:
+        # Cached before the duplicate appeared: the refresh brings in both versions
+        cache.lookup('Store_Dim', [10, 20])
+    add_active_version(warehouse, 10, 99)
+    cache.refresh_all()
+
+    found = cache.lookup('Store_Dim', [10, 20])
+    sales = pd.DataFrame({'store': [10, 20], 'itemno': ['1', '1'], 'vendor_no': ['1', '1']})
+    key_frames = {'Store_Dim': found, 'Item_Dim': pd.DataFrame({'itemno': ['1'], 'item_key': [1]}),
+                  'Vendor_Dim': pd.DataFrame({'vendor_no': ['1'], 'vendor_key': [1]})}
+    resolved, rejected = resolve_fact_keys(sales, key_frames)
+
+    assert sorted(found.loc[found['store_id'] == 10, 'store_key']) == [1, 99]
+    assert resolved['store'].tolist() == [20]
+    assert rejected['reject_reason'].tolist() == ['store:fan_out']
+
+
+def test_dimensions_are_refreshed_once_per_load(warehouse, tmp_path):
+    merge_stores(warehouse, [10, 20])
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+    cache.lookup('Store_Dim', [10, 20])
+    cache.refresh_all()
+    queries = cache.stats['queries']
+
+    # Parts of one load only query their misses, not the dimension's changes again
+    for part in ([10], [20], [10, 20]):
+        cache.lookup('Store_Dim', part)
+    assert cache.stats['queries'] == queries
+
+
+def test_high_water_mark_is_a_utc_date(warehouse, tmp_path, monkeypatch):
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            # 23:30 on Jan 1 in UTC-6 is already Jan 2 in UTC
+            moment = datetime(2024, 1, 2, 5, 30, tzinfo=timezone.utc)
+            return moment.astimezone(tz) if tz else datetime(2024, 1, 1, 23, 30)
+
+    monkeypatch.setattr(key_cache, 'datetime', Clock)
+    cache = KeyCache(cache_dir=str(tmp_path / 'cache'))
+    cache.refresh('Store_Dim')
+
+    assert cache.meta['high_water_marks']['Store_Dim'] == '2024-01-02'
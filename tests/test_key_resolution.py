@@ -0,0 +1,56 @@
+import pandas as pd
+
+from src.key_resolution import MISSING_KEY, date_keys, resolve_fact_keys
+
+
+def test_date_keys():
+    keys = date_keys(['2024-01-05', '2023-12-31', 'not a date', None])
+
+    assert keys.tolist() == [20240105, 20231231, MISSING_KEY, MISSING_KEY]
+    assert keys.dtype == 'int64'
+
+
+def key_frames(**overrides):
+    frames = {
+        'Store_Dim': pd.DataFrame({'store_id': [2633, 4829], 'store_key': [1, 2]}),
+        'Item_Dim': pd.DataFrame({'itemno': ['43127', '11788'], 'item_key': [10, 20]}),
+        'Vendor_Dim': pd.DataFrame({'vendor_no': ['260', '85'], 'vendor_key': [100, 200]}),
+    }
+    frames.update(overrides)
+    return frames
+
+
+def test_resolve_fact_keys_normalizes_natural_keys():
+    # Stores arrive as text, item numbers as numbers
+    sales = pd.DataFrame({'store': ['4829', '2633', '9999'], 'itemno': [11788, 43127, 43127],
+                          'vendor_no': ['85', '260', '1']}, index=[7, 8, 9])
+
+    resolved, rejected = resolve_fact_keys(sales, key_frames())
+
+    assert resolved.index.tolist() == [7, 8]
+    assert resolved['store_key'].tolist() == [2, 1]
+    assert resolved['item_key'].tolist() == [20, 10]
+    assert resolved['vendor_key'].tolist() == [200, 100]
+    assert rejected.index.tolist() == [9]
+
+
+def test_rows_with_missing_keys_are_rejected():
+    sales = pd.DataFrame({'store': [2633, 9999, 2633, 2633], 'itemno': ['43127', '43127', '0', '0'],
+                          'vendor_no': ['260', '1', '260', '1']})
+
+    resolved, rejected = resolve_fact_keys(sales, key_frames())
+
+    assert resolved.index.tolist() == [0]
+    # The first dimension without the row's key is reported
+    assert rejected['reject_reason'].tolist() == ['store_key:missing_key', 'item_key:missing_key',
+                                                  'item_key:missing_key']
+
+
+def test_fan_out_rows_are_rejected():
+    items = pd.DataFrame({'itemno': ['43127', '43127', '11788'], 'item_key': [10, 11, 20]})
+    sales = pd.DataFrame({'store': [2633, 4829], 'itemno': ['43127', '11788'], 'vendor_no': ['260', '85']})
+
+    resolved, rejected = resolve_fact_keys(sales, key_frames(Item_Dim=items))
+
+    assert resolved['item_key'].tolist() == [20]
+    assert rejected['reject_reason'].tolist() == ['itemno:fan_out']
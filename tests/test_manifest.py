@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import src.manifest as manifest
+from src.manifest import FileManifest
+from src.warehouse import EmbeddedWarehouse
+from src.writer import to_arrow
+
+
+def blob(name, generation=1):
+    return SimpleNamespace(name=name, generation=generation, size=100, md5_hash='md5')
+
+
+class Bucket:
+    """Lists blobs in name order from start_offset, like GCS."""
+
+    def __init__(self, *names):
+        self.blobs = [blob(name) for name in sorted(names)]
+        self.offsets = []
+
+    def list_blobs(self, prefix=None, start_offset=None):
+        self.offsets.append(start_offset)
+        return [b for b in self.blobs if start_offset is None or b.name >= start_offset]
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    monkeypatch.setattr(manifest, 'get_warehouse', lambda *args: warehouse)
+    return warehouse
+
+
+def mark_processed(warehouse, *names):
+    warehouse.insert('Processed_Files', to_arrow(pd.DataFrame({
+        'file_name': list(names), 'processed_timestamp': pd.Timestamp.now(tz='UTC')}), 'Processed_Files'))
+
+
+def test_filter_new_skips_processed_and_non_csv(warehouse, tmp_path):
+    mark_processed(warehouse, 'a.csv')
+    files = FileManifest(str(tmp_path / 'manifest'))
+
+    new = files.filter_new([blob('a.csv'), blob('b.csv'), blob('notes.txt')])
+
+    assert [b.name for b in new] == ['b.csv']
+
+
+def test_listing_resumes_from_marker(warehouse, tmp_path):
+    bucket = Bucket('a.csv', 'b.csv', 'c.csv')
+    files = FileManifest(str(tmp_path / 'manifest'))
+    assert [b.name for b in files.list_new(bucket)] == ['a.csv', 'b.csv', 'c.csv']
+
+    # b.csv failed: the marker stops before it
+    files.record('a.csv')
+    files.record('c.csv')
+    files.save()
+
+    reopened = FileManifest(str(tmp_path / 'manifest'))
+    assert [b.name for b in reopened.list_new(bucket)] == ['b.csv']
+    assert bucket.offsets == [None, 'a.csv']
+
+    reopened.list_new(bucket, full_listing=True)
+    assert bucket.offsets[-1] is None
+
+
+def test_sync_picks_up_files_processed_elsewhere(warehouse, tmp_path):
+    files = FileManifest(str(tmp_path / 'manifest'))
+    files.filter_new([])
+    files.save()
+    mark_processed(warehouse, 'a.csv')
+
+    reopened = FileManifest(str(tmp_path / 'manifest'))
+
+    assert [b.name for b in reopened.filter_new([blob('a.csv'), blob('b.csv')])] == ['b.csv']
+    assert 'a.csv' in reopened.entries.index
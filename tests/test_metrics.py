@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+import src.metrics as metrics
+from src.metrics import NOOP_SPAN, JsonLinesSink, Metrics, PrometheusSink, get_metrics, traced
+
+
+@pytest.fixture
+def sinks(tmp_path, monkeypatch):
+    """Install process-wide metrics writing to a JSONL and a Prometheus file."""
+    def sinks(chunk_sample=1):
+        jsonl = JsonLinesSink(str(tmp_path / 'spans.jsonl'))
+        prometheus = PrometheusSink(str(tmp_path / 'etl.prom'))
+        monkeypatch.setattr(metrics, '_metrics', Metrics([jsonl, prometheus], chunk_sample=chunk_sample))
+        return jsonl, prometheus
+    return sinks
+
+
+def records(tmp_path):
+    get_metrics().close()
+    with open(tmp_path / 'spans.jsonl') as f:
+        return [json.loads(line) for line in f]
+
+
+@traced('clean')
+def clean(rows, rejected):
+    get_metrics().count(rows_in=rows, rows_out=rows - rejected, rows_rejected=rejected, warehouse_jobs=1)
+    return rows - rejected
+
+
+def test_traced_stage_writes_one_record_with_its_counters(sinks, tmp_path):
+    sinks()
+
+    assert clean(10, 2) == 8
+
+    record, = records(tmp_path)
+    assert record['span'] == 'clean' and record['kind'] == 'stage' and record['parent'] is None
+    assert {name: record[name] for name in metrics.COUNTERS} == {
+        'rows_in': 10, 'rows_out': 8, 'rows_rejected': 2, 'bytes_read': 0, 'bytes_written': 0, 'warehouse_jobs': 1}
+    assert record['wall_s'] >= 0 and 'error' not in record
+
+
+def test_failed_span_records_its_error(sinks, tmp_path):
+    sinks()
+
+    @traced('load')
+    def load():
+        raise ValueError('bad row')
+
+    with pytest.raises(ValueError):
+        load()
+
+    record, = records(tmp_path)
+    assert record['span'] == 'load' and record['error'] == 'ValueError'
+
+
+def test_chunk_spans_are_sampled_but_all_aggregated(sinks, tmp_path):
+    _, prometheus = sinks(chunk_sample=4)
+    recorder = get_metrics()
+
+    with recorder.span('extract') as stage:
+        for _ in range(10):
+            with recorder.span('extract_chunk', kind='chunk'):
+                recorder.count(rows_in=5, bytes_read=100)
+
+    # Chunks 1, 5 and 9 of 10 are written; the stage sums all of them
+    chunks = [record for record in records(tmp_path) if record['kind'] == 'chunk']
+    assert len(chunks) == 3
+    assert stage.counters['rows_in'] == 50 and stage.counters['bytes_read'] == 1000
+    assert prometheus.totals[('extract_chunk', 'chunk')]['spans'] == 10
+    assert 'etl_spans_total{span="extract_chunk",kind="chunk"} 10' in (tmp_path / 'etl.prom').read_text()
+
+
+def test_row_counters_only_roll_up_from_parts(sinks, tmp_path):
+    sinks()
+    recorder = get_metrics()
+
+    with recorder.span('load') as stage:
+        with recorder.span('process_scd_type2', kind='dimension'):
+            recorder.count(rows_in=7, warehouse_jobs=3)
+        with recorder.span('load_part', kind='chunk'):
+            recorder.count(rows_in=20)
+
+    # The dimension's rows are not fact rows; its jobs still count towards the stage
+    assert stage.counters['rows_in'] == 20 and stage.counters['warehouse_jobs'] == 3
+
+
+def test_gauges_replace_their_previous_value(sinks, tmp_path):
+    sinks()
+    get_metrics().gauge(daemon_queue_files=3)
+    get_metrics().gauge(daemon_queue_files=1)
+
+    assert 'etl_daemon_queue_files 1\n' in (tmp_path / 'etl.prom').read_text()
+    assert [record['gauges'] for record in records(tmp_path)] == [{'daemon_queue_files': 3},
+                                                                   {'daemon_queue_files': 1}]
+
+
+def test_no_sinks_costs_nothing():
+    recorder = Metrics([])
+
+    assert recorder.span('extract') is NOOP_SPAN
+    with recorder.span('extract'):
+        recorder.count(rows_in=1)
+    assert NOOP_SPAN.counters['rows_in'] == 0
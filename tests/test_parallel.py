@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.encoding import encode_numeric
+from src.key_resolution import FACT_KEYS
+from src.load import prepare_facts
+from src.parallel import clean_partitioned, partition_ids, prepare_facts_partitioned, read_frame, write_frame
+from src.synthetic import generate
+from src.transform import clean_rows
+
+
+@pytest.fixture(scope='module')
+def staging(tmp_path_factory):
+    path = generate(str(tmp_path_factory.mktemp('bucket')), 3000, rows_per_file=3000)[0]
+    # Scattered index, as after earlier filtering
+    return pd.read_csv(path, dtype=str).set_axis(np.arange(3000) * 3)
+
+
+def test_partition_ids_ignore_parsing():
+    as_text = pd.DataFrame({'store': ['2633', '4829', '10']})
+    as_numbers = pd.DataFrame({'store': [2633, 4829, 10]})
+
+    ids = partition_ids(as_text, partitions=4)
+
+    assert ids.tolist() == partition_ids(as_numbers, partitions=4).tolist()
+    assert ((ids >= 0) & (ids < 4)).all()
+
+
+def test_frames_round_trip_with_index_and_decimals(tmp_path):
+    frame = pd.DataFrame({'store': [1, 2], 'revenue': encode_numeric(pd.Series([1.5, 2.25]))}, index=[10, 4])
+
+    write_frame(frame, str(tmp_path / 'frame.arrow'))
+
+    pd.testing.assert_frame_equal(read_frame(str(tmp_path / 'frame.arrow')), frame)
+
+
+def test_clean_partitioned_matches_clean_rows(staging, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    parallel = clean_partitioned(staging.copy(), workers=3)
+
+    pd.testing.assert_frame_equal(parallel, clean_rows(staging.copy()), check_dtype=False)
+
+
+def surrogate_keys(natural_keys, natural_key, surrogate_key):
+    return pd.DataFrame({natural_key: natural_keys, surrogate_key: np.arange(1, len(natural_keys) + 1)})
+
+
+def test_prepare_facts_partitioned_matches_prepare_facts(staging, tmp_path):
+    sales = clean_rows(staging.copy())
+    key_frames = {dim_table: surrogate_keys(sales[column].unique(), natural_key, surrogate_key)
+                  for column, dim_table, natural_key, surrogate_key in FACT_KEYS}
+    processed_timestamp = pd.Timestamp('2024-01-01 10:00:00')
+
+    facts, rejected = prepare_facts_partitioned(sales.copy(), key_frames, processed_timestamp, workers=3,
+                                                partition_dir=str(tmp_path))
+    expected_facts, expected_rejected = prepare_facts(sales.copy(), key_frames, processed_timestamp)
+
+    pd.testing.assert_frame_equal(facts, expected_facts, check_dtype=False)
+    assert rejected.index.tolist() == expected_rejected.index.tolist()
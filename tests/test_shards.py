@@ -0,0 +1,116 @@
+import os
+
+import pandas as pd
+import pytest
+
+import src.checkpoint as checkpoint
+import src.main as main
+import src.manifest as manifest
+import src.shards as shards
+import src.writer as writer
+from src.checkpoint import ExtractCheckpoints
+from src.manifest import FileManifest
+from src.shards import iter_shard_chunks, shard_count, shard_range
+from src.synthetic import generate
+from src.warehouse import EmbeddedWarehouse
+from src.writer import BulkWriter
+
+ROWS = 3000
+
+
+class Blob:
+    """A local file exposing the Blob attributes extract_shard reads."""
+
+    def __init__(self, path, generation=1):
+        self.name = f'incoming/{os.path.basename(path)}'
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.generation = generation
+
+    def open(self, mode='rb', chunk_size=None):
+        return open(self.path, mode)
+
+
+class Bucket:
+    def __init__(self, blob):
+        self.blob = blob
+
+    def get_blob(self, name):
+        return self.blob if name == self.blob.name else None
+
+
+class StorageClient:
+    def __init__(self, blob):
+        self.blob = blob
+
+    def bucket(self, name):
+        return Bucket(self.blob)
+
+
+@pytest.fixture
+def blob(tmp_path):
+    path, = generate(str(tmp_path / 'bucket'), ROWS, rows_per_file=ROWS)
+    return Blob(path)
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    for module in (shards, checkpoint, manifest):
+        monkeypatch.setattr(module, 'get_warehouse', lambda *args: warehouse)
+    monkeypatch.setattr(writer, '_writer', BulkWriter(warehouse, max_latency=3600))
+    monkeypatch.setattr(checkpoint, '_checkpoints', ExtractCheckpoints(every_rows=500))
+    monkeypatch.setattr(manifest, '_manifest', FileManifest(manifest_dir=str(tmp_path / 'manifest')))
+    return warehouse
+
+
+def count(warehouse, table):
+    return int(warehouse.read(f"SELECT COUNT(*) AS n FROM {table}")['n'].iloc[0])
+
+
+@pytest.mark.parametrize('size', [1, 7, 1000, 123457])
+@pytest.mark.parametrize('shard_total', [1, 3, 8])
+def test_shard_ranges_tile_the_object(size, shard_total):
+    ranges = [shard_range(size, index, shard_total) for index in range(shard_total)]
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == size
+    assert all(previous[1] == following[0] for previous, following in zip(ranges, ranges[1:]))
+
+
+def test_shards_parse_every_record_once(blob):
+    expected = pd.read_csv(blob.path, dtype=str, keep_default_na=False)
+
+    chunks = [chunk for index in range(3) for chunk in iter_shard_chunks(blob, index, 3, batch_size=400)]
+
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True).fillna(''), expected)
+
+
+def test_shard_count_keeps_shards_above_the_minimum():
+    assert shard_count(100, tasks=8, min_bytes=30) == 3
+    assert shard_count(10, tasks=8, min_bytes=30) == 1
+
+
+def test_file_is_committed_once_every_shard_has_reported(warehouse, blob, monkeypatch):
+    monkeypatch.setattr(main, 'shard_count', lambda size, tasks: shard_count(size, tasks, min_bytes=1))
+    transform_loads = []
+    monkeypatch.setattr(main.ELTPipeline, 'transform_load', lambda self: transform_loads.append(self.bucket_files))
+    client = StorageClient(blob)
+
+    for task_index in (0, 1):
+        main.run_event(client, 'bucket', blob.name, task_index=task_index, task_count=3)
+    with pytest.raises(RuntimeError, match=r'Shards \[2\]'):
+        main.run_event(client, 'bucket', blob.name, task_count=3, step='commit')
+    assert count(warehouse, 'Processed_Files') == 0 and transform_loads == []
+
+    # A retried shard stages nothing twice
+    assert shards.extract_shard(blob, 1, 3) == 0
+    main.run_event(client, 'bucket', blob.name, task_index=2, task_count=3)
+    main.run_event(client, 'bucket', blob.name, task_count=3, step='commit')
+
+    progress = warehouse.read("SELECT shard_index, row_count FROM Shard_Progress")
+    assert sorted(progress['shard_index'].unique()) == [0, 1, 2]
+    assert progress.groupby('shard_index')['row_count'].max().sum() == ROWS
+    assert count(warehouse, 'Staging_Sales') == ROWS
+    assert warehouse.read("SELECT file_name FROM Processed_Files")['file_name'].tolist() == ['chunk_0000.csv']
+    assert transform_loads == [[blob]]
@@ -0,0 +1,82 @@
+import io
+
+import pandas as pd
+import pytest
+
+from src.splitter import iter_csv_chunks, record_start, split_ranges
+
+HEADER = 'id,address,city,val\n'
+
+
+def write_csv(tmp_path, rows, name='sales.csv'):
+    path = tmp_path / name
+    path.write_bytes((HEADER + ''.join(rows)).encode())
+    return str(path)
+
+
+def multiline_rows(count):
+    """Every third address is quoted, spans two lines and ends with an escaped quote."""
+    rows = []
+    for i in range(count):
+        address = f'"{i} Main St\nApt {i % 10}, ""X"""' if i % 3 == 0 else f'{i} Elm St'
+        rows.append(f'{i},{address},City{i % 7},{i * 1.5}\n')
+    return rows
+
+
+@pytest.mark.parametrize('range_bytes', [100, 1000, 7777, 50000])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_multiline_quoted_address(tmp_path, range_bytes, workers):
+    path = write_csv(tmp_path, multiline_rows(3000))
+    expected = pd.read_csv(path, dtype=str)
+
+    chunks = list(iter_csv_chunks(path, range_bytes=range_bytes, workers=workers, batch_size=500))
+
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_record_start_inside_quoted_field():
+    data = (HEADER + ''.join(multiline_rows(30))).encode()
+    # Just after the newline inside the first quoted address, whose tail has four fields
+    offset = data.index(b'\nApt 0') + 1
+    stream = io.BytesIO(data)
+
+    start = record_start(stream, offset, 4, len(data))
+
+    assert data[start:].startswith(b'1,1 Elm St,')
+
+
+def test_record_start_exactly_at_record():
+    data = (HEADER + '1,a,b,2\n3,c,d,4\n').encode()
+    offset = data.index(b'3,c')
+
+    assert record_start(io.BytesIO(data), offset, 4, len(data)) == offset
+
+
+def test_record_start_rejects_wrong_field_count():
+    data = (HEADER + '1,a,b\n' * 20).encode()
+
+    with pytest.raises(ValueError):
+        record_start(io.BytesIO(data), len(HEADER) + 3, 4, len(data))
+
+
+def test_split_ranges_tile_the_file():
+    data = (HEADER + ''.join(multiline_rows(200))).encode()
+    stream = io.BytesIO(data)
+
+    header, ranges = split_ranges(stream, len(data), 9)
+
+    assert header == HEADER.encode()
+    assert ranges[0][0] == len(header) and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+
+
+def test_resume_skips_earlier_ranges(tmp_path):
+    path = write_csv(tmp_path, [f'{i},a{i},b,{i}\n' for i in range(1000)])
+    positioned = list(iter_csv_chunks(path, range_bytes=2000, workers=1, batch_size=100, positions=True))
+    resume_from = positioned[len(positioned) // 2][0]
+
+    resumed = list(iter_csv_chunks(path, range_bytes=2000, workers=1, batch_size=100, resume_from=resume_from,
+                                   positions=True))
+
+    assert [position[:2] for position in resumed] == \
+        [position[:2] for position in positioned if position[0] >= resume_from]
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.csv as pa_csv
+
+from src.synthetic import SOURCE_COLUMNS, SalesGenerator, generate
+
+ROWS = 40_000
+
+
+def sample(**options):
+    generator = SalesGenerator(seed=7, stores=200, items=500, vendors=50, start_date='2020-01-01',
+                               end_date='2020-12-31', **options)
+    return generator, generator.table(0, ROWS, ROWS).to_pandas()
+
+
+def test_fixed_seed_gives_identical_files(tmp_path):
+    first = generate(str(tmp_path / 'first'), 2500, rows_per_file=1000, seed=3, stores=50, items=100)
+    second = generate(str(tmp_path / 'second'), 2500, rows_per_file=1000, seed=3, stores=50, items=100)
+    other = generate(str(tmp_path / 'other'), 2500, rows_per_file=1000, seed=4, stores=50, items=100)
+
+    assert [Path(path).read_bytes() for path in first] == [Path(path).read_bytes() for path in second]
+    assert Path(first[0]).read_bytes() != Path(other[0]).read_bytes()
+    table = pa_csv.read_csv(first[-1])
+    assert table.column_names == SOURCE_COLUMNS and table.num_rows == 500
+
+
+def test_rates_land_near_the_configured_values():
+    generator, sales = sample(duplicate_rate=0.02, null_rate=0.01, drift_rate=0.2)
+
+    updates = sales.duplicated(['invoice_line_no', 'store']).mean()
+    assert 0.015 < updates < 0.025
+    assert 0.007 < sales['address'].isna().mean() < 0.013
+    assert 0.007 < sales['category'].isna().mean() < 0.013
+    # Null store and category columns are drawn independently
+    assert (sales['address'].isna() & sales['category'].isna()).mean() < 0.001
+    for change in (generator.store_change, generator.item_change, generator.vendor_change):
+        assert 0.1 < (change < generator.days).mean() < 0.3
+
+
+def test_drifted_store_changes_attributes_from_its_change_day():
+    generator, sales = sample(duplicate_rate=0, null_rate=0, drift_rate=0.5)
+    sales['day'] = (pd.to_datetime(sales['date']) - pd.Timestamp('2020-01-01')).dt.days
+    store = sales['store'].astype(int) - 2000
+    change = generator.store_change[store]
+
+    moved = sales[change < generator.days]
+    before = moved[moved['day'] < change[moved.index]].groupby('store')['address'].nunique()
+    after = moved[moved['day'] >= change[moved.index]].groupby('store')['address'].nunique()
+
+    # One version before the change day and one after it, per store
+    assert (before == 1).all() and (after == 1).all()
+    assert (moved.groupby('store')['address'].nunique() == 2).any()
+    unchanged = sales[change >= generator.days].groupby('store')['address'].nunique()
+    assert (unchanged == 1).all()
@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.dedup as dedup
+import src.transform as transform
+import src.watermark as watermark
+from src.dedup import DedupIndex
+from src.synthetic import SalesGenerator
+from src.warehouse import EmbeddedWarehouse
+from src.writer import to_arrow
+
+SALES_COLUMNS = ['invoice_line_no', 'store', 'date', 'itemno', 'vendor_no', 'revenue', 'profit', 'cost']
+
+
+def staging_rows(rows, files=4, seed=0, duplicate_rate=0.05):
+    """Synthetic Staging_Sales rows (updates and nulls included) spread over files."""
+    generator = SalesGenerator(seed=seed, stores=20, items=60, vendors=8, categories=5, cities=6,
+                               duplicate_rate=duplicate_rate, null_rate=0.01, drift_rate=0.3)
+    staging = generator.table(0, rows, rows).to_pandas()
+    part = np.arange(rows) * files // rows
+    staging['file_name'] = [f'chunk_{p:04d}.csv' for p in part]
+    staging['processed_timestamp'] = pd.Timestamp('2024-06-01 12:00') + pd.to_timedelta(part, unit='s')
+    return staging
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    for module in (transform, watermark):
+        monkeypatch.setattr(module, 'get_warehouse', lambda *args: warehouse)
+    warehouse.insert('Staging_Sales', to_arrow(staging_rows(2000), 'Staging_Sales'))
+    return warehouse
+
+
+@pytest.fixture
+def new_index(tmp_path, monkeypatch):
+    """Start a run on a fresh, empty dedup index."""
+    def new_index(name):
+        index_dir = tmp_path / 'dedup' / name
+        index_dir.mkdir(parents=True)
+        np.save(index_dir / 'keys.npy', np.empty(0, dtype=np.int64))
+        monkeypatch.setattr(dedup, '_index', DedupIndex(index_dir=str(index_dir)))
+    return new_index
+
+
+def loaded_sales(transformed):
+    sales = pd.concat(list(transform.iter_sales(transformed)), ignore_index=True)[SALES_COLUMNS]
+    return sales.sort_values(SALES_COLUMNS).reset_index(drop=True)
+
+
+def dimension(transformed, name):
+    key = transform.DIMENSION_KEYS[name]
+    return transformed[name].astype(str).sort_values(key).reset_index(drop=True)
+
+
+def test_budgeted_transform_matches_unbudgeted(warehouse, new_index, monkeypatch):
+    new_index('unbudgeted')
+    expected = transform.transform(memory_budget=None)
+    new_index('budgeted')
+    monkeypatch.setattr(transform, 'TRANSFORM_PAGE_ROWS', 500)
+
+    # Every page is over a one-byte budget, so each one is spilled
+    transformed = transform.transform(memory_budget=1)
+
+    spilled = transformed['sales_spill']
+    assert len(spilled) == 4 and all(os.path.exists(path) for path in spilled)
+    assert transformed['watermark'] == expected['watermark']
+    for name in transform.DIMENSION_KEYS:
+        pd.testing.assert_frame_equal(dimension(transformed, name), dimension(expected, name))
+    pd.testing.assert_frame_equal(loaded_sales(transformed), loaded_sales(expected))
+    # Spilled parts (and their run directory) are removed once load() has read them
+    assert not any(os.path.exists(path) for path in spilled)
+    assert os.listdir(transform.SPILL_DIR) == []
+
+
+def test_budget_keeps_rows_in_memory_until_exceeded(warehouse, new_index, monkeypatch):
+    new_index('budgeted')
+    monkeypatch.setattr(transform, 'TRANSFORM_PAGE_ROWS', 500)
+    page_bytes = transform.clean_sales(staging_rows(500))['sales'].memory_usage(deep=True).sum()
+    new_index('budgeted-2')
+
+    # About one and a half pages fit: pages are spilled two at a time
+    transformed = transform.transform(memory_budget=int(page_bytes * 1.5))
+
+    assert len(transformed['sales_spill']) == 2
+    assert transformed['sales'].empty
+    assert len(loaded_sales(transformed)) > 0
+
+
+def stream(staging, chunk_rows):
+    """(file name, chunk) pairs as extract_stream yields them; a None chunk ends each file."""
+    for file_name, rows in staging.groupby('file_name', sort=True):
+        for start in range(0, len(rows), chunk_rows):
+            yield file_name, rows.iloc[start:start + chunk_rows].copy()
+        yield file_name, None
+
+
+def test_direct_groups_hold_batch_rows(new_index):
+    new_index('direct')
+    staging = staging_rows(2000, duplicate_rate=0)
+
+    groups = list(transform.transform_stream(stream(staging, 250), batch_rows=600))
+
+    # Groups close on the chunk that reaches batch_rows; a file is completed by the first
+    # group that holds its last chunk and its end marker
+    assert [transformed['watermark']['files'] for transformed, _ in groups] == [
+        ['chunk_0000.csv', 'chunk_0001.csv'], ['chunk_0001.csv', 'chunk_0002.csv'],
+        ['chunk_0003.csv']]
+    assert [completed for _, completed in groups] == [
+        ['chunk_0000.csv'], ['chunk_0001.csv'], ['chunk_0002.csv', 'chunk_0003.csv']]
+
+
+def test_direct_end_markers_after_the_last_group_are_handed_on(new_index):
+    new_index('direct')
+    staging = staging_rows(1000, files=2, duplicate_rate=0)
+
+    groups = list(transform.transform_stream(stream(staging, 500), batch_rows=1000))
+
+    # The second file's last chunk closes the group before its end marker arrives
+    assert [completed for _, completed in groups] == [['chunk_0000.csv'], ['chunk_0001.csv']]
+    assert groups[-1][0] is None
+
+
+def test_direct_update_supersedes_row_of_an_earlier_group(new_index):
+    new_index('direct')
+    staging = staging_rows(1500, files=3, duplicate_rate=0)
+    # A row of the last file updates one of the first
+    staging.loc[1400, ['invoice_line_no', 'store']] = staging.loc[10, ['invoice_line_no', 'store']].to_numpy()
+    key = tuple(staging.loc[10, ['invoice_line_no', 'store']])
+    index = dedup.get_dedup_index()
+
+    loaded = []
+    for transformed, _ in transform.transform_stream(stream(staging, 250), batch_rows=500):
+        if transformed is None:
+            continue
+        sales = pd.concat(list(transform.iter_sales(transformed)), ignore_index=True)
+        index.add(sales)
+        loaded.append(sales.set_index(['invoice_line_no', 'store']).index)
+
+    # Both versions are loaded; the first is deleted from Sales_Fact by delete_replaced()
+    assert [key in group for group in loaded] == [True, False, True]
+    assert sum(len(group) for group in loaded) == 1500
+    replaced, = index.replaced
+    assert list(replaced.itertuples(index=False, name=None)) == [key]
+
+    # A later run suppresses rows already loaded
+    index.commit()
+    transformed, _ = next(transform.transform_stream(stream(staging.loc[[10, 11]], 250), batch_rows=500))
+    assert transformed['sales'].empty
@@ -0,0 +1,74 @@
+import pandas as pd
+
+from src.validation import ColumnRule, split_valid, validate
+
+
+def sales(**overrides):
+    """Two valid sales rows, with columns replaced by `overrides`."""
+    rows = pd.DataFrame({
+        'invoice_line_no': ['INV-1', 'INV-2'],
+        'store': ['2633', '4829'],
+        'date': ['2024-01-05', '2024-02-29'],
+        'itemno': ['43127', '11788'],
+        'vendor_no': ['260', '85'],
+        'revenue': ['12.50', '99.99'],
+        'profit_margin': ['12000.5', '0.25'],
+    })
+    for column, values in overrides.items():
+        rows[column] = values
+    return rows
+
+
+def reasons(rows, rules=None):
+    """validate() reasons as a list, None for valid rows."""
+    reasons = validate(rows, rules) if rules else validate(rows)
+    return [None if pd.isna(reason) else reason for reason in reasons]
+
+
+def test_valid_rows_have_no_reason():
+    assert validate(sales()).isna().all()
+
+
+def test_reasons_name_column_and_rule():
+    rows = sales(store=[None, '12.5'], date=['2024-01-01', '2024-02-30'], revenue=['1e9', 'abc'])
+
+    assert reasons(rows) == ['store:null', 'store:not_integer']
+
+
+def test_first_failing_rule_wins_per_row():
+    rows = sales(date=['2024-01-01', '2024-02-30'], itemno=['X1', 'X2'], revenue=['1', '1e9'])
+
+    assert reasons(rows) == ['itemno:not_integer', 'date:invalid_date']
+
+
+def test_numeric_rules():
+    rules = {'value': ColumnRule('NUMERIC', precision=5, scale=2, min_value=0)}
+    rows = pd.DataFrame({'value': ['999.99', '999.995', '-1', 'abc', None]})
+
+    assert reasons(rows, rules) == [None, 'value:numeric_overflow', 'value:out_of_range',
+                                              'value:not_numeric', None]
+
+
+def test_int64_out_of_range():
+    rules = {'value': ColumnRule('INT64')}
+
+    assert reasons(pd.DataFrame({'value': ['1', '1e19']}), rules) == [None, 'value:out_of_range']
+
+
+def test_split_valid():
+    rows = sales(vendor_no=['260', None])
+
+    valid, rejected = split_valid(rows)
+
+    assert valid['invoice_line_no'].tolist() == ['INV-1']
+    assert rejected['invoice_line_no'].tolist() == ['INV-2']
+    assert rejected['reject_reason'].tolist() == ['vendor_no:null']
+
+
+def test_split_valid_without_rejects():
+    rows = sales()
+
+    valid, rejected = split_valid(rows)
+
+    assert valid is rows
+    assert rejected.empty and 'reject_reason' in rejected.columns
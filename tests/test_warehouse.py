@@ -0,0 +1,173 @@
+import re
+import sqlite3
+from unittest import mock
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import src.warehouse as warehouse_module
+from src.metrics import JsonLinesSink, Metrics
+from src.warehouse import BigQueryWarehouse, EmbeddedWarehouse
+from src.writer import to_arrow
+
+STORE_ATTRIBUTES = ['address', 'city', 'zipcode', 'county_number', 'county']
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def warehouse(request, tmp_path):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    return EmbeddedWarehouse(str(tmp_path / f'warehouse.{request.param}'), engine=request.param)
+
+
+def stores(ids, address='1 Main St'):
+    return pd.DataFrame({'store_id': ids, 'address': address, 'city': 'Ames', 'zipcode': '50010',
+                         'county_number': '85', 'county': 'Story', 'start_date': pd.Timestamp('2024-01-01').date(),
+                         'end_date': None, 'is_active': True})
+
+
+def merge_stores(warehouse, batch):
+    return warehouse.merge_scd('Store_Dim', to_arrow(batch, 'Store_Dim'), 'store_id', STORE_ATTRIBUTES, 'store_key')
+
+
+def test_merge_scd_assigns_surrogate_keys(warehouse):
+    assert merge_stores(warehouse, stores([10, 20, 30])) == {'inserted': 3, 'expired': 0}
+
+    dim = warehouse.read("SELECT store_id, store_key FROM Store_Dim ORDER BY store_id")
+    assert dim['store_key'].tolist() == [1, 2, 3]
+
+
+def test_changed_versions_get_new_keys(warehouse):
+    merge_stores(warehouse, stores([10, 20]))
+
+    result = merge_stores(warehouse, pd.concat([stores([10]), stores([20], address='2 Elm St'), stores([40])]))
+
+    assert result == {'inserted': 2, 'expired': 1}
+    dim = warehouse.read("SELECT store_id, store_key, is_active FROM Store_Dim ORDER BY store_key")
+    assert dim['store_key'].tolist() == [1, 2, 3, 4]
+    active = dim[dim['is_active'].astype(bool)]
+    assert dict(zip(active['store_id'], active['store_key'])) == {10: 1, 20: 3, 40: 4}
+
+
+def processed(*names):
+    frame = pd.DataFrame({'file_name': list(names), 'processed_timestamp': pd.Timestamp('2024-01-01 10:00:00')})
+    return to_arrow(frame, 'Processed_Files')
+
+
+def test_insert_is_visible_to_other_connections(tmp_path):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+
+    warehouse.insert('Processed_Files', processed(*(f'{n}.csv' for n in range(1000))))
+
+    with sqlite3.connect(str(tmp_path / 'warehouse.db')) as other:
+        assert other.execute("SELECT COUNT(*) FROM Processed_Files").fetchone() == (1000,)
+
+
+def test_failed_insert_leaves_table_unchanged(tmp_path):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    warehouse.insert('Processed_Files', processed('a.csv', 'b.csv'))
+    bad = pa.table({'file_name': ['c.csv'], 'no_such_column': [1]})
+
+    with pytest.raises(Exception):
+        warehouse.insert('Processed_Files', bad, replace=True)
+
+    assert warehouse.read("SELECT file_name FROM Processed_Files ORDER BY file_name")['file_name'].tolist() == \
+        ['a.csv', 'b.csv']
+
+
+def test_read_translates_bigquery_sql(warehouse):
+    warehouse.insert('Processed_Files', processed('a.csv', 'b.csv'))
+
+    rows = warehouse.read("SELECT file_name FROM `project.dataset.Processed_Files` "
+                          "WHERE processed_timestamp >= TIMESTAMP '2024-01-01 09:00:00' ORDER BY file_name")
+
+    assert rows['file_name'].tolist() == ['a.csv', 'b.csv']
+
+
+def test_execute_returns_affected_rows(warehouse):
+    warehouse.insert('Processed_Files', processed('a.csv', 'b.csv'))
+
+    assert warehouse.execute("DELETE FROM `project.dataset.Processed_Files` WHERE file_name = 'a.csv'") == 1
+
+
+@pytest.fixture
+def bigquery(tmp_path, monkeypatch):
+    """A BigQueryWarehouse on a mocked client that records its statements and staged rows."""
+    client = mock.MagicMock()
+    client.statements, client.staged = [], []
+    merge_job = mock.MagicMock()
+    # New store 30 and changed store 20 are inserted, the changed store's active version expired
+    merge_job.dml_stats.inserted_row_count, merge_job.dml_stats.updated_row_count = 2, 1
+
+    def query(statement):
+        client.statements.append(' '.join(statement.split()))
+        return merge_job if statement.lstrip().startswith('MERGE') else mock.MagicMock()
+
+    def load_table_from_file(source, table_id, job_config, rewind):
+        client.staged.append((table_id, job_config.write_disposition, pq.read_table(source).to_pandas()))
+        return mock.MagicMock()
+
+    client.query.side_effect = query
+    client.load_table_from_file.side_effect = load_table_from_file
+    monkeypatch.setattr(warehouse_module, 'get_bigquery_client', lambda *args: client)
+    metrics = Metrics([JsonLinesSink(str(tmp_path / 'spans.jsonl'))])
+    monkeypatch.setattr(warehouse_module, 'get_metrics', lambda: metrics)
+    return BigQueryWarehouse('proj', 'ds'), client, metrics
+
+
+def test_bigquery_merge_scd_statements(bigquery):
+    warehouse, client, metrics = bigquery
+    # Store 10 is unchanged, 20 moved and 30 is new
+    batch = stores([10, 20, 30]).assign(address=['1 Main St', '2 Elm St', '3 Oak St'])
+
+    with metrics.span('process_scd_type2') as span:
+        result = merge_stores(warehouse, batch)
+
+    assert result == {'inserted': 2, 'expired': 1}
+    assert span.counters['warehouse_jobs'] == 3
+    alter, merge = client.statements
+    assert alter == 'ALTER TABLE `proj.ds.Store_Dim` ADD COLUMN IF NOT EXISTS row_hash INT64'
+
+    # Every key of the batch is staged in a run-scoped table, which is removed afterwards
+    (stage_id, disposition, staged), = client.staged
+    assert re.fullmatch(r'proj\.ds\._scd_Store_Dim_[0-9a-f]{12}', stage_id)
+    assert disposition == 'WRITE_TRUNCATE'
+    assert staged['store_id'].tolist() == [10, 20, 30]
+    client.delete_table.assert_called_once_with(stage_id, not_found_ok=True)
+
+    row_hash = ('FARM_FINGERPRINT(TO_JSON_STRING(STRUCT({0}.address, {0}.city, {0}.zipcode, '
+                '{0}.county_number, {0}.county)))')
+    changed = f"COALESCE(T.row_hash, {row_hash.format('T')}) != S.row_hash"
+    assert merge.startswith(f"MERGE `proj.ds.Store_Dim` T USING ( WITH batch AS ( SELECT store_id, "
+                            f"address, city, zipcode, county_number, county, {row_hash.format('B')} AS row_hash "
+                            f"FROM `{stage_id}` B )")
+    # Keyed rows: new keys (no active version) are inserted, the others are matched
+    assert ("SELECT S.store_id AS merge_key, S.*, T.store_id IS NULL AS inserted FROM batch S "
+            "LEFT JOIN `proj.ds.Store_Dim` T ON T.store_id = S.store_id AND T.is_active = TRUE") in merge
+    # Changed keys again with a NULL merge key, so their new version is inserted
+    assert ("UNION ALL SELECT NULL AS merge_key, S.*, TRUE AS inserted FROM batch S "
+            "JOIN `proj.ds.Store_Dim` T ON T.store_id = S.store_id AND T.is_active = TRUE "
+            f"WHERE {changed} )") in merge
+    assert ("(SELECT COALESCE(MAX(store_key), 0) FROM `proj.ds.Store_Dim`) "
+            "+ ROW_NUMBER() OVER (PARTITION BY inserted ORDER BY store_id) END AS surrogate_key") in merge
+    # Matched keys are only expired when changed; unchanged keys are left alone
+    assert "ON T.store_id = S.merge_key AND T.is_active = TRUE" in merge
+    assert (f"WHEN MATCHED AND {changed} THEN UPDATE SET end_date = CURRENT_DATE(), is_active = FALSE "
+            "WHEN NOT MATCHED BY TARGET THEN INSERT (store_key, store_id, address, city, zipcode, "
+            "county_number, county, row_hash, start_date, end_date, is_active) VALUES (S.surrogate_key, "
+            "S.store_id, S.address, S.city, S.zipcode, S.county_number, S.county, S.row_hash, "
+            "CURRENT_DATE(), NULL, TRUE)") in merge
+    assert 'WHEN MATCHED THEN' not in merge
+
+
+def test_embedded_merge_scd_runs_no_warehouse_jobs(tmp_path, monkeypatch):
+    metrics = Metrics([JsonLinesSink(str(tmp_path / 'spans.jsonl'))])
+    monkeypatch.setattr(warehouse_module, 'get_metrics', lambda: metrics)
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+
+    with metrics.span('process_scd_type2') as span:
+        merge_stores(warehouse, stores([10]))
+
+    assert span.counters['warehouse_jobs'] == 0
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import src.watermark as watermark
+from src.warehouse import EmbeddedWarehouse
+from src.watermark import commit_watermark, read_watermark, slice_watermark
+from src.writer import BulkWriter, to_arrow
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    warehouse = EmbeddedWarehouse(str(tmp_path / 'warehouse.db'), engine='sqlite')
+    writer = BulkWriter(warehouse, max_latency=3600)
+    monkeypatch.setattr(watermark, 'get_warehouse', lambda *args: warehouse)
+    monkeypatch.setattr(watermark, 'get_writer', lambda: writer)
+    return warehouse
+
+
+def load_facts(warehouse, *processed_timestamps):
+    warehouse.insert('Sales_Fact', to_arrow(pd.DataFrame({
+        'invoice_line_no': [f'INV-{i}' for i in range(len(processed_timestamps))], 'store': 1,
+        'date_key': 1, 'store_key': 1, 'item_key': 1, 'vendor_key': 1,
+        'processed_timestamp': pd.to_datetime(list(processed_timestamps))}), 'Sales_Fact'))
+
+
+def test_nothing_transformed_yet(warehouse):
+    assert read_watermark() is None
+
+
+def test_falls_back_to_latest_loaded_fact(warehouse):
+    load_facts(warehouse, '2024-05-01 08:00', '2024-05-02 09:30')
+
+    assert read_watermark() == pd.Timestamp('2024-05-02 09:30')
+
+
+def test_missing_watermark_table_is_created(warehouse):
+    warehouse.conn.execute("DROP TABLE Transform_Watermark")
+    load_facts(warehouse, '2024-05-01 08:00')
+
+    assert read_watermark() == pd.Timestamp('2024-05-01 08:00')
+    assert warehouse.read("SELECT COUNT(*) AS n FROM Transform_Watermark")['n'].iloc[0] == 0
+
+
+def test_committed_watermark_takes_precedence(warehouse):
+    load_facts(warehouse, '2024-05-02 09:30')
+    staging = pd.DataFrame({
+        'file_name': ['a.csv', 'b.csv', 'a.csv', None],
+        'processed_timestamp': pd.to_datetime(['2024-06-01 10:00', '2024-06-01 11:00', '2024-06-01 10:30', None]),
+    })
+    slice_mark = slice_watermark(staging)
+
+    commit_watermark(slice_mark, run_id='run-1')
+
+    assert slice_mark == {'high_water_mark': pd.Timestamp('2024-06-01 11:00'), 'files': ['a.csv', 'b.csv']}
+    assert read_watermark() == pd.Timestamp('2024-06-01 11:00')
+    committed = warehouse.read("SELECT run_id, file_name FROM Transform_Watermark ORDER BY file_name")
+    assert committed.values.tolist() == [['run-1', 'a.csv'], ['run-1', 'b.csv']]
+
+
+def test_later_commit_advances_the_watermark(warehouse):
+    commit_watermark({'high_water_mark': pd.Timestamp('2024-06-01 11:00'), 'files': ['a.csv']})
+    commit_watermark({'high_water_mark': pd.Timestamp('2024-06-02 07:00'), 'files': []})
+
+    assert read_watermark() == pd.Timestamp('2024-06-02 07:00')
+
+
+def test_empty_slice_is_not_committed(warehouse):
+    commit_watermark(None)
+    commit_watermark({'high_water_mark': pd.NaT, 'files': []})
+
+    assert warehouse.read("SELECT COUNT(*) AS n FROM Transform_Watermark")['n'].iloc[0] == 0
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from src.writer import BulkWriter, LocalBackend, to_arrow
+
+
+def processed(*names):
+    return pd.DataFrame({'file_name': list(names), 'processed_timestamp': pd.Timestamp('2024-01-01 10:00:00')})
+
+
+def test_to_arrow_uses_the_declared_schema():
+    frame = processed('a.csv').assign(extra=1)
+
+    table = to_arrow(frame, 'Processed_Files')
+
+    assert table.column_names == ['file_name', 'processed_timestamp']
+    assert table.column('file_name').to_pylist() == ['a.csv']
+
+
+def test_to_arrow_fills_missing_nullable_columns():
+    frame = pd.DataFrame({'store_id': [10], 'start_date': [pd.Timestamp('2024-01-01').date()]})
+
+    table = to_arrow(frame, 'Store_Dim')
+
+    assert table.column('store_key').null_count == 1 and table.column('address').null_count == 1
+
+
+def test_to_arrow_rejects_missing_or_null_required_columns():
+    with pytest.raises(ValueError, match='Missing NOT NULL column start_date'):
+        to_arrow(pd.DataFrame({'store_id': [10]}), 'Store_Dim')
+    with pytest.raises(ValueError, match='null values in NOT NULL column Store_Dim.store_id'):
+        to_arrow(pd.DataFrame({'store_id': [None], 'start_date': [pd.Timestamp('2024-01-01').date()]}),
+                 'Store_Dim')
+
+
+def test_buffers_are_loaded_in_few_jobs(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    writer = BulkWriter(backend, max_rows=3, max_latency=3600)
+
+    for name in 'abcde':
+        writer.write('Processed_Files', processed(f'{name}.csv'))
+    writer.flush()
+
+    # One job when the buffer reached max_rows, one for the rest on flush()
+    assert writer.stats['jobs'] == 2 and writer.stats['rows'] == 5
+    assert sorted(backend.read('Processed_Files')['file_name']) == ['a.csv', 'b.csv', 'c.csv', 'd.csv', 'e.csv']
+
+
+def test_failed_load_keeps_rows_for_the_next_flush(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    load = backend.load
+    failures = [RuntimeError('load failed')]
+
+    def flaky_load(table, parquet_bytes):
+        if failures:
+            raise failures.pop()
+        load(table, parquet_bytes)
+    backend.load = flaky_load
+    writer = BulkWriter(backend, max_latency=3600)
+    writer.write('Processed_Files', processed('a.csv', 'b.csv'))
+
+    with pytest.raises(RuntimeError):
+        writer.flush('Processed_Files')
+    writer.flush('Processed_Files')
+
+    assert sorted(backend.read('Processed_Files')['file_name']) == ['a.csv', 'b.csv']